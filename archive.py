@@ -0,0 +1,147 @@
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from config import *
+
+TIME_FORMAT = "%Y%m%dT%H%M%S"  # Alpha Vantage's time_published format
+
+class ArticleArchive:
+    """SQLite archive of every article the bot has ingested, with a full-text index.
+
+    Articles are stored once per URL. Titles and summaries are indexed with
+    FTS5 (kept in sync by triggers), and an index on (id, time_published,
+    category) covers the since/sentiment filters and the newest-first sort, so
+    searches never touch the news APIs. compact()
+    drops articles past ARCHIVE_RETENTION_DAYS or beyond ARCHIVE_MAX_ARTICLES
+    and gives the freed pages back to the file system.
+    """
+
+    def __init__(self, path=ARCHIVE_FILE):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # only takes effect on a new file
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS articles ("
+                "id INTEGER PRIMARY KEY, url TEXT UNIQUE NOT NULL, title TEXT NOT NULL, summary TEXT NOT NULL, "
+                "source TEXT, time_published TEXT NOT NULL, category TEXT, score REAL, archived_at REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS articles_time ON articles (time_published)")
+            # Covers the search filters and sort, so only the page of results reads full rows
+            self.conn.execute("CREATE INDEX IF NOT EXISTS articles_search ON articles (id, time_published, category)")
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5("
+                "title, summary, content='articles', content_rowid='id', tokenize='porter unicode61')"
+            )
+            self.conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS articles_fts_insert AFTER INSERT ON articles BEGIN "
+                "INSERT INTO articles_fts (rowid, title, summary) VALUES (new.id, new.title, new.summary); END"
+            )
+            self.conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS articles_fts_delete AFTER DELETE ON articles BEGIN "
+                "INSERT INTO articles_fts (articles_fts, rowid, title, summary) "
+                "VALUES ('delete', old.id, old.title, old.summary); END"
+            )
+
+    def add(self, articles):
+        """Archive articles not seen before; returns how many were new."""
+        now = time.time()
+        rows = [(article["url"], article.get("title", ""), article.get("summary", ""), article.get("source", ""),
+                 article.get("time_published", ""), article.get("sentiment", {}).get("category"),
+                 article.get("sentiment", {}).get("score"), now)
+                for article in articles if article.get("url")]
+        with self.lock, self.conn:
+            return self.conn.executemany(
+                "INSERT OR IGNORE INTO articles (url, title, summary, source, time_published, category, score, archived_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+            ).rowcount
+
+    def search(self, terms, since=None, categories=None, limit=SEARCH_PAGE_SIZE, offset=0):
+        """Return (total matches, page of articles) for a full-text search, newest first.
+
+        `since` is a time_published value; `categories` limits the sentiment categories.
+        """
+        match = fts_query(terms)
+        if not match:
+            return 0, []
+        where = "articles_fts MATCH ?"
+        params = [match]
+        if since:
+            where += " AND a.time_published >= ?"
+            params.append(since)
+        if categories:
+            where += f" AND a.category IN ({','.join('?' * len(categories))})"
+            params.extend(categories)
+        # CROSS JOIN keeps the full-text match as the outer loop (otherwise SQLite may walk
+        # another index and run the match once per row); the filters and sort only need articles_search
+        base = f"FROM articles_fts CROSS JOIN articles a INDEXED BY articles_search ON a.id = articles_fts.rowid WHERE {where}"
+        with self.lock:
+            if len(params) == 1:
+                total = self.conn.execute("SELECT COUNT(*) FROM articles_fts WHERE articles_fts MATCH ?", params).fetchone()[0]
+            else:
+                total = self.conn.execute(f"SELECT COUNT(*) {base}", params).fetchone()[0]
+            rows = self.conn.execute(
+                "SELECT url, title, summary, source, time_published, category, score FROM articles "
+                f"WHERE id IN (SELECT a.id {base} ORDER BY a.time_published DESC LIMIT ? OFFSET ?) "
+                "ORDER BY time_published DESC", params + [limit, offset]
+            ).fetchall() if total > offset else []
+        return total, [
+            {"url": url, "title": title, "summary": summary, "source": source, "time_published": time_published,
+             "sentiment": {"category": category or "neutral", "score": score or 0.0}}
+            for url, title, summary, source, time_published, category, score in rows
+        ]
+
+    def recent(self, since):
+        """Return (url, time_published, category, score) for articles published at or after `since`, oldest first."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT url, time_published, category, score FROM articles WHERE time_published >= ? ORDER BY time_published",
+                (since,)
+            ).fetchall()
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+    def compact(self, retention_days=ARCHIVE_RETENTION_DAYS, max_articles=ARCHIVE_MAX_ARTICLES):
+        """Drop expired and excess articles, merge the FTS index and release free pages; returns how many were dropped."""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).strftime(TIME_FORMAT)
+        with self.lock:
+            with self.conn:
+                dropped = self.conn.execute("DELETE FROM articles WHERE time_published < ?", (cutoff,)).rowcount
+                dropped += self.conn.execute(
+                    "DELETE FROM articles WHERE id IN (SELECT id FROM articles ORDER BY time_published DESC LIMIT -1 OFFSET ?)",
+                    (max_articles,)
+                ).rowcount
+                if dropped:
+                    self.conn.execute("INSERT INTO articles_fts (articles_fts) VALUES ('optimize')")
+            if dropped:
+                # executescript runs the pragma to completion (execute() would free a single page),
+                # and the checkpoint lets the file actually shrink
+                self.conn.executescript("PRAGMA incremental_vacuum; PRAGMA wal_checkpoint(TRUNCATE);")
+        return dropped
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def fts_query(terms):
+    """Turn free text into an FTS5 query matching every word (quoted, so no FTS syntax leaks through)."""
+    words = re.findall(r"\w+", terms.lower())
+    return " ".join(f'"{word}"' for word in words)
+
+def parse_since(value):
+    """Parse a /search `since` argument (e.g. 24h, 7d, 2w or 2024-05-01) into a time_published value, or None."""
+    match = re.fullmatch(r"(\d+)([hdw])", value.lower())
+    if match:
+        amount, unit = int(match.group(1)), match.group(2)
+        delta = {"h": timedelta(hours=amount), "d": timedelta(days=amount), "w": timedelta(weeks=amount)}[unit]
+        return (datetime.now(timezone.utc) - delta).strftime(TIME_FORMAT)
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").strftime(TIME_FORMAT)
+    except ValueError:
+        return None
@@ -0,0 +1,199 @@
+"""End-to-end benchmark against local Alpha Vantage and Telegram stand-ins.
+
+Runs the real fetch, alert and /latest code paths with no API keys. The fake
+servers (see fake_servers.py) run in a child process, so their work doesn't
+share the bot's event loop. Three scenarios run:
+  - fetch: fetch_alert_articles for alert cycles (incremental) and fetch_trump_news for /latest (cold cache)
+  - alerts: one check_news_and_alert cycle for each subscriber count
+  - latest: many concurrent /latest requests served by get_latest
+
+Delivery latency is measured by the fake Telegram server from the start of the
+cycle to the moment each message arrives. By default the dispatcher's Telegram
+rate limits are lifted to measure the bot's own overhead; --telegram-limits
+keeps them.
+
+Usage: python benchmarks/bench_end_to_end.py [--subscribers 1000 10000 100000] [--articles 100]
+       [--new-articles 1] [--av-latency 0.2] [--tg-latency 0.02] [--flood-rate 0.001] [--latest-requests 200]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import sample_data  # adds the repo root to sys.path
+from fake_servers import FakeAlphaVantage, FakeTelegram
+
+def _run_servers(args, conn):
+    """Child process: run both fake servers on free ports and report the ports back."""
+    async def run():
+        av_server = await FakeAlphaVantage(args.articles, args.av_latency).start()
+        tg_server = await FakeTelegram(args.tg_latency, args.flood_rate).start()
+        conn.send((av_server.sockets[0].getsockname()[1], tg_server.sockets[0].getsockname()[1]))
+        async with av_server, tg_server:
+            await asyncio.gather(av_server.serve_forever(), tg_server.serve_forever())
+    asyncio.run(run())
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+class FakeMessage:
+    """Stands in for update.message; replies go through the bot to the fake Telegram server."""
+
+    def __init__(self, bot, chat_id):
+        self.bot = bot
+        self.chat_id = chat_id
+
+    async def reply_text(self, text, **kwargs):
+        return await self.bot.send_message(chat_id=self.chat_id, text=text, **kwargs)
+
+class FakeUpdate:
+    def __init__(self, bot, chat_id):
+        self.message = self.effective_message = FakeMessage(bot, chat_id)
+        self.effective_user = self.effective_chat = type("Chat", (), {"id": chat_id})()
+
+class FakeContext:
+    def __init__(self, bot):
+        self.bot = bot
+        self.args = []
+
+async def bench_fetch(args, control, news_service):
+    print(f"fetch: {args.articles} items per NEWS_SENTIMENT response, {args.av_latency * 1000:.0f}ms API latency")
+    alert_times = []
+    for _ in range(args.fetch_rounds):
+        control("av", "publish", count=args.new_articles)
+        started = time.perf_counter()
+        new_articles, watermarks = await news_service.fetch_alert_articles()
+        alert_times.append(time.perf_counter() - started)
+        news_service.mark_alerted(new_articles, watermarks)
+    latest_times = []
+    for _ in range(args.fetch_rounds):
+        news_service.api_cache.entries.clear()
+        started = time.perf_counter()
+        articles = await news_service.fetch_trump_news()
+        latest_times.append(time.perf_counter() - started)
+    for name, times in (("alert (incremental)", alert_times), ("/latest (cold cache)", latest_times)):
+        print(f"  {name:22} p50 {percentile(times, 0.5) * 1000:7.1f} ms  p99 {percentile(times, 0.99) * 1000:7.1f} ms")
+    print(f"  {len(articles)} matching articles per full fetch, peak RSS {peak_rss_mb():.0f} MB")
+
+async def bench_alerts(args, control, bot_module, tg_bot):
+    print(f"alerts: {args.new_articles} new articles per cycle, {args.tg_latency * 1000:.0f}ms Telegram latency, "
+          f"{args.flood_rate:.2%} answered with 429")
+    for count in args.subscribers:
+        bot_module.subscribers.clear()
+        bot_module.subscribers.update(range(1, count + 1))
+        bot_module.user_preferences.clear()
+        bot_module.rebuild_sentiment_index()
+        # Every new article matches the default keywords, so each subscriber gets new_articles messages
+        control("av", "publish", count=args.new_articles, subject="Trump")
+        control("tg", "reset")
+
+        started = time.perf_counter()
+        articles = await bot_module.check_news_and_alert(FakeContext(tg_bot))
+        duration = time.perf_counter() - started
+        stats = control("tg", "stats")
+        print(f"  {count:>7} subscribers: {articles} articles, {stats['messages']} messages to {stats['chats']} chats "
+              f"in {duration:.2f}s ({stats['messages'] / duration:.0f} msg/s), delivered p50 {stats['p50']:.2f}s "
+              f"p99 {stats['p99']:.2f}s, {stats['flooded']} x 429, peak RSS {peak_rss_mb():.0f} MB")
+
+async def bench_latest(args, control, bot_module, news_service, tg_bot):
+    print(f"latest: {args.latest_requests} concurrent /latest requests")
+    news_service.api_cache.entries.clear()
+    news_service.quote_service.expires_at.clear()
+    control("av", "reset")
+    control("tg", "reset")
+    times = []
+    errors = []
+
+    async def one_request(chat_id):
+        started = time.perf_counter()
+        try:
+            await bot_module.get_latest(FakeUpdate(tg_bot, chat_id), FakeContext(tg_bot))
+        except Exception as e:
+            # get_latest doesn't retry, so a 429 fails the request as it would in production
+            errors.append(e)
+            return
+        times.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_request(chat_id) for chat_id in range(1, args.latest_requests + 1)))
+    duration = time.perf_counter() - started
+    av_calls = control("av", "stats")["calls"]
+    print(f"  {args.latest_requests / duration:.0f} requests/s, p50 {percentile(times, 0.5) * 1000:.0f} ms "
+          f"p99 {percentile(times, 0.99) * 1000:.0f} ms, {len(errors)} failed, {control('tg', 'stats')['messages']} messages, "
+          f"Alpha Vantage calls {av_calls}, peak RSS {peak_rss_mb():.0f} MB")
+
+async def run(args, ports):
+    import httpx
+    from telegram import Bot
+    from telegram.request import HTTPXRequest
+    import bot as bot_module
+    import news_service
+
+    av_base, tg_base = f"http://127.0.0.1:{ports[0]}", f"http://127.0.0.1:{ports[1]}"
+    control_client = httpx.Client()
+
+    def control(server, action, **params):
+        base = av_base if server == "av" else tg_base
+        method = "GET" if action == "stats" else "POST"
+        return control_client.request(method, f"{base}/control/{action}", params=params).json()
+
+    if not args.telegram_limits:
+        bucket = bot_module.alert_dispatcher.global_bucket
+        bucket.rate = bucket.capacity = 1e9
+        bot_module.alert_dispatcher.per_chat_interval = 0
+
+    request = HTTPXRequest(connection_pool_size=bot_module.FANOUT_WORKERS * 2)
+    async with Bot(bot_module.TELEGRAM_TOKEN, base_url=bot_module.TELEGRAM_API_BASE_URL, request=request) as tg_bot:
+        await bench_fetch(args, control, news_service)
+        await bench_alerts(args, control, bot_module, tg_bot)
+        await bench_latest(args, control, bot_module, news_service, tg_bot)
+    await bot_module.post_shutdown(type("App", (), {"bot_data": {}})())
+    control_client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark against local API stand-ins")
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--articles", type=int, default=100, help="items per NEWS_SENTIMENT response")
+    parser.add_argument("--new-articles", type=int, default=1, help="articles published before each cycle")
+    parser.add_argument("--fetch-rounds", type=int, default=20)
+    parser.add_argument("--latest-requests", type=int, default=200)
+    parser.add_argument("--av-latency", type=float, default=0.2)
+    parser.add_argument("--tg-latency", type=float, default=0.02)
+    parser.add_argument("--flood-rate", type=float, default=0.001, help="share of sendMessage calls answered with 429")
+    parser.add_argument("--telegram-limits", action="store_true", help="keep the dispatcher's Telegram rate limits")
+    args = parser.parse_args()
+
+    parent_conn, child_conn = multiprocessing.Pipe()
+    servers = multiprocessing.Process(target=_run_servers, args=(args, child_conn), daemon=True)
+    servers.start()
+    ports = parent_conn.recv()
+
+    # Configure the bot before importing it; state files go to a scratch directory
+    os.chdir(tempfile.mkdtemp(prefix="alertmee-bench-"))
+    os.environ.update({
+        "TELEGRAM_TOKEN": "123456:fake",
+        "TELEGRAM_API_BASE_URL": f"http://127.0.0.1:{ports[1]}/bot",
+        "ALPHA_VANTAGE_API_KEY": "fake",
+        "ALPHA_VANTAGE_URL": f"http://127.0.0.1:{ports[0]}/query",
+        "ALPHA_VANTAGE_DAILY_QUOTA": "1000000",
+        "RSS_FEED_URLS": "",
+        "NEWS_FILE_SOURCES": "",
+        "DELIVERY_MODE": "local",
+        "METRICS_PORT": "0",
+    })
+    print(f"Working directory {os.getcwd()}, Python {sys.version.split()[0]}")
+    try:
+        asyncio.run(run(args, ports))
+    finally:
+        servers.terminate()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Memory and CPU cost of parsing a NEWS_SENTIMENT response.
+
+Compares the previous path (decode the whole body with json.loads, then copy
+each item into a dict) with the streaming parser (decode items chunk by chunk
+into compact Article records). Reported per feed size:
+  - peak: the most memory allocated while parsing, on top of the raw body
+  - kept: memory still held by the parsed articles afterwards
+  - time: parse time, for the full feed and for an incremental fetch that stops
+    after the newest 10% of items
+
+Usage: python benchmarks/bench_feed_memory.py [sizes...]   (default: 50 200 1000)
+"""
+import asyncio
+import codecs
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+from sample_data import make_news_payload  # adds the repo root to sys.path
+from sources import parse_alpha_vantage_stream
+
+CHUNK_SIZE = 65536  # roughly what httpx hands over per read
+
+async def dict_path(body, since=None):
+    """The previous parse: the whole body as one string and one dict, then a dict per article."""
+    news_data = json.loads(body.decode("utf-8"))
+    articles = []
+    for item in news_data["feed"]:
+        if since and item.get("time_published", "") < since:
+            break
+        articles.append({
+            "title": (item.get("title") or "").strip(),
+            "summary": (item.get("summary") or "").strip(),
+            "url": (item.get("url") or "").strip(),
+            "source": item.get("source") or "Alpha Vantage",
+            "time_published": item.get("time_published") or "",
+        })
+    return articles
+
+async def _chunks(body):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for start in range(0, len(body), CHUNK_SIZE):
+        yield decoder.decode(body[start:start + CHUNK_SIZE])
+
+async def streaming_path(body, since=None):
+    return await parse_alpha_vantage_stream(_chunks(body), since=since)
+
+def measure(parse, body, since=None):
+    """Return (peak bytes, retained bytes) for one parse."""
+    gc.collect()
+    tracemalloc.start()
+    articles = asyncio.run(parse(body, since))
+    gc.collect()
+    kept = tracemalloc.get_traced_memory()[0]
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del articles
+    return peak, kept
+
+def timed(parse, body, since=None, rounds=20):
+    async def run():
+        started = time.perf_counter()
+        for _ in range(rounds):
+            await parse(body, since)
+        return (time.perf_counter() - started) / rounds
+    return asyncio.run(run())
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [50, 200, 1000]
+    print(f"{'items':>6} {'body':>8}  {'path':10} {'peak':>9} {'kept':>9} {'full parse':>11} {'newest 10%':>11}")
+    for size in sizes:
+        payload = make_news_payload(size)
+        body = json.dumps(payload).encode()
+        since = payload["feed"][max(0, size // 10 - 1)]["time_published"]
+        for name, parse in (("dict", dict_path), ("streaming", streaming_path)):
+            peak, kept = measure(parse, body)
+            full, partial = timed(parse, body), timed(parse, body, since)
+            print(f"{size:>6} {len(body) / 1024:>6.0f}KB  {name:10} {peak / 1024:>7.0f}KB {kept / 1024:>7.0f}KB "
+                  f"{full * 1000:>9.2f}ms {partial * 1000:>9.2f}ms")
+
+if __name__ == "__main__":
+    main()
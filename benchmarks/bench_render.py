@@ -0,0 +1,39 @@
+"""Microbenchmark for the message render path.
+
+Compares rendering every message from scratch (one render per recipient) with
+the shared render cache used by alert cycles and /latest.
+
+Usage: python benchmarks/bench_render.py [articles] [recipients]
+"""
+import sys
+import time
+
+from sample_data import make_feed
+import news_service
+
+def main():
+    articles = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    recipients = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    feed = news_service.enrich_feed(make_feed(articles * 4))[:articles]
+    snapshot = {"version": 1, "quotes": {"VOO": {"price": "512.34", "change": "1.23", "change_percent": "0.24%"}}}
+
+    started = time.perf_counter()
+    for _ in range(recipients):
+        for article in feed:
+            news_service.format_news_message(article, include_alert_header=True, quote_snapshot=snapshot)
+    uncached = time.perf_counter() - started
+
+    news_service.rendered_messages.clear()
+    started = time.perf_counter()
+    for _ in range(recipients):
+        news_service.render_news_batch(feed, include_alert_header=True, quote_snapshot=snapshot)
+    cached = time.perf_counter() - started
+
+    renders = recipients * len(feed)
+    print(f"Render path, {len(feed)} articles x {recipients} recipients ({renders} messages)")
+    print(f"  render per message: {uncached * 1000:8.1f} ms total, {uncached / renders * 1e6:6.2f} us/message")
+    print(f"  shared render cache: {cached * 1000:7.1f} ms total, {cached / renders * 1e6:6.2f} us/message")
+    print(f"  cache: {news_service.render_cache_stats}")
+
+if __name__ == "__main__":
+    main()
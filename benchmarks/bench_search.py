@@ -0,0 +1,72 @@
+"""/search latency against a large article archive.
+
+Fills a scratch archive with synthetic articles spread over the retention
+window, then times archive searches (first page, a later page, with a since
+filter and with a sentiment filter) and one compaction.
+
+Usage: python benchmarks/bench_search.py [articles] [rounds]   (default: 100000 50)
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sample_data import make_article  # adds the repo root to sys.path
+from archive import ArticleArchive, parse_since
+
+QUERIES = [
+    ("one common word", "tariffs", None, None, 0),
+    ("two words", "trade talks", None, None, 0),
+    ("page 20", "tariffs", None, None, 95),
+    ("since 7d", "tariffs", "7d", None, 0),
+    ("negative only", "shutdown", None, ["negative"], 0),
+    ("rare word", "report 4242", None, None, 0),
+    ("no match", "zeppelin", None, None, 0),
+]
+
+def fill(archive, count):
+    rng = random.Random(7)
+    now = datetime.now()
+    span = timedelta(days=80).total_seconds()
+    batch = []
+    for index in range(count):
+        article = make_article(index, now - timedelta(seconds=span * (count - index) / count), rng)
+        article["sentiment"] = {"category": rng.choice(["positive", "neutral", "negative"]), "score": 0.0}
+        batch.append(article)
+        if len(batch) == 1000:
+            archive.add(batch)
+            batch = []
+    archive.add(batch)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    path = os.path.join(tempfile.mkdtemp(prefix="alertmee-search-"), "articles.db")
+    archive = ArticleArchive(path)
+
+    started = time.perf_counter()
+    fill(archive, count)
+    print(f"Archived {archive.count()} articles in {time.perf_counter() - started:.1f}s "
+          f"({os.path.getsize(path) / 1e6:.0f} MB)")
+
+    for name, terms, since, categories, offset in QUERIES:
+        since_value = parse_since(since) if since else None
+        times = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            total, articles = archive.search(terms, since_value, categories, offset=offset)
+            times.append(time.perf_counter() - started)
+        times.sort()
+        print(f"  {name:16} {total:>6} matches  p50 {times[len(times) // 2] * 1000:6.2f} ms  "
+              f"p99 {times[min(len(times) - 1, int(len(times) * 0.99))] * 1000:6.2f} ms")
+
+    started = time.perf_counter()
+    dropped = archive.compact(retention_days=60, max_articles=count // 2)
+    print(f"Compaction to 60 days / {count // 2} articles dropped {dropped} in {time.perf_counter() - started:.2f}s "
+          f"({os.path.getsize(path) / 1e6:.0f} MB after)")
+    archive.close()
+
+if __name__ == "__main__":
+    main()
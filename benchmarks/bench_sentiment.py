@@ -0,0 +1,40 @@
+"""Compare CPU time per feed enrichment with a cold and a warm sentiment cache.
+
+Usage: python benchmarks/bench_sentiment.py [articles] [rounds]
+"""
+import copy
+import sys
+import time
+
+from sample_data import make_feed
+import news_service
+
+def run(feed, rounds, clear_cache):
+    """Enrich the feed `rounds` times and return CPU seconds per round."""
+    total = 0.0
+    for _ in range(rounds):
+        if clear_cache:
+            news_service.sentiment_cache.clear()
+        items = copy.deepcopy(feed)
+        started = time.process_time()
+        news_service.enrich_feed(items)
+        total += time.process_time() - started
+    return total / rounds
+
+def main():
+    articles = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    feed = make_feed(articles)
+
+    cold = run(feed, rounds, clear_cache=True)
+    news_service.enrich_feed(copy.deepcopy(feed))  # Warm the cache
+    warm = run(feed, rounds, clear_cache=False)
+
+    print(f"Sentiment enrichment, {articles} articles, {rounds} rounds")
+    print(f"  uncached: {cold * 1000:8.2f} ms CPU per fetch")
+    print(f"  cached:   {warm * 1000:8.2f} ms CPU per fetch")
+    print(f"  speedup:  {cold / warm if warm else float('inf'):8.1f}x")
+    print(f"  cache:    {news_service.sentiment_cache_stats}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Throughput of sentiment scoring for feeds of different sizes.
+
+Compares scoring inline on the event loop (analyze_sentiment per text) with the
+batch API (score_texts) in a worker thread and in the process pool, and shows
+the longest event loop stall while scoring.
+
+Usage: python benchmarks/bench_sentiment_batch.py [sizes...]
+"""
+import asyncio
+import sys
+import time
+
+from sample_data import make_feed
+import news_service
+
+async def measure(label, articles, score):
+    """Run one scoring strategy while a ticker task measures event loop stalls."""
+    texts = []
+    for article in articles:
+        texts.append(article["title"])
+        texts.append(article["summary"])
+    news_service.sentiment_cache.clear()
+
+    max_stall = 0.0
+    running = True
+
+    async def ticker():
+        nonlocal max_stall
+        last = time.perf_counter()
+        while running:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            max_stall = max(max_stall, now - last)
+            last = now
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    await score(texts)
+    elapsed = time.perf_counter() - started
+    running = False
+    await ticker_task
+
+    print(f"  {label:<14} {len(articles) / elapsed:10.0f} articles/s   "
+          f"{elapsed * 1000:8.1f} ms   max loop stall {max_stall * 1000:7.1f} ms")
+
+async def inline(texts):
+    for text in texts:
+        news_service.analyze_sentiment(text)
+
+async def thread(texts):
+    workers = news_service.SENTIMENT_PROCESS_WORKERS
+    news_service.SENTIMENT_PROCESS_WORKERS = 0
+    try:
+        await news_service.score_texts(texts)
+    finally:
+        news_service.SENTIMENT_PROCESS_WORKERS = workers
+
+async def process_pool(texts):
+    min_batch = news_service.SENTIMENT_PROCESS_MIN_BATCH
+    news_service.SENTIMENT_PROCESS_MIN_BATCH = 0
+    try:
+        await news_service.score_texts(texts)
+    finally:
+        news_service.SENTIMENT_PROCESS_MIN_BATCH = min_batch
+
+async def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [50, 500, 5000]
+    # Start the worker processes before timing anything
+    await process_pool(["warm up"] * 4)
+    for size in sizes:
+        articles = make_feed(size)
+        print(f"{size} articles ({news_service.SENTIMENT_PROCESS_WORKERS} worker processes)")
+        await measure("inline", articles, inline)
+        await measure("thread", articles, thread)
+        await measure("process pool", articles, process_pool)
+    news_service.shutdown_sentiment_pool()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+"""Cold start benchmark: time from launching bot.py until it answers /start.
+
+Starts the local Telegram stand-in (see fake_servers.py), seeds a database
+with subscribers and preferences plus a saved sentiment cache, queues a /start
+message and then launches `python bot.py` (polling, or webhook mode with
+--mode webhook). Reported per run:
+  - ready: the bot's "ready" log line (state loaded, every handler serving)
+  - first reply: when the fake Telegram server received the reply to /start
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--subscribers 10000] [--cache-entries 5000] [--mode webhook]
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+from sample_data import make_feed  # adds the repo root to sys.path
+from fake_servers import FakeTelegram
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def seed_state(workdir, subscribers, cache_entries):
+    """Create the database and sentiment cache file a long-running deployment would have."""
+    from storage import SQLiteStorage
+    from news_service import _text_key
+
+    db = SQLiteStorage(os.path.join(workdir, "alertmee.db"))
+    prefs = json.dumps({"sentiments": ["positive", "neutral", "negative"]})
+    with db.conn:
+        db.conn.executemany("INSERT OR IGNORE INTO subscribers (chat_id) VALUES (?)",
+                            [(chat_id,) for chat_id in range(1, subscribers + 1)])
+        db.conn.executemany("INSERT OR REPLACE INTO user_preferences (chat_id, data) VALUES (?, ?)",
+                            [(chat_id, prefs) for chat_id in range(1, subscribers + 1)])
+    db.close()
+
+    texts = [article["summary"] for article in make_feed(cache_entries)]
+    with open(os.path.join(workdir, "sentiment_cache.json"), "w") as f:
+        json.dump([[_text_key(text), 0.1] for text in texts], f)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def bot_env(base_url, mode="polling"):
+    """Environment for a bot.py process talking to the fake Telegram server."""
+    env = dict(os.environ, TELEGRAM_TOKEN="123456:fake", TELEGRAM_API_BASE_URL=base_url,
+               ALPHA_VANTAGE_API_KEY="fake", METRICS_PORT="0", PYTHONUNBUFFERED="1", BOT_MODE=mode)
+    if mode == "webhook":
+        port = free_port()
+        env.update(WEBHOOK_URL=f"http://127.0.0.1:{port}/telegram", WEBHOOK_LISTEN="127.0.0.1",
+                   WEBHOOK_PORT=str(port), WEBHOOK_SECRET_TOKEN="bench-secret")
+    return env
+
+async def launch_bot(env, workdir):
+    """Start bot.py and wait for its "ready" log line; returns the process."""
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(REPO_ROOT, "bot.py"), cwd=workdir, env=env,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+    )
+    while True:
+        line = await asyncio.wait_for(process.stdout.readline(), timeout=60)
+        if not line:
+            raise RuntimeError("bot.py exited before it was ready")
+        if b'"event": "ready"' in line:
+            # Keep draining output so the bot never blocks on a full pipe
+            asyncio.ensure_future(process.stdout.read())
+            return process
+
+async def stop_bot(process):
+    process.send_signal(signal.SIGINT)
+    await process.wait()
+
+async def run_once(telegram, base_url, workdir, chat_id, mode):
+    """Launch the bot once and return (seconds until ready, seconds until the /start reply)."""
+    telegram.reset()
+    telegram.push_update(chat_id, "/start")
+    launched, launched_at = time.monotonic(), time.time()
+    process = await launch_bot(bot_env(base_url, mode), workdir)
+    ready = time.monotonic() - launched
+    deadline = time.monotonic() + 30
+    while not telegram.arrivals:
+        if time.monotonic() > deadline:
+            raise RuntimeError("no reply to /start within 30 seconds")
+        await asyncio.sleep(0.005)
+    first_reply = telegram.mark + telegram.arrivals[0] - launched_at
+
+    await stop_bot(process)
+    return ready, first_reply
+
+async def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark for bot.py")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--subscribers", type=int, default=10000, help="subscribers seeded into the database")
+    parser.add_argument("--cache-entries", type=int, default=5000, help="entries in the saved sentiment cache")
+    parser.add_argument("--mode", choices=["polling", "webhook"], default="polling")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="alertmee-startup-")
+    os.chdir(workdir)
+    seed_state(workdir, args.subscribers, args.cache_entries)
+
+    telegram = FakeTelegram()
+    server = await telegram.start()
+    base_url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/bot"
+
+    print(f"Cold start ({args.mode}) with {args.subscribers} subscribers and {args.cache_entries} cached scores ({workdir})")
+    results = []
+    for run in range(args.runs):
+        ready, first_reply = await run_once(telegram, base_url, workdir, 10**9 + run, args.mode)
+        results.append((ready, first_reply))
+        print(f"  run {run + 1}: ready {ready * 1000:6.0f} ms, first /start reply {first_reply * 1000:6.0f} ms")
+    print(f"  median: ready {statistics.median(r[0] for r in results) * 1000:6.0f} ms, "
+          f"first /start reply {statistics.median(r[1] for r in results) * 1000:6.0f} ms")
+    server.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""Update latency benchmark: how fast bot.py answers a burst of commands, polling vs webhook.
+
+Launches bot.py against the local Telegram stand-in in each mode, sends a burst
+of commands from distinct chats (queued for getUpdates in polling mode, POSTed
+concurrently to the webhook in webhook mode) and measures the time from each
+update being sent to its reply arriving.
+
+Usage: python benchmarks/bench_updates.py [--updates 500] [--command /help] [--modes polling webhook]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from bench_startup import bot_env, launch_bot, seed_state, stop_bot
+from fake_servers import FakeTelegram
+
+def cpu_seconds(pid=None):
+    """User + system CPU time of a process (Linux /proc), or of this process."""
+    if pid is None:
+        times = os.times()
+        return times.user + times.system
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+async def run_mode(telegram, base_url, workdir, mode, updates, command):
+    process = await launch_bot(bot_env(base_url, mode), workdir)
+    await asyncio.sleep(0.5)  # let polling / the webhook settle after "ready"
+    telegram.reset()
+    bot_cpu, harness_cpu = cpu_seconds(process.pid), cpu_seconds()
+
+    sent_at = {}
+    for chat_id in range(1, updates + 1):
+        sent_at[chat_id] = time.time()
+        telegram.push_update(chat_id, command)
+
+    deadline = time.monotonic() + 60
+    while len(telegram.first_reply) < updates and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    bot_cpu, harness_cpu = cpu_seconds(process.pid) - bot_cpu, cpu_seconds() - harness_cpu
+    await stop_bot(process)
+
+    latencies = [telegram.first_reply[chat_id] - sent for chat_id, sent in sent_at.items() if chat_id in telegram.first_reply]
+    duration = max(telegram.first_reply.values(), default=0.0) - min(sent_at.values())
+    print(f"  {mode:8} {len(latencies)}/{updates} answered, {len(latencies) / duration if duration else 0:6.0f} updates/s, "
+          f"p50 {percentile(latencies, 0.5) * 1000:6.0f} ms, p99 {percentile(latencies, 0.99) * 1000:6.0f} ms, bot CPU {bot_cpu / updates * 1000:.2f} ms/update, harness CPU {harness_cpu:.1f}s")
+
+async def main():
+    parser = argparse.ArgumentParser(description="Update latency benchmark, polling vs webhook")
+    parser.add_argument("--updates", type=int, default=500)
+    parser.add_argument("--command", default="/help")
+    parser.add_argument("--modes", nargs="+", choices=["polling", "webhook"], default=["polling", "webhook"])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="alertmee-updates-")
+    os.chdir(workdir)
+    seed_state(workdir, subscribers=1000, cache_entries=100)
+
+    telegram = FakeTelegram()
+    server = await telegram.start()
+    base_url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/bot"
+
+    print(f"{args.updates} x {args.command} from distinct chats")
+    for mode in args.modes:
+        telegram.webhook = None
+        await run_mode(telegram, base_url, workdir, mode, args.updates, args.command)
+    server.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,304 @@
+"""Local stand-ins for the Alpha Vantage and Telegram Bot APIs.
+
+FakeAlphaVantage replays synthetic NEWS_SENTIMENT/GLOBAL_QUOTE payloads of a
+configurable size and latency; new articles are published on demand through
+POST /control/publish?count=N[&subject=Trump]. FakeTelegram accepts Bot API
+calls, records every sendMessage and answers a configurable share of them with
+429 (RetryAfter). Incoming messages are added with
+POST /control/update?chat_id=N&text=/start: they are returned by getUpdates,
+or POSTed to the webhook (with its secret token header) once the bot has
+called setWebhook. Both servers report their counters on GET /control/stats
+and reset them on POST /control/reset.
+
+Point the bot at them with ALPHA_VANTAGE_URL=http://127.0.0.1:8801/query and
+TELEGRAM_API_BASE_URL=http://127.0.0.1:8802/bot.
+
+Usage: python benchmarks/fake_servers.py [--articles N] [--av-latency S] [--tg-latency S] [--flood-rate F]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+from sample_data import OBJECTS, VERBS, make_article, make_quote_payload
+
+class FakeHTTPServer:
+    """Minimal keep-alive HTTP/1.1 server; subclasses implement handle()."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    async def handle(self, method, path, query, body):
+        """Return (status code, JSON-serializable body) for one request."""
+        raise NotImplementedError
+
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                url = urlsplit(target)
+                query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+                if self.latency and not url.path.startswith("/control/"):
+                    await asyncio.sleep(self.latency)
+                status, payload = await self.handle(method, url.path, query, body)
+
+                data = json.dumps(payload).encode() if not isinstance(payload, bytes) else payload
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass  # client went away, or the server is shutting down
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Start listening and return the asyncio server."""
+        return await asyncio.start_server(self._serve_connection, host, port)
+
+class FakeAlphaVantage(FakeHTTPServer):
+    """Serves a newest-first NEWS_SENTIMENT feed of `articles` items and a fixed GLOBAL_QUOTE."""
+
+    def __init__(self, articles=50, latency=0.0, seed=42):
+        super().__init__(latency)
+        self.articles = articles
+        self.rng = random.Random(seed)
+        self.epoch = datetime.now() - timedelta(minutes=articles)
+        self.feed = [self._make(index) for index in range(articles)]  # oldest first
+        self.calls = {}
+        self._payloads = {}  # {(newest index, time_from): encoded body}
+
+    def _make(self, index, subject=None):
+        # Article `index` is published `index` minutes after the epoch, so newer items have higher indexes
+        article = make_article(index, self.epoch + timedelta(minutes=index), self.rng)
+        if subject:
+            article["title"] = f"{subject} {self.rng.choice(VERBS)} {self.rng.choice(OBJECTS)}"
+        return article
+
+    def publish(self, count, subject=None):
+        """Add `count` newer articles to the top of the feed, optionally all about `subject`."""
+        start = len(self.feed)
+        self.feed.extend(self._make(index, subject) for index in range(start, start + count))
+
+    def _news_body(self, time_from):
+        key = (len(self.feed), time_from)
+        body = self._payloads.get(key)
+        if body is None:
+            items = self.feed[-self.articles:][::-1]
+            if time_from:
+                items = [item for item in items if item["time_published"][:13] >= time_from]
+            body = json.dumps({"items": str(len(items)), "feed": items}).encode()
+            self._payloads = {key: body}  # only the current feed is worth keeping
+        return body
+
+    async def handle(self, method, path, query, body):
+        if path == "/control/publish":
+            self.publish(int(query.get("count", 1)), query.get("subject"))
+            return 200, {"articles": len(self.feed)}
+        if path == "/control/stats":
+            return 200, {"calls": self.calls, "articles": len(self.feed)}
+        if path == "/control/reset":
+            self.calls = {}
+            return 200, {}
+
+        function = query.get("function", "")
+        self.calls[function] = self.calls.get(function, 0) + 1
+        if function == "NEWS_SENTIMENT":
+            return 200, self._news_body(query.get("time_from"))
+        if function == "GLOBAL_QUOTE":
+            return 200, make_quote_payload(query.get("symbol", "VOO"))
+        return 200, {"Information": f"Unknown function {function}"}
+
+class FakeTelegram(FakeHTTPServer):
+    """Accepts Bot API calls; a `flood_rate` share of sendMessage calls get 429 RetryAfter."""
+
+    def __init__(self, latency=0.0, flood_rate=0.0, retry_after=1, seed=42):
+        super().__init__(latency)
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.updates = []  # pending updates for getUpdates
+        self.next_update_id = 1
+        self.update_added = asyncio.Event()
+        self.webhook = None  # {"url", "secret_token"} once setWebhook was called
+        self.webhook_slots = asyncio.Semaphore(40)  # Telegram's default max_connections
+        self.webhook_connections = []  # idle keep-alive (reader, writer) pairs
+        self.webhook_errors = 0
+        self.reset()
+
+    def push_update(self, chat_id, text):
+        """Queue an incoming private message (commands get a bot_command entity)."""
+        message = {"message_id": self.next_update_id, "date": int(time.time()), "text": text,
+                   "chat": {"id": chat_id, "type": "private"},
+                   "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"}}
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        update = {"update_id": self.next_update_id, "message": message}
+        self.next_update_id += 1
+        if self.webhook:
+            return asyncio.ensure_future(self._post_update(update))
+        self.updates.append(update)
+        self.update_added.set()
+
+    async def _post_update(self, update, attempts=50):
+        """Deliver one update to the registered webhook, retrying failures as Telegram does.
+
+        Uses raw keep-alive connections rather than an HTTP client library so the
+        harness spends as little CPU as possible next to the bot being measured.
+        """
+        url = urlsplit(self.webhook["url"])
+        body = json.dumps(update).encode()
+        secret = self.webhook["secret_token"]
+        request = (
+            f"POST {url.path or '/'} HTTP/1.1\r\nHost: {url.netloc}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            + (f"X-Telegram-Bot-Api-Secret-Token: {secret}\r\n" if secret else "")
+            + "\r\n"
+        ).encode() + body
+        async with self.webhook_slots:
+            for _ in range(attempts):
+                connection = None
+                try:
+                    if self.webhook_connections:
+                        connection = self.webhook_connections.pop()
+                    else:
+                        connection = await asyncio.open_connection(url.hostname, url.port or 80)
+                    reader, writer = connection
+                    writer.write(request)
+                    await writer.drain()
+                    status_line = await reader.readline()
+                    length = 0
+                    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        name, _, value = line.decode("latin-1").partition(":")
+                        if name.strip().lower() == "content-length":
+                            length = int(value)
+                    await reader.readexactly(length)
+                    self.webhook_connections.append(connection)
+                    if status_line.split()[1:2] == [b"200"]:
+                        return
+                except (OSError, asyncio.IncompleteReadError):
+                    if connection is not None:
+                        connection[1].close()
+                self.webhook_errors += 1
+                await asyncio.sleep(0.1)
+
+    def reset(self):
+        self.mark = time.time()
+        self.arrivals = []  # seconds after the mark at which each message was accepted
+        self.chats = set()
+        self.first_reply = {}  # {chat id: time.time() of the first message sent to it}
+        self.flooded = 0
+        self.calls = {}
+
+    def stats(self):
+        arrivals = sorted(self.arrivals)
+
+        def percentile(fraction):
+            return arrivals[min(len(arrivals) - 1, int(len(arrivals) * fraction))] if arrivals else 0.0
+
+        return {
+            "messages": len(arrivals),
+            "chats": len(self.chats),
+            "flooded": self.flooded,
+            "calls": self.calls,
+            "webhook": self.webhook["url"] if self.webhook else None,
+            "webhook_errors": self.webhook_errors,
+            "first": arrivals[0] if arrivals else 0.0,
+            "last": arrivals[-1] if arrivals else 0.0,
+            "p50": percentile(0.50),
+            "p99": percentile(0.99),
+        }
+
+    async def handle(self, method, path, query, body):
+        if path == "/control/stats":
+            return 200, self.stats()
+        if path == "/control/reset":
+            self.reset()
+            return 200, {}
+        if path == "/control/update":
+            self.push_update(int(query["chat_id"]), query.get("text", "/start"))
+            return 200, {}
+
+        api_method = path.rsplit("/", 1)[-1]
+        self.calls[api_method] = self.calls.get(api_method, 0) + 1
+        params = {name: values[-1] for name, values in parse_qs(body.decode()).items()}
+        if api_method == "getMe":
+            return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}}
+        if api_method == "setWebhook":
+            self.webhook = {"url": params["url"], "secret_token": params.get("secret_token")}
+            # Updates that arrived before the webhook was set are delivered to it
+            pending, self.updates = self.updates, []
+            for update in pending:
+                asyncio.ensure_future(self._post_update(update))
+            return 200, {"ok": True, "result": True}
+        if api_method == "deleteWebhook":
+            self.webhook = None
+            return 200, {"ok": True, "result": True}
+        if api_method == "getUpdates":
+            # Updates before the offset have been confirmed by the client
+            offset = int(params.get("offset", 0))
+            self.updates = [update for update in self.updates if update["update_id"] >= offset]
+            if not self.updates:
+                self.update_added.clear()
+                try:
+                    await asyncio.wait_for(self.update_added.wait(), min(float(params.get("timeout", 0)), 1.0))
+                except asyncio.TimeoutError:
+                    pass
+            return 200, {"ok": True, "result": self.updates[:int(params.get("limit", 100))]}
+        if api_method == "sendMessage":
+            if self.flood_rate and self.rng.random() < self.flood_rate:
+                self.flooded += 1
+                return 429, {"ok": False, "error_code": 429, "description": "Too Many Requests",
+                             "parameters": {"retry_after": self.retry_after}}
+            chat_id = int(params["chat_id"])
+            self.chats.add(chat_id)
+            self.first_reply.setdefault(chat_id, time.time())
+            self.arrivals.append(time.time() - self.mark)
+            return 200, {"ok": True, "result": {"message_id": len(self.arrivals), "date": int(time.time()),
+                                                "chat": {"id": chat_id, "type": "private"},
+                                                "text": params.get("text", "")}}
+        return 200, {"ok": True, "result": True}
+
+async def serve(articles=50, av_latency=0.0, tg_latency=0.0, flood_rate=0.0, av_port=8801, tg_port=8802):
+    """Run both fake servers until cancelled."""
+    av_server = await FakeAlphaVantage(articles, av_latency).start(port=av_port)
+    tg_server = await FakeTelegram(tg_latency, flood_rate).start(port=tg_port)
+    async with av_server, tg_server:
+        await asyncio.gather(av_server.serve_forever(), tg_server.serve_forever())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--articles", type=int, default=50, help="items per NEWS_SENTIMENT response")
+    parser.add_argument("--av-latency", type=float, default=0.0, help="seconds added to each Alpha Vantage call")
+    parser.add_argument("--tg-latency", type=float, default=0.0, help="seconds added to each Telegram call")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="share of sendMessage calls answered with 429")
+    parser.add_argument("--av-port", type=int, default=8801)
+    parser.add_argument("--tg-port", type=int, default=8802)
+    args = parser.parse_args()
+    print(f"Fake Alpha Vantage on http://127.0.0.1:{args.av_port}/query, "
+          f"fake Telegram on http://127.0.0.1:{args.tg_port}/bot")
+    try:
+        asyncio.run(serve(args.articles, args.av_latency, args.tg_latency, args.flood_rate, args.av_port, args.tg_port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Synthetic Alpha Vantage payloads shared by the benchmark scripts."""
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+# Make the bot modules importable when running `python benchmarks/<script>.py`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SUBJECTS = ["Trump", "President Trump", "Donald Trump", "The Fed", "Congress", "Wall Street"]
+VERBS = ["praises", "slams", "announces", "warns about", "celebrates", "threatens", "delays", "backs"]
+OBJECTS = ["new tariffs", "the stock market rally", "trade talks with China", "tax cuts",
+           "a government shutdown", "record job numbers", "interest rate cuts", "sanctions"]
+FILLER = ["Markets reacted sharply as investors weighed the outlook.",
+          "Analysts said the move could boost growth but raise inflation risks.",
+          "Critics called the decision reckless and damaging to allies.",
+          "Supporters welcomed the news as a strong win for American workers.",
+          "The announcement surprised traders and sent futures lower.",
+          "Officials declined to comment on the timing of further steps."]
+
+def make_article(index, published, rng):
+    """Build one NEWS_SENTIMENT feed item."""
+    title = f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)}"
+    summary = " ".join(rng.choice(FILLER) for _ in range(3)) + f" (Report {index}.)"
+    return {
+        "title": title,
+        "url": f"https://news.example.com/article/{index}",
+        "time_published": published.strftime("%Y%m%dT%H%M%S"),
+        "summary": summary,
+        "source": rng.choice(["Reuters", "Bloomberg", "CNBC", "Benzinga"]),
+        "topics": [{"topic": "Financial Markets", "relevance_score": "0.5"}],
+        "ticker_sentiment": [{"ticker": "VOO", "relevance_score": "0.1",
+                              "ticker_sentiment_score": "0.05", "ticker_sentiment_label": "Neutral"}],
+    }
+
+def make_feed(count, seed=42, start_index=0):
+    """Return a newest-first feed of `count` synthetic articles."""
+    rng = random.Random(seed)
+    now = datetime.now()
+    return [make_article(start_index + i, now - timedelta(minutes=i), rng) for i in range(count)]
+
+def make_news_payload(count, seed=42, start_index=0):
+    """Return a full NEWS_SENTIMENT response body."""
+    feed = make_feed(count, seed, start_index)
+    return {"items": str(len(feed)), "feed": feed}
+
+def make_quote_payload(symbol="VOO", price=512.34):
+    """Return a GLOBAL_QUOTE response body."""
+    return {"Global Quote": {"01. symbol": symbol, "05. price": f"{price:.4f}",
+                             "09. change": "1.2300", "10. change percent": "0.2406%"}}
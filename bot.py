@@ -1,17 +1,89 @@
-import json
+import time
+started_at = time.monotonic()  # startup time is reported from here, before the heavy imports
+
 import asyncio
+import argparse
+import functools
+import hashlib
+import secrets
+from collections import Counter
 from datetime import datetime
+from urllib.parse import urlsplit
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import Application, CommandHandler, ContextTypes, CallbackQueryHandler
 
 from config import *
 from news_service import (
     fetch_trump_news,
-    fetch_voo_price,
-    format_news_message,
+    fetch_alert_articles,
+    mark_alerted,
+    quote_service,
+    render_news_message,
+    render_news_batch,
+    render_digest,
     load_alert_articles,
-    save_alert_articles
+    save_alert_articles,
+    read_sentiment_cache_file,
+    load_sentiment_cache,
+    save_sentiment_cache,
+    set_tracked_keywords,
+    shutdown_sentiment_pool,
+    warm_up_sentiment,
+    get_archive,
+    format_search_results,
+    sentiment_trends,
+    format_trend_message,
+    read_trend_history,
+    load_sentiment_trends
 )
+from matcher import normalize_keyword
+from quotes import normalize_symbol
+from archive import fts_query, parse_since
+from http_client import close_http_client, alpha_vantage_calls_today
+from scheduler import AdaptiveScheduler
+from delivery_queue import DeliveryQueue
+from delivery_worker import deliver_batch, run_worker
+from dispatcher import AlertDispatcher
+import metrics
+import storage
+
+# Sends alert fan-out concurrently within Telegram rate limits
+alert_dispatcher = AlertDispatcher()
+
+# Picks the delay between alert cycles; the lock keeps cycles from overlapping
+news_scheduler = AdaptiveScheduler()
+alert_cycle_lock = asyncio.Lock()
+
+# Outbox every alert goes through; delivery workers consume it when DELIVERY_MODE is "queue" (opened on first use)
+delivery_queue = None
+
+outbox_purged_at = time.monotonic()
+
+def get_delivery_queue():
+    global delivery_queue
+    if delivery_queue is None:
+        delivery_queue = DeliveryQueue()
+    return delivery_queue
+
+# Set once subscribers, preferences and alert history are loaded; handlers that use them wait for it
+state_ready = asyncio.Event()
+# Set once loading finished, whether or not it succeeded; state_load_error holds the failure
+state_load_finished = asyncio.Event()
+state_load_error = None
+
+async def wait_for_state():
+    """Wait for the startup state; raises if it failed to load."""
+    await state_load_finished.wait()
+    if state_load_error is not None:
+        raise RuntimeError("Bot state failed to load") from state_load_error
+
+def requires_state(handler):
+    """Wrap a handler so it waits for the startup state before running."""
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        await wait_for_state()
+        return await handler(update, context)
+    return wrapper
 
 # Track users subscribed to alerts
 subscribers = set()
@@ -19,6 +91,156 @@ subscribers = set()
 # User preferences - default to all sentiments
 user_preferences = {}  # {user_id: {"sentiments": ["positive", "neutral", "negative"]}}
 
+# Subscribed chat ids per sentiment category, kept in sync with subscribers and preferences
+sentiment_index = {category: set() for category in SENTIMENT_CATEGORIES}
+
+# Subscribed chat ids per custom keyword; subscribers without their own keywords follow DEFAULT_KEYWORDS
+keyword_index = {}  # {keyword: set(chat ids)}
+default_keyword_subscribers = set()
+indexed_keywords = {}  # {chat id: keywords it is indexed under}
+default_keywords = {normalize_keyword(keyword) for keyword in DEFAULT_KEYWORDS}
+
+# Tickers in the market block: custom watchlists of subscribers (the rest see DEFAULT_WATCHLIST)
+# and how many subscribers watch each ticker, so every cycle fetches the union, most-watched first
+user_watchlists = {}  # {chat id: tuple of symbols}
+watchlist_counts = Counter()  # {symbol: subscribers with a custom watchlist that includes it}
+
+# Subscribers in digest mode and the articles waiting for their next digest. Pending digests are
+# kept in storage too: their articles are marked as alerted when they're added, so a restart
+# would otherwise lose them.
+digest_subscribers = set()
+pending_digests = {}  # {chat id: {"since": timestamp, "articles": [digest entry, ...]}}
+
+def digest_entry(article):
+    """The fields of an article a digest shows, as a plain dict that can be stored."""
+    return {
+        "url": article["url"],
+        "title": article.get("title", ""),
+        "source": article.get("source", ""),
+        "time_published": article.get("time_published", ""),
+        "sentiment": {"category": article.get("sentiment", {}).get("category", "neutral")},
+    }
+
+def add_to_digest(user_id, entry):
+    """Queue an article (a digest_entry) for a subscriber's next digest."""
+    digest = pending_digests.setdefault(user_id, {"since": time.time(), "articles": []})
+    digest["articles"].append(entry)
+
+def has_due_digests():
+    """Return True if any pending digest's window has elapsed."""
+    now = time.time()
+    return any(now - digest["since"] >= DIGEST_WINDOW for digest in pending_digests.values())
+
+def pop_due_digests():
+    """Remove and return the digests whose window has elapsed: {chat id: [article, ...]}."""
+    now = time.time()
+    due = {}
+    for user_id, digest in list(pending_digests.items()):
+        if now - digest["since"] >= DIGEST_WINDOW:
+            due[user_id] = pending_digests.pop(user_id)["articles"]
+            storage.save_pending_digest(user_id, None)
+    return due
+
+def get_user_watchlist(user_id):
+    """Return the tickers a user watches (their own list or the default)."""
+    return tuple(user_preferences.get(user_id, {}).get("watchlist") or DEFAULT_WATCHLIST)
+
+def watched_symbols():
+    """Return every ticker some subscriber watches, most-watched first."""
+    counts = Counter(watchlist_counts)
+    default_watchers = len(subscribers) - len(user_watchlists)
+    if default_watchers > 0:
+        for symbol in DEFAULT_WATCHLIST:
+            counts[symbol] += default_watchers
+    return [symbol for symbol, count in counts.most_common() if count > 0]
+
+def get_user_keywords(user_id):
+    """Return the keywords a user follows (their own list or the defaults)."""
+    return user_preferences.get(user_id, {}).get("keywords") or sorted(default_keywords)
+
+def index_subscriber(user_id):
+    """Place a subscriber in the index buckets matching their sentiment and keyword preferences."""
+    selected_sentiments = user_preferences.get(user_id, {"sentiments": SENTIMENT_CATEGORIES})["sentiments"]
+    for category, chat_ids in sentiment_index.items():
+        if category in selected_sentiments:
+            chat_ids.add(user_id)
+        else:
+            chat_ids.discard(user_id)
+    
+    if user_preferences.get(user_id, {}).get("digest"):
+        digest_subscribers.add(user_id)
+    else:
+        digest_subscribers.discard(user_id)
+    
+    unindex_keywords(user_id)
+    custom_keywords = user_preferences.get(user_id, {}).get("keywords")
+    if custom_keywords:
+        for keyword in custom_keywords:
+            keyword_index.setdefault(keyword, set()).add(user_id)
+        indexed_keywords[user_id] = list(custom_keywords)
+    else:
+        default_keyword_subscribers.add(user_id)
+    
+    unindex_watchlist(user_id)
+    custom_watchlist = user_preferences.get(user_id, {}).get("watchlist")
+    if custom_watchlist:
+        user_watchlists[user_id] = tuple(custom_watchlist)
+        watchlist_counts.update(custom_watchlist)
+
+def unindex_watchlist(user_id):
+    """Remove a subscriber's custom watchlist from the ticker counts."""
+    watchlist = user_watchlists.pop(user_id, None)
+    if watchlist:
+        watchlist_counts.subtract(watchlist)
+        for symbol in watchlist:
+            if watchlist_counts[symbol] <= 0:
+                del watchlist_counts[symbol]
+
+def unindex_keywords(user_id):
+    """Remove a subscriber from the keyword buckets."""
+    default_keyword_subscribers.discard(user_id)
+    for keyword in indexed_keywords.pop(user_id, []):
+        chat_ids = keyword_index.get(keyword)
+        if chat_ids is not None:
+            chat_ids.discard(user_id)
+            if not chat_ids:
+                del keyword_index[keyword]
+
+def unindex_subscriber(user_id):
+    """Remove a subscriber from every index bucket."""
+    for chat_ids in sentiment_index.values():
+        chat_ids.discard(user_id)
+    digest_subscribers.discard(user_id)
+    unindex_keywords(user_id)
+    unindex_watchlist(user_id)
+
+def rebuild_sentiment_index():
+    """Rebuild the subscriber indexes from the loaded subscribers and preferences."""
+    for chat_ids in sentiment_index.values():
+        chat_ids.clear()
+    keyword_index.clear()
+    default_keyword_subscribers.clear()
+    digest_subscribers.clear()
+    indexed_keywords.clear()
+    user_watchlists.clear()
+    watchlist_counts.clear()
+    for user_id in subscribers:
+        index_subscriber(user_id)
+    refresh_tracked_keywords()
+
+def refresh_tracked_keywords():
+    """Make the news matcher track every keyword any user follows."""
+    set_tracked_keywords({keyword for prefs in user_preferences.values() for keyword in prefs.get("keywords", [])})
+
+def keyword_recipients(matched_keywords):
+    """Return the subscribers following any of the matched keywords."""
+    recipients = set()
+    for keyword in matched_keywords:
+        recipients |= keyword_index.get(keyword, set())
+    if not default_keywords.isdisjoint(matched_keywords):
+        recipients |= default_keyword_subscribers
+    return recipients
+
 # Command handlers
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start the bot."""
@@ -31,8 +253,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "sentiments": ["positive", "neutral", "negative"]  # Default to all sentiments
         }
     
-    save_subscribers()  # Save after adding subscriber
-    save_user_preferences()  # Save user preferences
+    index_subscriber(user_id)
+    storage.add_subscriber(user_id)  # Save after adding subscriber
+    storage.save_user_preference(user_id, user_preferences[user_id])  # Save user preferences
     
     # Create sentiment filter buttons
     keyboard = [
@@ -50,16 +273,23 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/stop - Unsubscribe from alerts\n"
         "/latest - Get the latest Trump news\n"
         "/preferences - Set your sentiment preferences\n"
+        "/keywords - Choose the keywords you follow\n"
         "/help - Show available commands",
         reply_markup=reply_markup
     )
 
-async def stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Unsubscribe from alerts."""
-    user_id = update.effective_user.id
+def unsubscribe(user_id):
+    """Remove a subscriber from memory, the indexes and storage."""
     if user_id in subscribers:
         subscribers.remove(user_id)
-        save_subscribers()  # Save after removing subscriber
+        unindex_subscriber(user_id)
+        if pending_digests.pop(user_id, None) is not None:
+            storage.save_pending_digest(user_id, None)
+        storage.remove_subscriber(user_id)  # Save after removing subscriber
+
+async def stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Unsubscribe from alerts."""
+    unsubscribe(update.effective_user.id)
     
     await update.message.reply_text("You've unsubscribed from Trump news alerts. Send /start to subscribe again.")
 
@@ -71,6 +301,10 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/stop - Unsubscribe from alerts\n"
         "/latest - Get the latest Trump news\n"
         "/preferences - Set your sentiment preferences\n"
+        "/keywords - Choose the keywords you follow\n"
+        "/watchlist - Choose the tickers shown under each message\n"
+        "/search <terms> [since] - Search past news, e.g. /search tariffs 7d\n"
+        "/trend - News sentiment over the last hour, day and week\n"
         "/help - Show this help message\n\n"
         "Sentiment Indicators:\n"
         "🟢 - Positive news\n"
@@ -78,10 +312,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "🔴 - Negative news"
     )
 
-async def preferences(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Show and set user preferences."""
-    user_id = update.effective_user.id
-    
+def build_preferences_view(user_id):
+    """Return the preferences text and toggle keyboard for a user."""
     # Create buttons for sentiment selection
     keyboard = [
         [
@@ -91,6 +323,9 @@ async def preferences(update: Update, context: ContextTypes.DEFAULT_TYPE):
         [
             InlineKeyboardButton("Negative News 🔴", callback_data="toggle_negative"),
             InlineKeyboardButton("All News", callback_data="select_all")
+        ],
+        [
+            InlineKeyboardButton("Digest Mode 📰", callback_data="toggle_digest")
         ]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -104,25 +339,119 @@ async def preferences(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "neutral": "⚪ Neutral news: " + ("Enabled ✅" if "neutral" in selected_sentiments else "Disabled ❌"),
         "negative": "🔴 Negative news: " + ("Enabled ✅" if "negative" in selected_sentiments else "Disabled ❌")
     }
+    digest_status = "📰 Digest mode: " + (
+        f"Enabled ✅ (one summary every {DIGEST_WINDOW // 60} minutes)" if current_prefs.get("digest") else "Disabled ❌"
+    )
     
     preferences_text = (
         "📊 Your News Preferences\n\n"
         f"{sentiment_status['positive']}\n"
         f"{sentiment_status['neutral']}\n"
-        f"{sentiment_status['negative']}\n\n"
+        f"{sentiment_status['negative']}\n"
+        f"{digest_status}\n\n"
         "Click below to toggle your preferences:"
     )
+    return preferences_text, reply_markup
+
+async def preferences(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show and set user preferences."""
+    user_id = update.effective_user.id
+    preferences_text, reply_markup = build_preferences_view(user_id)
+    await update.effective_message.reply_text(preferences_text, reply_markup=reply_markup)
+
+async def keywords_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show or set the keywords a user follows."""
+    user_id = update.effective_user.id
+    
+    if not context.args:
+        await update.message.reply_text(
+            f"🔎 You follow: {', '.join(get_user_keywords(user_id))}\n\n"
+            "Set your own keywords separated by commas, e.g.\n"
+            "/keywords trump, elon musk, tariff*\n"
+            "(a trailing * also matches longer words, like tariffs)\n\n"
+            "/keywords reset - go back to the default keywords"
+        )
+        return
     
-    await update.message.reply_text(preferences_text, reply_markup=reply_markup)
+    # Initialize user preferences if not already set
+    if user_id not in user_preferences:
+        user_preferences[user_id] = {
+            "sentiments": ["positive", "neutral", "negative"]
+        }
+    
+    text = " ".join(context.args)
+    if text.strip().lower() == "reset":
+        user_preferences[user_id].pop("keywords", None)
+    else:
+        keywords = []
+        for keyword in text.split(","):
+            keyword = normalize_keyword(keyword)
+            if keyword.strip("*") and keyword not in keywords:
+                keywords.append(keyword)
+        user_preferences[user_id]["keywords"] = keywords[:MAX_KEYWORDS_PER_USER]
+    
+    if user_id in subscribers:
+        index_subscriber(user_id)
+    refresh_tracked_keywords()
+    storage.save_user_preference(user_id, user_preferences[user_id])
+    
+    await update.message.reply_text(f"✅ You now follow: {', '.join(get_user_keywords(user_id))}")
+
+async def watchlist_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show or set the tickers shown in a user's market block."""
+    user_id = update.effective_user.id
+    
+    if not context.args:
+        await update.message.reply_text(
+            f"📈 Your watchlist: {', '.join(get_user_watchlist(user_id))}\n\n"
+            f"Set up to {MAX_WATCHLIST_SYMBOLS} tickers separated by commas, e.g.\n"
+            "/watchlist VOO, AAPL, MSFT\n\n"
+            f"/watchlist reset - go back to {', '.join(DEFAULT_WATCHLIST)}"
+        )
+        return
+    
+    # Initialize user preferences if not already set
+    if user_id not in user_preferences:
+        user_preferences[user_id] = {
+            "sentiments": ["positive", "neutral", "negative"]
+        }
+    
+    text = " ".join(context.args)
+    if text.strip().lower() == "reset":
+        user_preferences[user_id].pop("watchlist", None)
+    else:
+        symbols = []
+        for word in text.replace(",", " ").split():
+            symbol = normalize_symbol(word)
+            if symbol and symbol not in symbols:
+                symbols.append(symbol)
+        if not symbols:
+            await update.message.reply_text("No valid tickers found, e.g. /watchlist VOO, AAPL")
+            return
+        user_preferences[user_id]["watchlist"] = symbols[:MAX_WATCHLIST_SYMBOLS]
+    
+    if user_id in subscribers:
+        index_subscriber(user_id)
+    storage.save_user_preference(user_id, user_preferences[user_id])
+    
+    await update.message.reply_text(f"✅ Your watchlist: {', '.join(get_user_watchlist(user_id))}")
 
 async def handle_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle button presses for preferences."""
+    """Handle button presses for preferences and search paging."""
     query = update.callback_query
     await query.answer()
     
     user_id = query.from_user.id
     callback_data = query.data
     
+    if callback_data.startswith("search:"):
+        if user_id not in search_sessions:
+            await query.edit_message_text("This search has expired. Send /search again.")
+            return
+        text, reply_markup = await build_search_page(user_id, int(callback_data.split(":", 1)[1]))
+        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode="Markdown", disable_web_page_preview=True)
+        return
+    
     # Initialize user preferences if not already set
     if user_id not in user_preferences:
         user_preferences[user_id] = {
@@ -155,6 +484,8 @@ async def handle_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
             selected_sentiments.append("negative")
     elif callback_data == "select_all":
         selected_sentiments = ["positive", "neutral", "negative"]
+    elif callback_data == "toggle_digest":
+        current_prefs["digest"] = not current_prefs.get("digest", False)
     
     # Make sure at least one is selected
     if not selected_sentiments:
@@ -162,36 +493,68 @@ async def handle_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.message.reply_text("⚠️ You must select at least one sentiment type. Resetting to all types.")
     
     user_preferences[user_id]["sentiments"] = selected_sentiments
-    save_user_preferences()
+    if user_id in subscribers:
+        index_subscriber(user_id)
+    storage.save_user_preference(user_id, user_preferences[user_id])
     
     # Update the message with current preferences
-    sentiment_status = {
-        "positive": "🟢 Positive news: " + ("Enabled ✅" if "positive" in selected_sentiments else "Disabled ❌"),
-        "neutral": "⚪ Neutral news: " + ("Enabled ✅" if "neutral" in selected_sentiments else "Disabled ❌"),
-        "negative": "🔴 Negative news: " + ("Enabled ✅" if "negative" in selected_sentiments else "Disabled ❌")
-    }
+    preferences_text, reply_markup = build_preferences_view(user_id)
     
-    preferences_text = (
-        "📊 Your News Preferences\n\n"
-        f"{sentiment_status['positive']}\n"
-        f"{sentiment_status['neutral']}\n"
-        f"{sentiment_status['negative']}\n\n"
-        "Click below to toggle your preferences:"
-    )
+    await query.edit_message_text(text=preferences_text, reply_markup=reply_markup)
+
+# Each user's last search, for the paging buttons: {chat id: (words, since)}
+search_sessions = {}
+
+async def build_search_page(user_id, offset):
+    """Run a user's search and return one page of results with Newer/Older buttons."""
+    words, since = search_sessions[user_id]
+    selected_sentiments = user_preferences.get(user_id, {}).get("sentiments")
+    categories = selected_sentiments if selected_sentiments and len(selected_sentiments) < 3 else None
+    archive = get_archive()
+    with metrics.timer("search_seconds"):
+        total, articles = await asyncio.to_thread(archive.search, words, since, categories, SEARCH_PAGE_SIZE, offset)
+    if not articles:
+        return f"No archived articles match \"{words}\".", None
+    
+    buttons = []
+    if offset > 0:
+        buttons.append(InlineKeyboardButton("◀ Newer", callback_data=f"search:{max(0, offset - SEARCH_PAGE_SIZE)}"))
+    if offset + SEARCH_PAGE_SIZE < total:
+        buttons.append(InlineKeyboardButton("Older ▶", callback_data=f"search:{offset + SEARCH_PAGE_SIZE}"))
+    return format_search_results(words, articles, offset, total), InlineKeyboardMarkup([buttons]) if buttons else None
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Search the archive of past articles: /search <terms> [since]."""
+    args = context.args or []
+    since = parse_since(args[-1]) if len(args) > 1 else None
+    words = fts_query(" ".join(args[:-1] if since else args)).replace('"', "")
+    if not words:
+        await update.message.reply_text(
+            "Usage: /search <terms> [since]\n"
+            "e.g. /search tariffs, /search trade deal 7d, /search fed 2024-05-01 (since can be 24h, 7d, 2w or a date)"
+        )
+        return
     
-    keyboard = [
-        [
-            InlineKeyboardButton("Positive News 🟢", callback_data="toggle_positive"),
-            InlineKeyboardButton("Neutral News ⚪", callback_data="toggle_neutral")
-        ],
-        [
-            InlineKeyboardButton("Negative News 🔴", callback_data="toggle_negative"),
-            InlineKeyboardButton("All News", callback_data="select_all")
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    user_id = update.effective_user.id
+    search_sessions[user_id] = (words, since)
+    text, reply_markup = await build_search_page(user_id, 0)
+    await update.message.reply_text(text, reply_markup=reply_markup, parse_mode="Markdown", disable_web_page_preview=True)
+
+async def trend_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show rolling sentiment aggregates for recent news."""
+    await update.message.reply_text(format_trend_message(sentiment_trends.summaries()), parse_mode="Markdown")
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show bot metrics to admins."""
+    if update.effective_chat.id not in ADMIN_CHAT_IDS:
+        await update.message.reply_text("This command is only available to admins.")
+        return
     
-    await query.edit_message_text(text=preferences_text, reply_markup=reply_markup)
+    lines = metrics.summary_lines() or ["No metrics recorded yet."]
+    text = "📊 Bot Stats\n\n" + "\n".join(lines)
+    # Long stat dumps are split to fit Telegram's message limit
+    for start_index in range(0, len(text), TELEGRAM_MESSAGE_LIMIT):
+        await update.message.reply_text(text[start_index:start_index + TELEGRAM_MESSAGE_LIMIT])
 
 async def get_latest(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send latest Trump news on demand."""
@@ -203,12 +566,20 @@ async def get_latest(update: Update, context: ContextTypes.DEFAULT_TYPE):
     selected_sentiments = user_prefs["sentiments"]
     
     # Fetch Trump news articles
-    articles = await fetch_trump_news(for_alerts=False)
+    articles = await fetch_trump_news()
     
     if not articles:
         await update.message.reply_text("No recent Trump news found. Try again later.")
         return
     
+    # Keep only articles matching the user's keywords
+    user_keywords = set(get_user_keywords(user_id))
+    articles = [a for a in articles if not user_keywords.isdisjoint(a.get("matched_keywords", ()))]
+    
+    if not articles:
+        await update.message.reply_text("No recent news matches your keywords. Use /keywords to change them.")
+        return
+    
     # Filter articles based on user sentiment preferences
     filtered_articles = [a for a in articles if a.get("sentiment", {}).get("category") in selected_sentiments]
     
@@ -221,65 +592,175 @@ async def get_latest(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    # Fetch the latest VOO price
-    voo_data = await fetch_voo_price()
+    # Quotes for the user's watchlist, from the shared snapshot (refreshed if stale)
+    watchlist = get_user_watchlist(user_id)
+    quote_snapshot = await quote_service.refresh(watchlist)
     
-    # Send up to MAX_ARTICLES_PER_REQUEST latest articles that match sentiment preferences
-    for article in filtered_articles[:MAX_ARTICLES_PER_REQUEST]:
-        news_text = format_news_message(article, include_alert_header=False, include_voo_data=voo_data)
+    # Send up to MAX_LATEST_ARTICLES latest articles that match sentiment preferences
+    for news_text in render_news_batch(filtered_articles[:MAX_LATEST_ARTICLES], include_alert_header=False,
+                                       quote_snapshot=quote_snapshot, watchlist=watchlist):
         await update.message.reply_text(news_text, parse_mode="Markdown")
 
 # Periodic news check and alert function
 async def check_news_and_alert(context: ContextTypes.DEFAULT_TYPE):
     """Check for new Trump news and send alerts to subscribers."""
-    print(f"Running scheduled news check at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    
-    if not subscribers:
-        print("No subscribers to alert")
-        return  # No subscribers to alert
+    cycle_started = time.monotonic()
     
-    # Fetch new Trump news articles
-    articles = await fetch_trump_news(for_alerts=True)
-    
-    if not articles:
-        print("No new articles found")
-        return  # No new articles
+    # Unsubscribe chats the outbox found blocked or deleted since the last cycle (in queue mode the
+    # delivery workers record them), so they get no new alerts
+    await prune_dead_chats()
+    metrics.set_gauge("subscribers", len(subscribers))
     
-    print(f"Found {len(articles)} new articles to send as alerts")
-    
-    # Fetch the latest VOO price
-    voo_data = await fetch_voo_price()
-    
-    # Send notifications to subscribers based on their preferences (limit to MAX_ARTICLES_PER_ALERT newest articles)
-    for article in articles[:MAX_ARTICLES_PER_ALERT]:
+    if not subscribers:
+        metrics.log_event("alert_cycle_skipped", reason="no_subscribers")
+        return 0  # No subscribers to alert
+    
+    # Fetch new Trump news articles; they are only marked as alerted (and the
+    # source watermarks advanced) once the cycle's alerts are in the outbox
+    with metrics.timer("alert_fetch_seconds"):
+        articles, watermarks = await fetch_alert_articles()
+    metrics.inc("alert_articles_total", len(articles))
+    
+    if not articles and not has_due_digests():
+        mark_alerted(articles, watermarks)
+        metrics.log_event("alert_cycle_skipped", reason="no_new_articles")
+        return 0  # No new articles
+    
+    # Refresh the quotes of every watched ticker once; the whole cycle renders from this one snapshot
+    quote_snapshot = await quote_service.refresh(watched_symbols())
+    
+    # Build each subscriber's messages based on their preferences (limit to MAX_ALERTS_PER_CHECK newest articles per user);
+    # each message is keyed by its article so the outbox never delivers one twice to the same chat
+    jobs = {}
+    digests_changed = set()
+    for article in articles:
         sentiment_category = article.get("sentiment", {}).get("category", "neutral")
+        rendered = {}  # {watchlist: text}; each message is rendered once per watchlist and shared by its recipients
+        entry = None
         
-        news_text = format_news_message(article, include_alert_header=True, include_voo_data=voo_data)
-        
-        for user_id in subscribers:
-            # Check user's sentiment preferences
-            user_prefs = user_preferences.get(user_id, {"sentiments": ["positive", "neutral", "negative"]})
-            if sentiment_category in user_prefs["sentiments"]:
-                try:
-                    await context.bot.send_message(
-                        chat_id=user_id,
-                        text=news_text,
-                        parse_mode="Markdown"
-                    )
-                    print(f"Sent {sentiment_category} alert to user {user_id}")
-                except Exception as e:
-                    print(f"Failed to send alert to user {user_id}: {e}")
-            else:
-                print(f"Skipped {sentiment_category} alert for user {user_id} due to preferences")
+        # Recipients follow one of the matched keywords and want this sentiment category
+        recipients = keyword_recipients(article.get("matched_keywords", ())) & sentiment_index.get(sentiment_category, set())
+        for user_id in recipients:
+            if user_id in digest_subscribers:
+                entry = entry or digest_entry(article)
+                add_to_digest(user_id, entry)
+                digests_changed.add(user_id)
+                continue
+            messages = jobs.setdefault(user_id, [])
+            if len(messages) < MAX_ALERTS_PER_CHECK:
+                watchlist = user_watchlists.get(user_id, DEFAULT_WATCHLIST)
+                news_text = rendered.get(watchlist)
+                if news_text is None:
+                    news_text = rendered[watchlist] = render_news_message(article, True, quote_snapshot, watchlist)
+                messages.append((article["url"], news_text))
+    
+    # Stored in the same write batch as mark_alerted() below, so a restart keeps them
+    for user_id in digests_changed:
+        storage.save_pending_digest(user_id, pending_digests[user_id])
+    
+    # Digest subscribers get one summary message for everything in their window
+    for user_id, digest_articles in pop_due_digests().items():
+        digest_id = hashlib.blake2b("\n".join(sorted(article["url"] for article in digest_articles)).encode(),
+                                    digest_size=16).hexdigest()
+        watchlist = user_watchlists.get(user_id, DEFAULT_WATCHLIST)
+        jobs.setdefault(user_id, []).extend(
+            (f"digest:{digest_id}:{part}", text) for part, text in enumerate(render_digest(digest_articles, quote_snapshot, watchlist))
+        )
+    
+    # Alerts go through the outbox, which survives restarts and retries failed sends
+    queue = get_delivery_queue()
+    queued = await asyncio.to_thread(queue.enqueue, jobs)
+    mark_alerted(articles, watermarks)
+    if DELIVERY_MODE == "queue":
+        # Hand the alerts to the delivery workers
+        depth = await asyncio.to_thread(queue.depth)
+        metrics.set_gauge("delivery_queue_depth", depth)
+        metrics.log_event("alert_cycle", articles=len(articles), users=len(jobs), queued=queued,
+                          queue_depth=depth, duration=round(time.monotonic() - cycle_started, 3))
+        return len(articles)
+    
+    # Send all due alerts (including earlier ones waiting for a retry) concurrently within Telegram's rate limits
+    stats = await deliver_outbox(context.bot)
+    await prune_dead_chats()
+    metrics.log_event(
+        "alert_cycle", articles=len(articles), users=len(jobs), queued=queued, sent=stats["sent"],
+        failed=stats["failed"], retries=stats["retries"], fanout_duration=round(stats["duration"], 3),
+        throughput=round(stats["throughput"], 1), latency_p50_ms=round(stats["latency_p50"] * 1000),
+        latency_p95_ms=round(stats["latency_p95"] * 1000), duration=round(time.monotonic() - cycle_started, 3)
+    )
+    return len(articles)
+
+async def deliver_outbox(bot):
+    """Send every message in the outbox that is due, from this process, and return the dispatcher stats."""
+    global outbox_purged_at
+    queue = get_delivery_queue()
+    if time.monotonic() - outbox_purged_at > DELIVERY_PURGE_INTERVAL:
+        await asyncio.to_thread(queue.purge)
+        outbox_purged_at = time.monotonic()
+    rows = await asyncio.to_thread(queue.lease, "local", list(range(queue.shards)), -1)  # -1: no limit
+    return await deliver_batch(bot, queue, alert_dispatcher, rows, "local")
+
+async def prune_dead_chats():
+    """Unsubscribe the chats the outbox found blocked or deleted."""
+    chat_ids = await asyncio.to_thread(get_delivery_queue().take_dead_chats)
+    for chat_id in chat_ids:
+        unsubscribe(chat_id)
+    if chat_ids:
+        metrics.log_event("dead_chats_unsubscribed", count=len(chat_ids))
+
+async def retry_deliveries(context: ContextTypes.DEFAULT_TYPE):
+    """Job queue callback (local delivery): send retries that came due between alert cycles."""
+    if alert_cycle_lock.locked() or not state_ready.is_set():
+        return
+    async with alert_cycle_lock:
+        stats = await deliver_outbox(context.bot)
+        await prune_dead_chats()
+    if stats["sent"] or stats["failed"]:
+        metrics.log_event("delivery_retry", sent=stats["sent"], failed=stats["failed"])
+
+async def prune_dead_chats_job(context: ContextTypes.DEFAULT_TYPE):
+    """Job queue callback (queue delivery): unsubscribe the dead chats workers found between alert cycles."""
+    if alert_cycle_lock.locked() or not state_ready.is_set():
+        return
+    async with alert_cycle_lock:
+        await prune_dead_chats()
+
+async def run_alert_cycle(context):
+    """Run one alert cycle and feed the scheduler.
+
+    Cycles are chained (each one schedules the next), so the lock is only ever
+    held by the outbox jobs here: wait for them rather than skip the cycle.
+    """
+    async with alert_cycle_lock:
+        await wait_for_state()
+        if RELOAD_STATE_EACH_CYCLE:
+            # Pick up /start, /stop and preference changes handled by other bot processes
+            apply_state(*await asyncio.to_thread(read_user_state))
+        calls_before = alpha_vantage_calls_today()
+        new_articles = await check_news_and_alert(context)
+        news_scheduler.record_cycle(new_articles or 0, max(0, alpha_vantage_calls_today() - calls_before))
+
+async def scheduled_news_check(context: ContextTypes.DEFAULT_TYPE):
+    """Job queue callback: run a cycle, then schedule the next one once it has finished."""
+    try:
+        await run_alert_cycle(context)
+    except Exception as e:
+        print(f"Error in scheduled news check: {e}")
+    finally:
+        # Scheduling after completion means cycles can never overlap
+        delay = news_scheduler.next_interval()
+        context.job_queue.run_once(scheduled_news_check, when=delay)
+        print(f"Next news check in {delay:.0f} seconds")
 
 # Function to manually check news periodically if job queue isn't available
 async def manual_news_check(application):
     """Manual implementation of periodic news checks if job queue isn't available"""
     print("Starting manual news checker backup system")
+    delay = NEWS_CHECK_INITIAL_DELAY
     while True:
         try:
-            # Wait for NEWS_CHECK_INTERVAL between checks
-            await asyncio.sleep(NEWS_CHECK_INTERVAL)
+            # Wait for the adaptive interval between checks
+            await asyncio.sleep(delay)
             print(f"Manual check triggered at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
             
             # Create a dummy context object
@@ -290,93 +771,194 @@ async def manual_news_check(application):
             dummy_context = DummyContext(application.bot)
             
             # Run the news check
-            await check_news_and_alert(dummy_context)
+            await run_alert_cycle(dummy_context)
+            delay = news_scheduler.next_interval()
+            print(f"Next news check in {delay:.0f} seconds")
         except Exception as e:
             print(f"Error in manual news check: {e}")
-            await asyncio.sleep(60)  # If error, wait a minute and try again
+            delay = 60  # If error, wait a minute and try again
 
 # Data persistence functions
-def save_subscribers():
-    """Save subscribers to a file"""
-    with open(SUBSCRIBERS_FILE, "w") as f:
-        json.dump(list(subscribers), f)
-    print(f"Saved {len(subscribers)} subscribers")
-
-def load_subscribers():
-    """Load subscribers from a file"""
-    global subscribers
-    try:
-        with open(SUBSCRIBERS_FILE, "r") as f:
-            subscribers = set(json.load(f))
-        print(f"Loaded {len(subscribers)} subscribers")
-    except FileNotFoundError:
-        subscribers = set()
-        print("No subscribers file found, starting with empty set")
-
-def save_user_preferences():
-    """Save user preferences to a file"""
-    with open(USER_PREFERENCES_FILE, "w") as f:
-        json.dump(user_preferences, f)
-    print(f"Saved preferences for {len(user_preferences)} users")
-
-def load_user_preferences():
-    """Load user preferences from a file"""
-    global user_preferences
+def read_user_state():
+    """Read subscribers and preferences from storage (runs in a worker thread)."""
+    return storage.load_subscribers(), storage.load_user_preferences()
+
+def read_state():
+    """Load subscribers, preferences, pending digests and alert history from storage (runs in a worker thread)."""
+    load_alert_articles()
+    return (*read_user_state(), storage.load_pending_digests())
+
+def apply_state(loaded_subscribers, loaded_preferences):
+    """Replace the in-memory subscribers and preferences and rebuild the indexes."""
+    global subscribers, user_preferences
+    subscribers, user_preferences = loaded_subscribers, loaded_preferences
+    rebuild_sentiment_index()
+
+async def load_state(application):
+    """Load the bot's state off the event loop, then warm up sentiment scoring in the background.
+
+    Polling (or the webhook server) starts while this runs, so early updates are
+    received right away and handled as soon as state_ready is set. If the state
+    can't be loaded, waiting handlers fail and the Application is stopped rather
+    than left running without it.
+    """
+    global state_load_error
+    state_started = time.monotonic()
     try:
-        with open(USER_PREFERENCES_FILE, "r") as f:
-            user_preferences = json.load(f)
-        print(f"Loaded preferences for {len(user_preferences)} users")
-    except FileNotFoundError:
-        user_preferences = {}
-        print("No user preferences file found, starting with empty dict")
+        loaded_subscribers, loaded_preferences, loaded_digests = await asyncio.to_thread(read_state)
+        apply_state(loaded_subscribers, loaded_preferences)
+        pending_digests.update(loaded_digests)
+    except Exception as e:
+        state_load_error = e
+        state_load_finished.set()
+        print(f"Error loading bot state, stopping: {e!r}")
+        metrics.log_event("state_load_failed", error=repr(e))
+        # stop_running() does nothing until the Application has started, which happens after post_init
+        while not application.running:
+            await asyncio.sleep(0.1)
+        application.stop_running()
+        return
+    print(f"Loaded {len(subscribers)} subscribers")
+    print(f"Loaded preferences for {len(user_preferences)} users")
+    state_ready.set()
+    state_load_finished.set()
+    metrics.set_ready()
+    metrics.set_gauge("startup_seconds", time.monotonic() - started_at)
+    metrics.log_event("ready", startup_seconds=round(time.monotonic() - started_at, 3),
+                      state_load_seconds=round(time.monotonic() - state_started, 3), subscribers=len(subscribers))
+    
+    # Not needed to answer commands, so done after the bot is ready
+    entries = await asyncio.to_thread(read_sentiment_cache_file)
+    if entries:
+        load_sentiment_cache(entries)
+    load_sentiment_trends(await asyncio.to_thread(read_trend_history))
+    await asyncio.to_thread(warm_up_sentiment)
+
+async def post_init(application):
+    """Start loading state, the metrics endpoint, and the backup scheduler if the job queue isn't available."""
+    # Keep a reference so the task isn't garbage collected
+    application.bot_data["load_state_task"] = asyncio.create_task(load_state(application))
+    if METRICS_PORT:
+        application.bot_data["metrics_server"] = await metrics.start_metrics_server()
+    if application.job_queue is None and ALERT_CYCLES_ENABLED:
+        print("Warning: Job queue is not available. Using backup scheduler.")
+        application.create_task(manual_news_check(application))
+
+async def post_shutdown(application):
+    """Flush state and release shared resources once the Application has stopped.
+
+    run_polling and run_webhook both stop on SIGINT, SIGTERM and SIGABRT, so this
+    also runs when a deploy terminates the process.
+    """
+    load_state_task = application.bot_data.pop("load_state_task", None)
+    if load_state_task is not None and not load_state_task.done():
+        load_state_task.cancel()
+    metrics_server = application.bot_data.pop("metrics_server", None)
+    if metrics_server is not None:
+        metrics_server.close()
+    await close_http_client()
+    shutdown_sentiment_pool()
+    # Saving before the state finished loading would overwrite it with empty data
+    if state_ready.is_set():
+        save_sentiment_cache()
+        save_alert_articles()
+    storage.close()
 
 def main():
     """Start the bot."""
     # Create the Application
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .base_url(TELEGRAM_API_BASE_URL)
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
-    # Add command handlers
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("stop", stop))
+    # Add command handlers; handlers that use subscribers or preferences wait until they're loaded
+    application.add_handler(CommandHandler("start", requires_state(start)))
+    application.add_handler(CommandHandler("stop", requires_state(stop)))
     application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("latest", get_latest))
-    application.add_handler(CommandHandler("preferences", preferences))
+    application.add_handler(CommandHandler("latest", requires_state(get_latest)))
+    application.add_handler(CommandHandler("preferences", requires_state(preferences)))
+    application.add_handler(CommandHandler("keywords", requires_state(keywords_command)))
+    application.add_handler(CommandHandler("watchlist", requires_state(watchlist_command)))
+    application.add_handler(CommandHandler("search", requires_state(search_command)))
+    application.add_handler(CommandHandler("trend", trend_command))
+    application.add_handler(CommandHandler("stats", stats_command))
     
     # Add callback query handler for buttons
-    application.add_handler(CallbackQueryHandler(handle_button))
+    application.add_handler(CallbackQueryHandler(requires_state(handle_button)))
 
-    # Set up periodic news check (every NEWS_CHECK_INTERVAL seconds) if job queue is available
-    try:
-        job_queue = application.job_queue
-        if job_queue:
-            print("Setting up scheduled job queue")
-            job_queue.run_repeating(check_news_and_alert, interval=NEWS_CHECK_INTERVAL, first=NEWS_CHECK_INITIAL_DELAY)
-            print("Job queue successfully configured")
+    # Set up periodic news checks if job queue is available; each check schedules
+    # the next one with an interval chosen by the adaptive scheduler
+    # (otherwise post_init starts the backup scheduler)
+    if not ALERT_CYCLES_ENABLED:
+        print("Alert cycles are disabled in this process")
+    elif application.job_queue:
+        print("Setting up scheduled job queue")
+        application.job_queue.run_once(scheduled_news_check, when=NEWS_CHECK_INITIAL_DELAY)
+        if DELIVERY_MODE == "local":
+            # Retries (and messages left over from before a restart) don't wait for the next alert cycle
+            application.job_queue.run_repeating(retry_deliveries, interval=DELIVERY_RETRY_BASE_DELAY)
         else:
-            print("Warning: Job queue is not available. Using backup scheduler.")
-            # Set up the manual news check
-            asyncio.ensure_future(manual_news_check(application))
-    except Exception as e:
-        print(f"Error setting up job queue: {e}")
-        # Set up the manual news check as fallback
-        asyncio.ensure_future(manual_news_check(application))
+            # Delivery workers record blocked and deleted chats in the outbox; this process unsubscribes them
+            application.job_queue.run_repeating(prune_dead_chats_job, interval=DELIVERY_RETRY_BASE_DELAY)
+        print("Job queue successfully configured")
 
     # Start the Bot
-    print(f"Bot starting at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    application.run_polling()
+    print(f"Bot starting in {BOT_MODE} mode at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    if BOT_MODE == "webhook":
+        run_webhook(application)
+    else:
+        application.run_polling()
+    if state_load_error is not None:
+        raise SystemExit(1)  # Let the supervisor see the failed start
+
+def run_webhook(application):
+    """Serve updates from Telegram on a local HTTP endpoint instead of polling for them."""
+    if not WEBHOOK_URL:
+        raise SystemExit("BOT_MODE=webhook needs WEBHOOK_URL (the public URL Telegram sends updates to)")
+    secret_token = WEBHOOK_SECRET_TOKEN
+    if not secret_token:
+        # Every process behind a load balancer must share one token, so set it explicitly there
+        secret_token = secrets.token_urlsafe(32)
+        print("Warning: WEBHOOK_SECRET_TOKEN is not set, using a random token for this process")
+    
+    # Requests without the matching X-Telegram-Bot-Api-Secret-Token header are rejected
+    application.run_webhook(
+        listen=WEBHOOK_LISTEN,
+        port=WEBHOOK_PORT,
+        url_path=urlsplit(WEBHOOK_URL).path.lstrip("/"),
+        webhook_url=WEBHOOK_URL,
+        secret_token=secret_token,
+        max_connections=WEBHOOK_MAX_CONNECTIONS
+    )
 
 if __name__ == "__main__":
-    print(f"Starting Trump News Alert Bot with Sentiment Analysis at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    # Load data when starting
-    load_subscribers()
-    load_alert_articles()
-    load_user_preferences()
+    parser = argparse.ArgumentParser(description="Trump News Alert Bot")
+    parser.add_argument("--role", choices=["bot", "worker"], default="bot",
+                        help="bot: handle commands and ingest news; worker: deliver queued alerts")
+    parser.add_argument("--worker-id", help="stable id for a delivery worker (defaults to host-pid)")
+    parser.add_argument("--metrics-port", type=int, default=0, help="serve a delivery worker's metrics on this port")
+    args = parser.parse_args()
+    
+    if args.role == "worker":
+        try:
+            asyncio.run(run_worker(args.worker_id, args.metrics_port))
+        except KeyboardInterrupt:
+            print("Delivery worker stopped.")
+        raise SystemExit(0)
     
+    print(f"Starting Trump News Alert Bot with Sentiment Analysis at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    # State is loaded by post_init in the background, so polling starts right away
     try:
         main()
     except KeyboardInterrupt:
-        # Save data when shutting down
-        save_subscribers()
-        save_alert_articles()
-        save_user_preferences()
+        # Make sure queued writes reach storage when shutting down
+        if state_ready.is_set():
+            save_alert_articles()
+        storage.close()
         print("Bot stopped. Data saved.")
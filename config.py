@@ -7,26 +7,147 @@ load_dotenv()
 
 # API Tokens and Keys
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL", "https://api.telegram.org/bot")
 ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY") 
+ALPHA_VANTAGE_URL = os.getenv("ALPHA_VANTAGE_URL", "https://www.alphavantage.co/query")
+ALPHA_VANTAGE_DAILY_QUOTA = int(os.getenv("ALPHA_VANTAGE_DAILY_QUOTA", "25"))  # requests per day
+ALPHA_VANTAGE_QUOTA_RESERVE = 0.2  # share of the daily quota kept free for /latest
+ALPHA_VANTAGE_CALLS_PER_MINUTE = int(os.getenv("ALPHA_VANTAGE_CALLS_PER_MINUTE", "5"))  # burst limit for quote fetches
+
+# How the bot receives updates: "polling" (getUpdates) or "webhook" (Telegram POSTs updates to WEBHOOK_URL)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # public HTTPS URL, e.g. https://example.com/telegram
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")  # generated per process if unset
+WEBHOOK_MAX_CONNECTIONS = 40  # concurrent connections Telegram may open to the webhook
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "32"))  # updates handled at the same time
+
+# Several bot processes behind a load balancer: run alert cycles in one of them and have it
+# re-read subscribers and preferences (changed by the others) from storage before each cycle
+ALERT_CYCLES_ENABLED = os.getenv("ALERT_CYCLES_ENABLED", "true").lower() == "true"
+RELOAD_STATE_EACH_CYCLE = os.getenv("RELOAD_STATE_EACH_CYCLE", "false").lower() == "true"
 
 # Alerts configuration
-NEWS_CHECK_INTERVAL = 900  # 15 minutes in seconds
+NEWS_CHECK_INTERVAL = 900  # 15 minutes in seconds; starting interval for the adaptive scheduler
 NEWS_CHECK_INITIAL_DELAY = 10  # seconds
+NEWS_CHECK_MIN_INTERVAL = 120  # seconds
+NEWS_CHECK_MAX_INTERVAL = 3600  # seconds
+NEWS_TARGET_ARTICLES_PER_CHECK = 2  # the interval adapts so about this many new articles arrive per check
+NEWS_CHECK_JITTER = 0.1  # +/- share of the interval added at random
+
+# HTTP client configuration
+HTTP_TIMEOUT = 10.0  # seconds per request
+HTTP_CONNECT_TIMEOUT = 5.0  # seconds
+HTTP_MAX_CONNECTIONS = 10
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 5
+HTTP_MAX_CONCURRENT_REQUESTS = 4
+
+# Alert fan-out configuration
+FANOUT_WORKERS = 20  # concurrent senders per alert cycle
+TELEGRAM_GLOBAL_RATE_LIMIT = 25  # messages per second across all chats (Telegram allows ~30)
+TELEGRAM_PER_CHAT_INTERVAL = 1.0  # seconds between messages to the same chat
+MAX_SEND_RETRIES = 3  # retries on flood control or network errors
+
+# Alert delivery: alerts always go through the outbox in DELIVERY_QUEUE_FILE; "local" sends them
+# from the bot process, "queue" leaves them to delivery workers (run them with `python bot.py --role worker`)
+DELIVERY_MODE = os.getenv("DELIVERY_MODE", "local")
+DELIVERY_QUEUE_FILE = "delivery_queue.db"
+DELIVERY_SHARDS = 16  # chat ids are hashed onto this many shards
+DELIVERY_BATCH_SIZE = 200  # messages leased per worker round
+DELIVERY_LEASE_SECONDS = 120  # leased messages return to the queue if not acked in time
+DELIVERY_HEARTBEAT_INTERVAL = 5  # seconds
+DELIVERY_WORKER_TIMEOUT = 30  # seconds without a heartbeat before a worker's shards are reassigned
+DELIVERY_POLL_INTERVAL = 1.0  # seconds to wait when the queue is empty
+DELIVERY_MAX_ATTEMPTS = 5
+DELIVERY_RETRY_BASE_DELAY = 30  # seconds before the first retry of a failed message, doubling each time
+DELIVERY_RETRY_MAX_DELAY = 3600
+DELIVERY_RETENTION = 24 * 3600  # seconds to keep finished deliveries
+DELIVERY_PURGE_INTERVAL = 600  # seconds between purges of finished deliveries
 
-# File paths for persistent storage
+# Metrics: Prometheus text format served on a local endpoint (METRICS_PORT=0 disables it)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# Chat ids allowed to use /stats (comma-separated)
+ADMIN_CHAT_IDS = {int(chat_id) for chat_id in os.getenv("ADMIN_CHAT_IDS", "").split(",") if chat_id.strip()}
+
+# Persistent storage
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")  # "sqlite" or legacy "json"
+DATABASE_FILE = "alertmee.db"
+STORAGE_FLUSH_DELAY = float(os.getenv("STORAGE_FLUSH_DELAY", "0.5"))  # seconds of quiet before queued writes are flushed
+STORAGE_FLUSH_MAX_DELAY = float(os.getenv("STORAGE_FLUSH_MAX_DELAY", "2.0"))  # longest a write may wait during a burst
+
+# Archive of every ingested article, searchable with /search
+ARCHIVE_FILE = "articles.db"
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "90"))
+ARCHIVE_MAX_ARTICLES = int(os.getenv("ARCHIVE_MAX_ARTICLES", "200000"))
+ARCHIVE_COMPACT_INTERVAL = 3600  # seconds between archive compactions
+SEARCH_PAGE_SIZE = 5  # results per /search page
+
+# Legacy JSON files (also imported into SQLite on first run)
 SUBSCRIBERS_FILE = "subscribers.json"
 ARTICLES_HISTORY_FILE = "alert_articles.json"
 USER_PREFERENCES_FILE = "user_preferences.json"
+NEWS_STATE_FILE = "news_state.json"  # per-source fetch watermarks (JSON backend only)
+PENDING_DIGESTS_FILE = "pending_digests.json"  # articles waiting for the next digest (JSON backend only)
+
+# News sources (fetched concurrently and merged)
+ALPHA_VANTAGE_NEWS_ENABLED = os.getenv("ALPHA_VANTAGE_NEWS_ENABLED", "true").lower() == "true"
+RSS_FEED_URLS = [url for url in os.getenv("RSS_FEED_URLS", "").split(",") if url]  # comma-separated RSS/Atom URLs
+NEWS_FILE_SOURCES = [path for path in os.getenv("NEWS_FILE_SOURCES", "").split(",") if path]  # local JSON/RSS files for offline testing
+
+# Digest mode (opt-in via /preferences): one summary message per window instead of one per article
+DIGEST_WINDOW = 3600  # seconds
+DIGEST_MAX_ARTICLES = 10
+TELEGRAM_MESSAGE_LIMIT = 4096  # characters
+
+# Keyword tracking
+DEFAULT_KEYWORDS = ["trump"]  # followed by users who haven't set their own keywords
+MAX_KEYWORDS_PER_USER = 10
+
+# Incremental alert fetching
+INCREMENTAL_MAX_GAP = 6 * 3600  # seconds; do a full fetch if a source wasn't fetched for this long
 
 # News fetch configuration
 MAX_ALERTS_PER_CHECK = 3
 MAX_LATEST_ARTICLES = 5
-MAX_TRACKED_ARTICLES = 50
+MAX_TRACKED_ARTICLES = 500  # alerted URLs remembered for dedup; keep well above one feed page
+
+# Cache staleness for shared API results (seconds)
+NEWS_CACHE_TTL = 120  # enriched news feed used by /latest
+QUOTE_CACHE_TTL = 60  # GLOBAL_QUOTE result per ticker
+
+# Watchlists: tickers whose quotes are shown under each message (set per user with /watchlist)
+DEFAULT_WATCHLIST = ("VOO",)
+MAX_WATCHLIST_SYMBOLS = 5
+QUOTE_QUOTA_SHARE = float(os.getenv("QUOTE_QUOTA_SHARE", "0.4"))  # most of the daily Alpha Vantage quota quotes may use
+QUOTE_UNKNOWN_SYMBOL_TTL = 6 * 3600  # seconds before a ticker Alpha Vantage doesn't know is asked for again
+
+# Sentiment categories (all enabled by default)
+SENTIMENT_CATEGORIES = ["positive", "neutral", "negative"]
 
 # Sentiment score thresholds
 POSITIVE_THRESHOLD = 0.05
 NEGATIVE_THRESHOLD = -0.05
 
+# Rendered message cache (messages are reused across subscribers and /latest)
+RENDER_CACHE_SIZE = 500
+
+# Sentiment score cache
+SENTIMENT_CACHE_SIZE = 5000  # max cached texts (LRU)
+SENTIMENT_CACHE_FILE = "sentiment_cache.json"  # set to None to keep the cache in memory only
+
+# Batch sentiment scoring (runs off the event loop)
+SENTIMENT_PROCESS_WORKERS = 2  # worker processes for large batches; 0 scores in a thread instead
+SENTIMENT_PROCESS_MIN_BATCH = 200  # smaller batches are scored in a thread
+SENTIMENT_BATCH_CHUNK = 250  # texts per process pool task
+
+# Rolling sentiment trends shown by /trend: (label, window length in seconds, time buckets)
+TREND_WINDOWS = (("1h", 3600, 60), ("24h", 24 * 3600, 96), ("7d", 7 * 24 * 3600, 168))
+TREND_IN_QUOTE_BLOCK = os.getenv("TREND_IN_QUOTE_BLOCK", "true").lower() == "true"  # add the 24h sentiment line to the market block
+TREND_DIRECTION_THRESHOLD = 0.05  # EWMA - mean gap shown as trending up or down
+
 # Sentiment Emojis
 SENTIMENT_EMOJIS = {
     "positive": "🟢",  # green circle
@@ -0,0 +1,232 @@
+import math
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from config import *
+
+def shard_for(chat_id, shards=DELIVERY_SHARDS):
+    """Map a chat id to a shard with a stable hash."""
+    return zlib.crc32(str(chat_id).encode()) % shards
+
+class DeliveryQueue:
+    """SQLite-backed outbox shared by the ingestion process and delivery workers.
+
+    Messages are stored one row per (chat, message) and tagged with the chat's
+    shard. Each live worker owns a share of the shards (tracked by heartbeats),
+    leases pending rows from its shards and acks them once sent. Shards owned by
+    a worker whose heartbeat went stale are taken over by the others, and rows
+    it had leased become available again when their lease expires.
+
+    Rows carry a key (e.g. the article URL) that is unique per chat, so queueing
+    the same alert twice, for instance after a restart, delivers it once. A row
+    is marked "sending" just before its send, and one still in that state when
+    its lease expires is never retried: the send may have gone through. A
+    worker only starts a send while it still holds the row's lease.
+
+    Methods block on SQLite, so async callers run them with asyncio.to_thread;
+    the lock serializes those threads on the shared connection.
+    """
+
+    def __init__(self, path=DELIVERY_QUEUE_FILE, shards=DELIVERY_SHARDS):
+        self.shards = shards
+        self.lock = threading.RLock()
+        # Autocommit mode with explicit transactions; the connection may be used from a worker thread
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # Message texts are stored once and shared by every delivery of them
+        self.conn.execute("CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, text TEXT NOT NULL)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS deliveries ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, shard INTEGER NOT NULL, chat_id INTEGER NOT NULL, "
+            "message_id INTEGER NOT NULL REFERENCES messages (id), status TEXT NOT NULL DEFAULT 'pending', worker_id TEXT, "
+            "lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, "
+            "sent_at REAL, error TEXT)"
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(deliveries)")}
+        if "dedupe_key" not in columns:
+            self.conn.execute("ALTER TABLE deliveries ADD COLUMN dedupe_key TEXT")
+        if "next_attempt_at" not in columns:
+            self.conn.execute("ALTER TABLE deliveries ADD COLUMN next_attempt_at REAL")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS deliveries_shard_status ON deliveries (shard, status, id)")
+        self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS deliveries_chat_key ON deliveries (chat_id, dedupe_key)")
+        # Chats found blocked or deleted, waiting for the bot process to unsubscribe them
+        self.conn.execute("CREATE TABLE IF NOT EXISTS dead_chats (chat_id INTEGER PRIMARY KEY, error TEXT, detected_at REAL NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS workers (worker_id TEXT PRIMARY KEY, heartbeat REAL NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS shard_owners (shard INTEGER PRIMARY KEY, worker_id TEXT, heartbeat REAL)")
+
+    @contextmanager
+    def _transaction(self):
+        """Hold the lock for one write transaction; IMMEDIATE takes SQLite's write lock up front."""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def enqueue(self, jobs):
+        """Queue every message in `jobs` ({chat_id: [(key, text), ...]}), keeping per-chat order.
+
+        Messages whose (chat, key) was queued before are skipped. Returns the
+        number of messages queued.
+        """
+        now = time.time()
+        with self._transaction():
+            queued_before = self.conn.total_changes
+            message_ids = {}
+            for messages in jobs.values():
+                for _, text in messages:
+                    if text not in message_ids:
+                        message_ids[text] = self.conn.execute("INSERT INTO messages (text) VALUES (?)", (text,)).lastrowid
+            messages_inserted = self.conn.total_changes - queued_before
+            rows = [(shard_for(chat_id, self.shards), chat_id, message_ids[text], key, now)
+                    for chat_id, messages in jobs.items() for key, text in messages]
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO deliveries (shard, chat_id, message_id, dedupe_key, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            queued = self.conn.total_changes - queued_before - messages_inserted
+        return queued
+
+    def heartbeat(self, worker_id):
+        """Record that a worker is alive and rebalance shard ownership.
+
+        Returns (owned shards, number of live workers).
+        """
+        now = time.time()
+        stale_before = now - DELIVERY_WORKER_TIMEOUT
+        with self._transaction():
+            self.conn.execute("INSERT OR REPLACE INTO workers (worker_id, heartbeat) VALUES (?, ?)", (worker_id, now))
+            self.conn.execute("DELETE FROM workers WHERE heartbeat < ?", (stale_before,))
+            live_workers = self.conn.execute("SELECT COUNT(*) FROM workers").fetchone()[0]
+            target = math.ceil(self.shards / max(live_workers, 1))
+
+            owners = {shard: (owner, heartbeat) for shard, owner, heartbeat
+                      in self.conn.execute("SELECT shard, worker_id, heartbeat FROM shard_owners")}
+            owned = [shard for shard, (owner, _) in owners.items() if owner == worker_id]
+
+            # Give back shards above our fair share so new workers can pick them up
+            for shard in owned[target:]:
+                self.conn.execute("UPDATE shard_owners SET worker_id = NULL WHERE shard = ?", (shard,))
+            owned = owned[:target]
+
+            # Take unowned shards and shards whose owner stopped heartbeating
+            for shard in range(self.shards):
+                if len(owned) >= target:
+                    break
+                owner, heartbeat = owners.get(shard, (None, None))
+                if owner == worker_id:
+                    continue
+                if owner is None or heartbeat is None or heartbeat < stale_before:
+                    self.conn.execute("INSERT OR REPLACE INTO shard_owners (shard, worker_id, heartbeat) VALUES (?, ?, ?)",
+                                      (shard, worker_id, now))
+                    owned.append(shard)
+
+            if owned:
+                self.conn.execute(f"UPDATE shard_owners SET heartbeat = ? WHERE shard IN ({','.join('?' * len(owned))})",
+                                  [now, *owned])
+        return sorted(owned), live_workers
+
+    def lease(self, worker_id, shards, limit=DELIVERY_BATCH_SIZE):
+        """Lease up to `limit` due pending (or lease-expired) messages from the given shards.
+
+        Returns a list of (id, chat_id, text) in queue order.
+        """
+        if not shards:
+            return []
+        now = time.time()
+        placeholders = ",".join("?" * len(shards))
+        with self._transaction():
+            # A send that was cut off may have reached the chat, so it isn't retried
+            self.conn.execute(
+                f"UPDATE deliveries SET status = 'failed', error = 'interrupted while sending' "
+                f"WHERE shard IN ({placeholders}) AND status = 'sending' AND lease_until < ?",
+                [*shards, now]
+            )
+            rows = self.conn.execute(
+                f"SELECT d.id, d.chat_id, m.text FROM deliveries d JOIN messages m ON m.id = d.message_id "
+                f"WHERE d.shard IN ({placeholders}) "
+                "AND ((d.status = 'pending' AND (d.next_attempt_at IS NULL OR d.next_attempt_at <= ?)) "
+                "OR (d.status = 'leased' AND d.lease_until < ?)) ORDER BY d.id LIMIT ?",
+                [*shards, now, now, limit]
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE deliveries SET status = 'leased', worker_id = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                [(worker_id, now + DELIVERY_LEASE_SECONDS, row[0]) for row in rows]
+            )
+        return rows
+
+    def mark_sending(self, delivery_id, worker_id):
+        """Record that a message's send is starting, if the worker still holds its lease.
+
+        The lease is renewed so the send gets a full lease period however long
+        the batch took to reach it. Returns False when the lease was lost (the
+        row expired and may have been leased by another worker), in which case
+        the message must not be sent.
+        """
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE deliveries SET status = 'sending', lease_until = ? "
+                "WHERE id = ? AND status = 'leased' AND worker_id = ?",
+                (time.time() + DELIVERY_LEASE_SECONDS, delivery_id, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def ack(self, delivery_ids):
+        """Mark messages as delivered."""
+        now = time.time()
+        with self._transaction():
+            self.conn.executemany("UPDATE deliveries SET status = 'sent', sent_at = ?, lease_until = NULL WHERE id = ?",
+                                  [(now, delivery_id) for delivery_id in delivery_ids])
+
+    def fail(self, delivery_id, error, permanent=False):
+        """Schedule a retry with exponential backoff, or give up after DELIVERY_MAX_ATTEMPTS (or at once if permanent)."""
+        with self._transaction():
+            attempts = self.conn.execute("SELECT attempts FROM deliveries WHERE id = ?", (delivery_id,)).fetchone()
+            attempts = attempts[0] if attempts else DELIVERY_MAX_ATTEMPTS
+            if permanent or attempts >= DELIVERY_MAX_ATTEMPTS:
+                self.conn.execute("UPDATE deliveries SET status = 'failed', lease_until = NULL, error = ? WHERE id = ?",
+                                  (str(error), delivery_id))
+                return False
+            delay = min(DELIVERY_RETRY_MAX_DELAY, DELIVERY_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+            self.conn.execute(
+                "UPDATE deliveries SET status = 'pending', lease_until = NULL, next_attempt_at = ?, error = ? WHERE id = ?",
+                (time.time() + delay, str(error), delivery_id)
+            )
+            return True
+
+    def mark_dead_chat(self, chat_id, error):
+        """Record a chat that blocked the bot or no longer exists and drop its undelivered messages."""
+        with self._transaction():
+            self.conn.execute("INSERT OR REPLACE INTO dead_chats (chat_id, error, detected_at) VALUES (?, ?, ?)",
+                              (chat_id, str(error), time.time()))
+            self.conn.execute("UPDATE deliveries SET status = 'dropped', lease_until = NULL, error = ? "
+                              "WHERE chat_id = ? AND status IN ('pending', 'leased', 'sending')", (str(error), chat_id))
+
+    def take_dead_chats(self):
+        """Remove and return the chat ids recorded by mark_dead_chat()."""
+        with self._transaction():
+            chat_ids = [row[0] for row in self.conn.execute("SELECT chat_id FROM dead_chats")]
+            self.conn.execute("DELETE FROM dead_chats")
+        return chat_ids
+
+    def purge(self, older_than=DELIVERY_RETENTION):
+        """Delete finished messages older than `older_than` seconds."""
+        with self._transaction():
+            self.conn.execute("DELETE FROM deliveries WHERE status IN ('sent', 'failed', 'dropped') AND created_at < ?",
+                              (time.time() - older_than,))
+            self.conn.execute("DELETE FROM messages WHERE id NOT IN (SELECT message_id FROM deliveries)")
+
+    def depth(self):
+        """Return the number of messages waiting to be delivered."""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM deliveries WHERE status IN ('pending', 'leased', 'sending')").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
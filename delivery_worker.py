@@ -0,0 +1,103 @@
+import asyncio
+import os
+import socket
+import time
+from telegram import Bot
+from telegram.request import HTTPXRequest
+from config import *
+from delivery_queue import DeliveryQueue
+from dispatcher import AlertDispatcher, send_error_kind
+import metrics
+
+async def deliver_batch(bot, queue, dispatcher, rows, worker_id):
+    """Send one leased batch, recording each message's outcome in the outbox as it happens.
+
+    Sends are acked one by one, so a crash can only leave the messages that
+    were in flight unconfirmed (and those are never retried).
+    """
+    jobs = {}
+    row_ids = {}  # {(chat_id, message index): delivery id}
+    for delivery_id, chat_id, text in rows:
+        messages = jobs.setdefault(chat_id, [])
+        row_ids[(chat_id, len(messages))] = delivery_id
+        messages.append(text)
+
+    # The outbox is written from a thread so SQLite waits don't stall the other senders
+    async def before_send(chat_id, index):
+        if await asyncio.to_thread(queue.mark_sending, row_ids[(chat_id, index)], worker_id):
+            return True
+        # The batch outlasted the lease; the row may be another worker's now
+        metrics.inc("delivery_leases_lost_total")
+        return False
+
+    async def on_result(chat_id, index, error):
+        delivery_id = row_ids[(chat_id, index)]
+        if error is None:
+            await asyncio.to_thread(queue.ack, [delivery_id])
+            return
+        kind = send_error_kind(error)
+        if kind == "dead_chat":
+            await asyncio.to_thread(queue.mark_dead_chat, chat_id, error)
+            metrics.inc("delivery_dead_chats_total")
+        elif kind == "uncertain":
+            # The message may have been delivered, so it isn't retried
+            await asyncio.to_thread(queue.fail, delivery_id, f"may have been sent: {error}", permanent=True)
+            metrics.inc("delivery_uncertain_total")
+        elif await asyncio.to_thread(queue.fail, delivery_id, error, permanent=kind == "permanent"):
+            metrics.inc("delivery_retries_scheduled_total")
+
+    return await dispatcher.send_all(bot, jobs, on_result=on_result, before_send=before_send)
+
+async def run_worker(worker_id=None, metrics_port=0):
+    """Consume the shared delivery queue until cancelled."""
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    queue = DeliveryQueue()
+    dispatcher = AlertDispatcher()
+    print(f"Delivery worker {worker_id} started")
+    
+    # Each worker process has its own metrics, so it needs its own port
+    metrics_server = await metrics.start_metrics_server(port=metrics_port) if metrics_port else None
+
+    ownership = {"shards": []}
+    last_purge = time.monotonic()
+
+    async def heartbeat_loop():
+        # Heartbeats keep running while a batch is being sent so our shards aren't taken over
+        while True:
+            shards, live_workers = await asyncio.to_thread(queue.heartbeat, worker_id)
+            if shards != ownership["shards"]:
+                print(f"Worker {worker_id} now owns shards {shards} ({live_workers} live workers)")
+            ownership["shards"] = shards
+            # Telegram's global limit is per bot token, so live workers split it
+            dispatcher.global_bucket.rate = TELEGRAM_GLOBAL_RATE_LIMIT / max(live_workers, 1)
+            await asyncio.sleep(DELIVERY_HEARTBEAT_INTERVAL)
+
+    # One pooled connection per concurrent sender (PTB's default pool has a single connection)
+    request = HTTPXRequest(connection_pool_size=FANOUT_WORKERS)
+    async with Bot(TELEGRAM_TOKEN, base_url=TELEGRAM_API_BASE_URL, request=request) as bot:
+        heartbeat_task = asyncio.create_task(heartbeat_loop())
+        try:
+            while True:
+                if heartbeat_task.done():
+                    heartbeat_task.result()  # Surface heartbeat errors
+                shards = ownership["shards"]
+                rows = await asyncio.to_thread(queue.lease, worker_id, shards)
+                if not rows:
+                    await asyncio.sleep(DELIVERY_POLL_INTERVAL)
+                    continue
+
+                stats = await deliver_batch(bot, queue, dispatcher, rows, worker_id)
+                if time.monotonic() - last_purge > DELIVERY_PURGE_INTERVAL:
+                    await asyncio.to_thread(queue.purge)
+                    last_purge = time.monotonic()
+                metrics.set_gauge("delivery_queue_depth", await asyncio.to_thread(queue.depth))
+                metrics.log_event(
+                    "delivery_batch", worker_id=worker_id, shards=shards, sent=stats["sent"],
+                    failed=stats["failed"], duration=round(stats["duration"], 3),
+                    throughput=round(stats["throughput"], 1)
+                )
+        finally:
+            heartbeat_task.cancel()
+            if metrics_server is not None:
+                metrics_server.close()
+            queue.close()
@@ -0,0 +1,170 @@
+import asyncio
+import time
+import httpx
+from telegram.error import BadRequest, Forbidden, RetryAfter, NetworkError
+from config import *
+import metrics
+
+def request_not_sent(error):
+    """True if a network error certainly happened before the request reached Telegram.
+
+    PTB raises TimedOut/NetworkError for any transport failure; only a failed
+    connect or a full connection pool (the httpx cause) rules out delivery.
+    """
+    return isinstance(error.__cause__, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+def send_error_kind(error):
+    """Classify a failed send: "dead_chat" (blocked or deleted chat), "permanent", "uncertain" or "transient".
+
+    "uncertain" errors (e.g. a read timeout) may have happened after Telegram
+    delivered the message, so resending could deliver it twice.
+    """
+    if isinstance(error, Forbidden):
+        return "dead_chat"
+    if isinstance(error, BadRequest):
+        return "dead_chat" if "chat not found" in str(error).lower() else "permanent"
+    if isinstance(error, NetworkError) and not request_not_sent(error):
+        return "uncertain"
+    return "transient"
+
+class TokenBucket:
+    """Simple async token bucket limiting how fast messages go out."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def try_acquire(self):
+        """Take a token if one is available right now; returns False instead of waiting."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+class AlertDispatcher:
+    """Sends a batch of messages concurrently while respecting Telegram rate limits.
+
+    Messages for the same chat are sent in order by a single worker and spaced by
+    the per-chat interval, while the global bucket caps the overall send rate.
+    """
+
+    def __init__(self, workers=FANOUT_WORKERS, global_rate=TELEGRAM_GLOBAL_RATE_LIMIT,
+                 per_chat_interval=TELEGRAM_PER_CHAT_INTERVAL, max_retries=MAX_SEND_RETRIES):
+        self.workers = workers
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+
+    async def _send_with_retry(self, bot, chat_id, text, stats):
+        """Send one message, retrying on flood control and on network errors that never reached Telegram.
+
+        Other network errors (timeouts, dropped connections) are raised without
+        resending, since the message may already have been delivered.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.global_bucket.acquire()
+            started = time.monotonic()
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, parse_mode="Markdown")
+                latency = time.monotonic() - started
+                stats["latencies"].append(latency)
+                stats["sent"] += 1
+                metrics.observe("telegram_send_seconds", latency)
+                metrics.inc("telegram_messages_sent_total")
+                return True
+            except RetryAfter as e:
+                stats["retries"] += 1
+                metrics.inc("telegram_send_retries_total", reason="flood_control")
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(float(e.retry_after))
+            except NetworkError as e:
+                if not request_not_sent(e):
+                    raise
+                stats["retries"] += 1
+                metrics.inc("telegram_send_retries_total", reason="network")
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(2 ** attempt)
+        return False
+
+    async def _worker(self, bot, queue, stats, on_result, before_send):
+        """Drain (chat_id, messages) jobs from the queue."""
+        while True:
+            try:
+                chat_id, messages = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            for index, text in enumerate(messages):
+                if index:
+                    await asyncio.sleep(self.per_chat_interval)
+                if before_send and await before_send(chat_id, index) is False:
+                    break  # Keep the chat's order: its later messages wait for a new lease too
+                error = None
+                try:
+                    await self._send_with_retry(bot, chat_id, text, stats)
+                except Exception as e:
+                    error = e
+                    stats["failed"] += 1
+                    metrics.inc("telegram_messages_failed_total")
+                    metrics.log_event("send_failed", chat_id=chat_id, error=str(e))
+                if on_result:
+                    await on_result(chat_id, index, error)
+                if error is not None and send_error_kind(error) == "dead_chat":
+                    break  # The chat's other messages can't be delivered either
+
+    async def send_all(self, bot, jobs, on_result=None, before_send=None):
+        """Send every job in `jobs` ({chat_id: [text, ...]}) and return cycle stats.
+
+        If given, the coroutine functions before_send(chat_id, message_index)
+        and on_result(chat_id, message_index, error) are awaited before each
+        message's first attempt and after it, with error set to None on success. A chat's remaining messages
+        are skipped once it turns out to be blocked or deleted, or when
+        before_send returns False.
+        """
+        stats = {"sent": 0, "failed": 0, "retries": 0, "latencies": []}
+        queue = asyncio.Queue()
+        for chat_id, messages in jobs.items():
+            if messages:
+                queue.put_nowait((chat_id, messages))
+
+        started = time.monotonic()
+        worker_count = min(self.workers, queue.qsize())
+        await asyncio.gather(*(self._worker(bot, queue, stats, on_result, before_send) for _ in range(worker_count)))
+        stats["duration"] = time.monotonic() - started
+        metrics.observe("alert_fanout_seconds", stats["duration"])
+        return summarize_stats(stats)
+
+def summarize_stats(stats):
+    """Turn raw dispatcher stats into throughput and latency figures."""
+    latencies = sorted(stats.pop("latencies"))
+    duration = stats["duration"]
+    stats["throughput"] = stats["sent"] / duration if duration > 0 else 0.0
+    stats["latency_p50"] = _percentile(latencies, 0.50)
+    stats["latency_p95"] = _percentile(latencies, 0.95)
+    stats["latency_max"] = latencies[-1] if latencies else 0.0
+    return stats
+
+def _percentile(values, fraction):
+    """Return the given percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
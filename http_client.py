@@ -0,0 +1,108 @@
+import asyncio
+import httpx
+from contextlib import aclosing
+from datetime import datetime, timezone
+from config import *
+import metrics
+import storage
+
+# Shared HTTP client (created lazily so it binds to the running event loop)
+_client = None
+_request_semaphore = None
+
+def get_http_client():
+    """Return the shared keep-alive HTTP client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+    return _client
+
+def _get_semaphore():
+    """Return the semaphore bounding concurrent outbound requests."""
+    global _request_semaphore
+    if _request_semaphore is None:
+        _request_semaphore = asyncio.Semaphore(HTTP_MAX_CONCURRENT_REQUESTS)
+    return _request_semaphore
+
+async def get_json(url, params=None):
+    """GET a URL and decode the JSON body without blocking the event loop."""
+    async with _get_semaphore():
+        with metrics.timer("http_request_seconds"):
+            response = await get_http_client().get(url, params=params)
+    response.raise_for_status()
+    with metrics.timer("json_parse_seconds"):
+        return response.json()
+
+async def iter_text(url, params=None):
+    """GET a URL and yield the body as decoded text chunks as they arrive.
+
+    If the caller stops early (closes the generator), the rest of the body is
+    still read so the connection can go back to the pool.
+    """
+    async with _get_semaphore():
+        with metrics.timer("http_request_seconds"):
+            async with get_http_client().stream("GET", url, params=params) as response:
+                response.raise_for_status()
+                chunks = response.aiter_text()
+                try:
+                    async for chunk in chunks:
+                        yield chunk
+                except GeneratorExit:
+                    async for _ in chunks:
+                        pass
+                    raise
+
+async def get_text(url, params=None):
+    """GET a URL and return the body as text without blocking the event loop."""
+    async with _get_semaphore():
+        with metrics.timer("http_request_seconds"):
+            response = await get_http_client().get(url, params=params, follow_redirects=True)
+    response.raise_for_status()
+    return response.text
+
+def usage_key(name):
+    """Storage key of a per-day call counter; the daily quota resets at midnight UTC."""
+    return f"{name}:{datetime.now(timezone.utc).date().isoformat()}"
+
+# Alpha Vantage calls made today are counted in storage, so restarts and every
+# bot process sharing the database count against the same quota
+def _count_alpha_vantage_call():
+    storage.increment_meta(usage_key("alpha_vantage_calls"))
+
+def alpha_vantage_calls_today():
+    """Return how many Alpha Vantage calls were made today."""
+    return storage.get_counter(usage_key("alpha_vantage_calls"))
+
+def alpha_vantage_calls_remaining():
+    """Return how many Alpha Vantage calls are left in today's quota."""
+    return max(0, ALPHA_VANTAGE_DAILY_QUOTA - alpha_vantage_calls_today())
+
+async def alpha_vantage_query(params):
+    """Run a query against the Alpha Vantage API and return the decoded JSON."""
+    _count_alpha_vantage_call()
+    metrics.inc("alpha_vantage_calls_total", function=params.get("function", ""))
+    params = dict(params, apikey=ALPHA_VANTAGE_API_KEY)
+    return await get_json(ALPHA_VANTAGE_URL, params=params)
+
+async def alpha_vantage_stream(params):
+    """Run a query against the Alpha Vantage API and yield the response body in text chunks."""
+    _count_alpha_vantage_call()
+    metrics.inc("alpha_vantage_calls_total", function=params.get("function", ""))
+    params = dict(params, apikey=ALPHA_VANTAGE_API_KEY)
+    # Closed explicitly so a caller stopping early releases the connection and semaphore right away
+    async with aclosing(iter_text(ALPHA_VANTAGE_URL, params=params)) as chunks:
+        async for chunk in chunks:
+            yield chunk
+
+async def close_http_client():
+    """Close the shared HTTP client and release its pooled connections."""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
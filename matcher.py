@@ -0,0 +1,46 @@
+import re
+
+def normalize_keyword(keyword):
+    """Lowercase a keyword and collapse internal whitespace."""
+    return " ".join(keyword.lower().split())
+
+def _keyword_pattern(keyword):
+    """Regex for one keyword; a trailing * matches any word ending (e.g. tariff*)."""
+    if keyword.endswith("*"):
+        return _keyword_pattern(keyword[:-1]) + r"\w*"
+    return r"\s+".join(re.escape(word) for word in keyword.split())
+
+class KeywordMatcher:
+    """Finds every tracked keyword in a text with a single compiled regex pass.
+
+    One alternation of all keywords, wrapped in a lookahead, finds each word
+    start where some keyword begins without consuming the text, so matching
+    cost doesn't grow with the number of users. At those positions every
+    keyword that starts with the same character is checked on its own, so
+    overlapping keywords (trump and donald trump, tar* and tariff*) are all
+    reported.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = sorted({normalize_keyword(k) for k in keywords if k.strip(" *")}, key=len, reverse=True)
+        self.candidates = {}  # {first character: [(keyword, anchored pattern)]}
+        for keyword in self.keywords:
+            pattern = re.compile(rf"{_keyword_pattern(keyword)}(?!\w)", re.IGNORECASE)
+            self.candidates.setdefault(keyword[0], []).append((keyword, pattern))
+        if self.keywords:
+            alternation = "|".join(_keyword_pattern(k) for k in self.keywords)
+            self.pattern = re.compile(rf"(?<!\w)(?=(?:{alternation})(?!\w))", re.IGNORECASE)
+        else:
+            self.pattern = None
+
+    def match(self, text):
+        """Return the set of keywords found in text."""
+        if self.pattern is None or not text:
+            return set()
+        found = set()
+        for hit in self.pattern.finditer(text):
+            position = hit.start()
+            for keyword, pattern in self.candidates.get(text[position].lower(), ()):
+                if keyword not in found and pattern.match(text, position):
+                    found.add(keyword)
+        return found
@@ -0,0 +1,199 @@
+import asyncio
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from config import *
+
+# Latency buckets in seconds (upper bounds), from sub-millisecond cache hits to slow API calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()  # storage writes are timed on the writer thread
+
+class Histogram:
+    """Prometheus-style histogram: cumulative bucket counts plus sum and count."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        with _lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, fraction):
+        """Estimate a quantile as the upper bound of the bucket it falls in."""
+        if not self.count:
+            return 0.0
+        rank = self.count * fraction
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+# Registered metrics, keyed by (name, sorted label pairs)
+counters = {}
+gauges = {}
+histograms = {}
+descriptions = {}
+
+# Callables returning {name: value} gauges, evaluated at scrape time
+collectors = []
+
+# Readiness reported on /ready (e.g. for deploy health checks)
+ready = False
+
+def set_ready(value=True):
+    """Mark the process as ready (or not) to serve traffic."""
+    global ready
+    ready = value
+    set_gauge("ready", int(value))
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+def describe(name, help_text):
+    """Set the HELP line shown for a metric."""
+    descriptions[name] = help_text
+
+def inc(name, amount=1, **labels):
+    """Increment a counter."""
+    key = _key(name, labels)
+    with _lock:
+        counters[key] = counters.get(key, 0) + amount
+
+def set_gauge(name, value, **labels):
+    """Set a gauge to its current value."""
+    gauges[_key(name, labels)] = value
+
+def observe(name, value, **labels):
+    """Record one value (in seconds for latencies) in a histogram."""
+    key = _key(name, labels)
+    histogram = histograms.get(key)
+    if histogram is None:
+        histogram = histograms.setdefault(key, Histogram())
+    histogram.observe(value)
+
+@contextmanager
+def timer(name, **labels):
+    """Time the enclosed block into a histogram."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+def register_collector(collector):
+    """Add a callable whose {name: value} result is exported as gauges on every scrape."""
+    collectors.append(collector)
+
+def _collected_gauges():
+    values = dict(gauges)
+    for collector in collectors:
+        try:
+            for name, value in collector().items():
+                values[_key(name, None)] = value
+        except Exception as e:
+            print(f"Error collecting metrics from {collector}: {e}")
+    return values
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def render_prometheus():
+    """Render every metric in the Prometheus text exposition format."""
+    lines = []
+    described = set()
+
+    def header(name, kind):
+        if name not in described:
+            described.add(name)
+            if name in descriptions:
+                lines.append(f"# HELP {name} {descriptions[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), value in sorted(_collected_gauges().items()):
+        header(name, "gauge")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), histogram in sorted(histograms.items()):
+        header(name, "histogram")
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', bound))} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {histogram.count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+def summary_lines():
+    """Human-readable summary of every metric, for the /stats command."""
+    lines = []
+    for (name, labels), value in sorted(counters.items()):
+        lines.append(f"{name}{_format_labels(labels)}: {value}")
+    for (name, labels), value in sorted(_collected_gauges().items()):
+        lines.append(f"{name}{_format_labels(labels)}: {value:g}" if isinstance(value, float) else
+                     f"{name}{_format_labels(labels)}: {value}")
+    for (name, labels), histogram in sorted(histograms.items()):
+        if not histogram.count:
+            continue
+        lines.append(
+            f"{name}{_format_labels(labels)}: n={histogram.count} "
+            f"avg={histogram.sum / histogram.count * 1000:.1f}ms "
+            f"p50<={histogram.quantile(0.50) * 1000:g}ms p95<={histogram.quantile(0.95) * 1000:g}ms"
+        )
+    return lines
+
+def log_event(event, **fields):
+    """Print one structured (JSON) log line."""
+    record = {"ts": datetime.now().strftime('%Y-%m-%d %H:%M:%S'), "event": event}
+    record.update(fields)
+    print(json.dumps(record, default=str))
+
+async def _handle_request(reader, writer):
+    """Serve GET /metrics and GET /ready; anything else gets a 404."""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Drain the request headers
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        path = parts[1].split("?")[0] if len(parts) >= 2 and parts[0] == "GET" else None
+        if path == "/metrics":
+            status, body = "200 OK", render_prometheus().encode()
+        elif path == "/ready":
+            status, body = ("200 OK", b"ready\n") if ready else ("503 Service Unavailable", b"starting\n")
+        else:
+            status, body = "404 Not Found", b"Not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Start the local /metrics HTTP endpoint and return the server."""
+    server = await asyncio.start_server(_handle_request, host, port)
+    print(f"Metrics available at http://{host}:{port}/metrics")
+    return server
@@ -1,141 +1,452 @@
 import json
-import requests
+import os
 import time
-from datetime import datetime
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
 from config import *
-import nltk
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-# Initialize sentiment analyzer
-sentiment_analyzer = SentimentIntensityAnalyzer()
+from sources import build_sources, fetch_all_sources, fetch_new_articles, save_watermarks
+from matcher import KeywordMatcher
+from archive import ArticleArchive
+from trends import SentimentTrends
+from quotes import QuoteService
+import metrics
+import storage
+
+# VADER analyzer, built on first use (or by warm_up_sentiment() in the background) so startup doesn't load its lexicon
+_sentiment_analyzer = None
+_sentiment_analyzer_lock = threading.Lock()
+
+def get_sentiment_analyzer():
+    """Return the shared VADER analyzer, importing and building it on first use."""
+    global _sentiment_analyzer
+    if _sentiment_analyzer is None:
+        with _sentiment_analyzer_lock:
+            if _sentiment_analyzer is None:
+                from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+                _sentiment_analyzer = SentimentIntensityAnalyzer()
+    return _sentiment_analyzer
+
+def warm_up_sentiment():
+    """Build the analyzer ahead of the first scoring call (run in a worker thread)."""
+    get_sentiment_analyzer().polarity_scores("warm up")
+
+class ArticleHistory:
+    """Recently alerted articles with O(1) URL lookups and oldest-first eviction.
+
+    URLs live in a set for membership checks, while an insertion-ordered ring
+    (oldest first) decides which entry to evict once capacity is reached.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.urls = set()
+        self.ring = deque()
+
+    def __contains__(self, url):
+        return url in self.urls
+
+    def __len__(self):
+        return len(self.ring)
+
+    def add(self, article):
+        """Record an article, evicting the oldest one when full."""
+        if article["url"] in self.urls:
+            return
+        # Keep only essential fields to reduce memory and file size
+        sentiment_data = article.get("sentiment", {})
+        self.ring.append({
+            "url": article["url"],
+            "title": article.get("title", ""),
+            "sentiment": {
+                "category": sentiment_data.get("category", "neutral"),
+                "score": sentiment_data.get("score", 0)
+            }
+        })
+        self.urls.add(article["url"])
+        while len(self.ring) > self.capacity:
+            evicted = self.ring.popleft()
+            self.urls.discard(evicted["url"])
+
+    def records(self):
+        """Return the tracked articles, oldest first."""
+        return list(self.ring)
 
 # Track news articles sent in ALERTS only, not for /latest commands
-alert_sent_articles = []
-last_check_time = datetime.now()
+alert_sent_articles = ArticleHistory(MAX_TRACKED_ARTICLES)
+
+# Bounded LRU of VADER compound scores keyed by a hash of the scored text
+sentiment_cache = OrderedDict()  # {text hash: compound score}
+sentiment_cache_stats = {"hits": 0, "misses": 0}
+
+def _text_key(text):
+    """Return a compact, stable hash of a piece of text."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+def categorize_score(compound_score):
+    """Map a compound score onto a sentiment category."""
+    if compound_score >= POSITIVE_THRESHOLD:
+        return "positive"
+    elif compound_score <= NEGATIVE_THRESHOLD:
+        return "negative"
+    return "neutral"
 
 def analyze_sentiment(text):
     """Analyze the sentiment of a text and return category and score."""
     if not text:
         return "neutral", 0.0
     
-    scores = sentiment_analyzer.polarity_scores(text)
-    compound_score = scores['compound']
+    key = _text_key(text)
+    compound_score = sentiment_cache.get(key)
+    if compound_score is None:
+        sentiment_cache_stats["misses"] += 1
+        compound_score = get_sentiment_analyzer().polarity_scores(text)['compound']
+        sentiment_cache[key] = compound_score
+        if len(sentiment_cache) > SENTIMENT_CACHE_SIZE:
+            sentiment_cache.popitem(last=False)  # Evict least recently used
+    else:
+        sentiment_cache_stats["hits"] += 1
+        sentiment_cache.move_to_end(key)
     
     # Categorize based on compound score
-    if compound_score >= POSITIVE_THRESHOLD:
-        category = "positive"
-    elif compound_score <= NEGATIVE_THRESHOLD:
-        category = "negative"
-    else:
-        category = "neutral"
+    return categorize_score(compound_score), compound_score
+
+def _score_batch(texts):
+    """Score texts with VADER; runs in a worker thread or process."""
+    sentiment_analyzer = get_sentiment_analyzer()
+    return [sentiment_analyzer.polarity_scores(text)['compound'] for text in texts]
+
+# Process pool for large scoring batches (created on first use)
+_sentiment_pool = None
+
+def _get_sentiment_pool():
+    global _sentiment_pool
+    if _sentiment_pool is None:
+        _sentiment_pool = ProcessPoolExecutor(max_workers=SENTIMENT_PROCESS_WORKERS)
+    return _sentiment_pool
+
+def shutdown_sentiment_pool():
+    """Stop the sentiment worker processes, if any were started."""
+    global _sentiment_pool
+    if _sentiment_pool is not None:
+        _sentiment_pool.shutdown(wait=False, cancel_futures=True)
+        _sentiment_pool = None
+
+async def _score_off_loop(texts):
+    """Score uncached texts in the process pool (large batches) or a worker thread."""
+    loop = asyncio.get_running_loop()
+    if SENTIMENT_PROCESS_WORKERS > 0 and len(texts) >= SENTIMENT_PROCESS_MIN_BATCH:
+        pool = _get_sentiment_pool()
+        chunks = [texts[i:i + SENTIMENT_BATCH_CHUNK] for i in range(0, len(texts), SENTIMENT_BATCH_CHUNK)]
+        parts = await asyncio.gather(*(loop.run_in_executor(pool, _score_batch, chunk) for chunk in chunks))
+        return [score for part in parts for score in part]
+    return await loop.run_in_executor(None, _score_batch, texts)
+
+async def score_texts(texts):
+    """Score many texts at once without blocking the event loop.
+
+    Returns (category, score) pairs in input order. Cached and repeated texts
+    are only scored once.
+    """
+    results = [None] * len(texts)
+    misses = {}  # {text hash: (text, [indexes])}
+    for index, text in enumerate(texts):
+        if not text:
+            results[index] = ("neutral", 0.0)
+            continue
+        key = _text_key(text)
+        compound_score = sentiment_cache.get(key)
+        if compound_score is None:
+            misses.setdefault(key, (text, []))[1].append(index)
+        else:
+            sentiment_cache_stats["hits"] += 1
+            sentiment_cache.move_to_end(key)
+            results[index] = (categorize_score(compound_score), compound_score)
+    
+    if misses:
+        keys = list(misses)
+        with metrics.timer("sentiment_seconds"):
+            scores = await _score_off_loop([misses[key][0] for key in keys])
+        metrics.inc("sentiment_texts_scored_total", len(keys))
+        for key, compound_score in zip(keys, scores):
+            sentiment_cache_stats["misses"] += 1
+            sentiment_cache[key] = compound_score
+            for index in misses[key][1]:
+                results[index] = (categorize_score(compound_score), compound_score)
+        while len(sentiment_cache) > SENTIMENT_CACHE_SIZE:
+            sentiment_cache.popitem(last=False)  # Evict least recently used
     
-    return category, compound_score
+    return results
+
+def save_sentiment_cache():
+    """Save the sentiment cache to a file if persistence is enabled"""
+    if not SENTIMENT_CACHE_FILE:
+        return
+    # Written to a temp file and renamed, so a crash mid-write leaves the previous cache in place
+    tmp_path = f"{SENTIMENT_CACHE_FILE}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(list(sentiment_cache.items()), f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, SENTIMENT_CACHE_FILE)
+    print(f"Saved {len(sentiment_cache)} cached sentiment scores")
+
+def read_sentiment_cache_file():
+    """Read the saved sentiment cache entries (safe to run in a worker thread); None if there are none."""
+    if not SENTIMENT_CACHE_FILE:
+        return None
+    try:
+        with open(SENTIMENT_CACHE_FILE, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print("No sentiment cache file found, starting with empty cache")
+        return None
+    except json.JSONDecodeError as e:
+        print(f"Ignoring unreadable sentiment cache file ({e}), starting with empty cache")
+        return None
+
+def load_sentiment_cache(entries=None):
+    """Load the sentiment cache from a file if persistence is enabled.
+
+    Scores computed since startup are kept and count as the most recently used.
+    """
+    if entries is None:
+        entries = read_sentiment_cache_file()
+    if not entries:
+        return
+    loaded = OrderedDict(entries[-SENTIMENT_CACHE_SIZE:])
+    for key, compound_score in sentiment_cache.items():
+        loaded.pop(key, None)
+        loaded[key] = compound_score
+    sentiment_cache.clear()
+    sentiment_cache.update(loaded)
+    while len(sentiment_cache) > SENTIMENT_CACHE_SIZE:
+        sentiment_cache.popitem(last=False)
+    print(f"Loaded {len(sentiment_cache)} cached sentiment scores")
 
 def get_sentiment_emoji(sentiment):
     """Get an emoji representing the sentiment."""
     return SENTIMENT_EMOJIS.get(sentiment, "⚪")  # Default to neutral/white circle
 
-async def fetch_trump_news(for_alerts=False):
-    """Fetch news about Trump from Alpha Vantage API."""
-    global last_check_time, alert_sent_articles
-    
-    # Calculate time since last check
-    current_time = datetime.now()
+class TTLCache:
+    """Small async TTL cache with single-flight loading.
+
+    Concurrent misses for the same key share one in-flight load instead of
+    each issuing their own upstream request. Failed loads are not cached.
+    """
+
+    def __init__(self):
+        self.entries = {}  # {key: (expires_at, value)}
+        self.in_flight = {}  # {key: asyncio.Future}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    async def get(self, key, ttl, loader, force_refresh=False):
+        """Return the cached value for key, calling loader() to refresh it when stale."""
+        entry = self.entries.get(key)
+        if not force_refresh and entry and entry[0] > time.monotonic():
+            self.stats["hits"] += 1
+            return entry[1]
+        
+        if key in self.in_flight:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(self.in_flight[key])
+        
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            value = await loader()
+            self.entries[key] = (time.monotonic() + ttl, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved when nobody else was waiting
+            raise
+        finally:
+            del self.in_flight[key]
+
+    def invalidate(self, key=None):
+        """Drop one cached entry, or all of them."""
+        if key is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
+
+# Matches tracked keywords (defaults plus every user's own list) in article text
+keyword_matcher = KeywordMatcher(DEFAULT_KEYWORDS)
+
+def set_tracked_keywords(keywords):
+    """Rebuild the keyword matcher when the set of tracked keywords changes."""
+    global keyword_matcher
+    matcher = KeywordMatcher(list(DEFAULT_KEYWORDS) + list(keywords))
+    if matcher.keywords != keyword_matcher.keywords:
+        keyword_matcher = matcher
+        api_cache.invalidate("trump_feed")  # Cached feed was filtered with the old keywords
+
+# Configured news sources (Alpha Vantage, RSS/Atom feeds, local files)
+news_sources = build_sources()
+
+# Shared cache for the enriched news feed
+api_cache = TTLCache()
+
+def get_cache_stats():
+    """Return hit/miss counters for the shared API cache."""
+    return dict(api_cache.stats)
+
+# Searchable archive of every article ingested (opened on first use)
+article_archive = None
+archive_compacted_at = 0.0
+
+def get_archive():
+    global article_archive
+    if article_archive is None:
+        article_archive = ArticleArchive()
+    return article_archive
+
+async def archive_articles(articles):
+    """Add articles to the archive off the event loop, compacting it every ARCHIVE_COMPACT_INTERVAL."""
+    global archive_compacted_at
+    try:
+        archive = get_archive()
+        added = await asyncio.to_thread(archive.add, articles)
+        metrics.inc("archive_articles_added_total", added)
+        if time.monotonic() - archive_compacted_at > ARCHIVE_COMPACT_INTERVAL:
+            archive_compacted_at = time.monotonic()
+            dropped = await asyncio.to_thread(archive.compact)
+            if dropped:
+                print(f"Dropped {dropped} articles from the archive")
+    except Exception as e:
+        print(f"Error archiving articles: {e}")
+
+# Rolling sentiment aggregates over everything ingested, for /trend and the market block
+sentiment_trends = SentimentTrends()
+
+def read_trend_history():
+    """Read the archived articles still inside the longest trend window (safe to run in a worker thread)."""
+    since = datetime.fromtimestamp(time.time() - sentiment_trends.horizon, timezone.utc).strftime("%Y%m%dT%H%M%S")
+    return get_archive().recent(since)
+
+def load_sentiment_trends(rows):
+    """Seed the trend windows with archived articles (from read_trend_history) after a restart."""
+    for url, time_published, category, score in rows:
+        sentiment_trends.add(url, time_published, category or "neutral", score or 0.0)
+    print(f"Loaded {len(sentiment_trends.seen)} archived articles into the sentiment trends")
+
+async def ingest_articles(articles):
+    """Record newly fetched, enriched articles in the trends and the archive."""
+    sentiment_trends.add_articles(articles)
+    await archive_articles(articles)
+
+async def _load_trump_feed():
+    """Fetch every news source and return the Trump articles with sentiment attached."""
+    articles = await fetch_all_sources(news_sources)
+    articles = await enrich_feed_async(articles)
+    await ingest_articles(articles)
+    return articles
+
+def match_articles(feed):
+    """Return the articles matching a tracked keyword, tagged with the keywords they matched."""
+    matching_articles = []
+    for article in feed:
+        # One matcher pass over title and summary finds every tracked keyword
+        matched_keywords = keyword_matcher.match(article.get("title", "") + "\n" + article.get("summary", ""))
+        if matched_keywords:
+            article["matched_keywords"] = matched_keywords
+            matching_articles.append(article)
+    return matching_articles
+
+def attach_sentiment(article, title_result, summary_result):
+    """Attach the overall sentiment to an article from its title and summary results."""
+    title_sentiment, title_score = title_result
+    summary_sentiment, summary_score = summary_result
     
-    # Use Alpha Vantage's News API
-    url = "https://www.alphavantage.co/query"
+    # Calculate overall sentiment based on both title and summary
+    # Give more weight to summary as it contains more information
+    if article.get("summary"):
+        overall_sentiment = summary_sentiment
+        overall_score = summary_score
+    else:
+        overall_sentiment = title_sentiment
+        overall_score = title_score
     
-    # Set parameters for the API request
-    params = {
-        "function": "NEWS_SENTIMENT",
-        "topics": "politics",  # Filter by politics topic
-        "apikey": ALPHA_VANTAGE_API_KEY,
-        "sort": "LATEST"
+    # Add sentiment data to article
+    article["sentiment"] = {
+        "category": overall_sentiment,
+        "score": overall_score,
+        "title_sentiment": title_sentiment,
+        "summary_sentiment": summary_sentiment
     }
+
+def enrich_feed(feed):
+    """Return the articles matching a tracked keyword with keyword and sentiment data attached."""
+    matching_articles = match_articles(feed)
+    for article in matching_articles:
+        # Analyze sentiment of the title and summary
+        attach_sentiment(article, analyze_sentiment(article.get("title", "")), analyze_sentiment(article.get("summary", "")))
+    return matching_articles
+
+async def enrich_feed_async(feed):
+    """Like enrich_feed, but scores the whole batch off the event loop."""
+    matching_articles = match_articles(feed)
+    texts = []
+    for article in matching_articles:
+        texts.append(article.get("title", ""))
+        texts.append(article.get("summary", ""))
     
+    results = await score_texts(texts)
+    for index, article in enumerate(matching_articles):
+        attach_sentiment(article, results[2 * index], results[2 * index + 1])
+    return matching_articles
+
+async def fetch_trump_news():
+    """Fetch the recent Trump news from the configured news sources (for /latest)."""
     try:
-        response = requests.get(url, params=params)
-        news_data = response.json()
-        
-        trump_articles = []
-        
-        if "feed" in news_data:
-            for article in news_data["feed"]:
-                # Check if the article contains "Trump" in title, summary or other relevant fields
-                title = article.get("title", "").lower()
-                summary = article.get("summary", "").lower()
-                
-                if "trump" in title or "trump" in summary:
-                    # Analyze sentiment of the title and summary
-                    title_sentiment, title_score = analyze_sentiment(article.get("title", ""))
-                    summary_sentiment, summary_score = analyze_sentiment(article.get("summary", ""))
-                    
-                    # Calculate overall sentiment based on both title and summary
-                    # Give more weight to summary as it contains more information
-                    if summary:
-                        overall_sentiment = summary_sentiment
-                        overall_score = summary_score
-                    else:
-                        overall_sentiment = title_sentiment
-                        overall_score = title_score
-                    
-                    # Add sentiment data to article
-                    article["sentiment"] = {
-                        "category": overall_sentiment,
-                        "score": overall_score,
-                        "title_sentiment": title_sentiment,
-                        "summary_sentiment": summary_sentiment
-                    }
-                    
-                    trump_articles.append(article)
-        
-        # If this is for automatic alerts, filter out previously sent articles
-        if for_alerts:
-            known_urls = [article["url"] for article in alert_sent_articles]
-            new_articles = [article for article in trump_articles if article["url"] not in known_urls]
-            
-            # Update tracking for alert articles only
-            alert_sent_articles.extend(new_articles)  # Add only new articles
-            alert_sent_articles = alert_sent_articles[:MAX_STORED_ARTICLES]  # Keep last N articles
-            last_check_time = current_time
-            
-            # Save alert article tracking to file for persistence
-            save_alert_articles()
-            
-            return new_articles
-        else:
-            # For manual /latest requests, return all recent Trump articles without filtering
-            return trump_articles[:MAX_ARTICLES_PER_REQUEST]  # Limit to N most recent articles
-    
+        # Return all recent matching articles; the caller filters them by the
+        # user's keywords and sentiments before limiting
+        return await api_cache.get("trump_feed", NEWS_CACHE_TTL, _load_trump_feed)
     except Exception as e:
-        print(f"Error fetching news from Alpha Vantage: {e}")
+        print(f"Error fetching news: {e}")
         return []
 
-async def fetch_voo_price():
-    """Fetch the latest stock price of VOO using Alpha Vantage."""
-    url = "https://www.alphavantage.co/query"
-    params = {
-        "function": "GLOBAL_QUOTE",
-        "symbol": "VOO",
-        "apikey": ALPHA_VANTAGE_API_KEY,
-    }
-    
+async def fetch_alert_articles():
+    """Fetch the articles not alerted yet; returns (articles, watermarks).
+
+    Alerts only ask each source for items newer than its watermark. Nothing is
+    recorded as alerted here: call mark_alerted() once the alerts are queued.
+    """
     try:
-        response = requests.get(url, params=params)
-        data = response.json()
-        
-        if "Global Quote" in data:
-            voo_data = data["Global Quote"]
-            return {
-                "price": voo_data.get("05. price", "N/A"),
-                "change": voo_data.get("09. change", "N/A"),
-                "change_percent": voo_data.get("10. change percent", "N/A"),
-            }
-        else:
-            print("Error fetching VOO data: No 'Global Quote' found in response")
-            return None
+        articles, watermarks = await fetch_new_articles(news_sources)
+        trump_articles = await enrich_feed_async(articles)
+        await ingest_articles(trump_articles)
     except Exception as e:
-        print(f"Error fetching VOO data: {e}")
-        return None
+        print(f"Error fetching news: {e}")
+        return [], {}
+    
+    new_articles = []
+    batch_urls = set()
+    for article in trump_articles:
+        if article["url"] not in alert_sent_articles and article["url"] not in batch_urls:
+            batch_urls.add(article["url"])
+            new_articles.append(article)
+    return new_articles, watermarks
+
+def mark_alerted(articles, watermarks):
+    """Record a cycle's articles as alerted and advance the source watermarks past them."""
+    # The feed is newest first, so add oldest first to keep the history in recency order
+    for article in reversed(articles):
+        alert_sent_articles.add(article)
+    save_alert_articles()
+    save_watermarks(watermarks)
+
+# Quotes for every watched ticker, shared by all messages through versioned snapshots
+quote_service = QuoteService()
 
 def format_published_time(time_str):
     """Format the published time to a more readable format."""
@@ -146,35 +457,18 @@ def format_published_time(time_str):
         return time_str
 
 def save_alert_articles():
-    """Save alert article history to a file"""
-    articles_to_save = []
-    for article in alert_sent_articles[:MAX_STORED_ARTICLES]:  # Save only last N
-        # Save only essential fields to reduce file size
-        sentiment_data = article.get("sentiment", {})
-        articles_to_save.append({
-            "url": article["url"],
-            "title": article.get("title", ""),
-            "sentiment": {
-                "category": sentiment_data.get("category", "neutral"),
-                "score": sentiment_data.get("score", 0)
-            }
-        })
-    
-    with open(ALERT_ARTICLES_FILE, "w") as f:
-        json.dump(articles_to_save, f)
+    """Save alert article history to storage"""
+    storage.save_alert_articles(alert_sent_articles.records())
 
 def load_alert_articles():
-    """Load alert article history from a file"""
+    """Load alert article history from storage"""
     global alert_sent_articles
-    try:
-        with open(ALERT_ARTICLES_FILE, "r") as f:
-            alert_sent_articles = json.load(f)
-        print(f"Loaded {len(alert_sent_articles)} previously sent articles")
-    except FileNotFoundError:
-        alert_sent_articles = []
-        print("No article history file found, starting with empty list")
+    alert_sent_articles = ArticleHistory(MAX_TRACKED_ARTICLES)
+    for article in storage.load_alert_articles():
+        alert_sent_articles.add(article)
+    print(f"Loaded {len(alert_sent_articles)} previously sent articles")
 
-def format_news_message(article, include_alert_header=False, include_voo_data=None):
+def format_news_message(article, include_alert_header=False, quote_snapshot=None, watchlist=DEFAULT_WATCHLIST):
     """Format a news article into a message ready to be sent."""
     sentiment = article.get("sentiment", {})
     sentiment_category = sentiment.get("category", "neutral")
@@ -183,36 +477,179 @@ def format_news_message(article, include_alert_header=False, include_voo_data=No
     
     # Start with alert header if requested
     if include_alert_header:
-        news_text = f"🚨 *TRUMP NEWS ALERT* {sentiment_emoji}\n\n"
+        parts = [f"🚨 *TRUMP NEWS ALERT* {sentiment_emoji}\n\n"]
     else:
-        news_text = f"{sentiment_emoji} "
+        parts = [f"{sentiment_emoji} "]
     
     # Add title and summary
-    news_text += f"*{article['title']}*\n\n"
+    parts.append(f"*{article['title']}*\n\n")
     if article.get('summary'):
-        news_text += f"{article['summary']}\n\n"
+        parts.append(f"{article['summary']}\n\n")
     
     # Add sentiment analysis information
-    news_text += f"*Sentiment Analysis*: {sentiment_category.capitalize()} (Score: {sentiment_score:.2f})\n\n"
+    parts.append(f"*Sentiment Analysis*: {sentiment_category.capitalize()} (Score: {sentiment_score:.2f})\n\n")
         
     # Add source and time information if available
     if article.get('source'):
-        news_text += f"Source: {article['source']}\n"
+        parts.append(f"Source: {article['source']}\n")
     if article.get('time_published'):
         formatted_time = format_published_time(article['time_published'])
-        news_text += f"Published: {formatted_time}\n"
+        parts.append(f"Published: {formatted_time}\n")
             
-    news_text += f"\n[Read full article]({article['url']})"
+    parts.append(f"\n[Read full article]({article['url']})")
     
-    # Append VOO tracker information if provided
-    if include_voo_data:
-        if include_voo_data.get('price'):
-            news_text += (
-                "\n\n📈 *VOO Tracker*\n"
-                f"Price: ${include_voo_data['price']}\n"
-                f"Change: {include_voo_data['change']} ({include_voo_data['change_percent']})\n"
-            )
-        else:
-            news_text += "\n\n📈 *VOO Tracker*\nUnable to fetch VOO data at the moment.\n"
+    # Append the watchlist quotes if a snapshot is provided
+    if quote_snapshot:
+        parts.append(format_quote_block(quote_snapshot, watchlist))
     
+    return "".join(parts)
+
+def format_quote_block(quote_snapshot, watchlist):
+    """Format the market block appended to news messages: the watchlist's quotes from one snapshot."""
+    parts = ["\n\n📈 *Market Tracker*\n"]
+    for symbol in watchlist:
+        quote = quote_snapshot["quotes"].get(symbol)
+        if quote:
+            parts.append(f"{symbol}: ${quote['price']} ({quote['change']}, {quote['change_percent']})\n")
+        else:
+            parts.append(f"{symbol}: no data at the moment\n")
+    parts.append(format_trend_line())
+    return "".join(parts)
+
+def format_trend_line():
+    """Format the market block's 24h sentiment line, or "" when it's disabled or there is nothing to show."""
+    if not TREND_IN_QUOTE_BLOCK:
+        return ""
+    summary = sentiment_trends.summary("24h")
+    if not summary["count"]:
+        return ""
+    return f"News sentiment (24h): {summary['mean']:+.2f} avg · {format_trend_shares(summary)}\n"
+
+def format_trend_shares(summary):
+    """Format a trend summary's category shares, e.g. "🟢 40% ⚪ 35% 🔴 25%"."""
+    return " ".join(f"{get_sentiment_emoji(category)} {share:.0%}" for category, share in summary["shares"].items())
+
+def format_trend_message(summaries):
+    """Format the /trend message from SentimentTrends.summaries()."""
+    parts = ["📊 *Sentiment Trend*\n"]
+    for label, summary in summaries:
+        if not summary["count"]:
+            parts.append(f"\n*Last {label}*: no articles\n")
+            continue
+        # The EWMA leans towards the newest articles, so comparing it with the mean shows the direction
+        direction = summary["ewma"] - summary["mean"]
+        arrow = "📈" if direction > TREND_DIRECTION_THRESHOLD else "📉" if direction < -TREND_DIRECTION_THRESHOLD else "➡️"
+        parts.append(
+            f"\n*Last {label}*: {summary['count']} {'article' if summary['count'] == 1 else 'articles'}\n"
+            f"Mean {summary['mean']:+.2f} · Recent (EWMA) {summary['ewma']:+.2f} {arrow}\n"
+            f"{format_trend_shares(summary)}\n"
+        )
+    return "".join(parts).rstrip("\n")
+
+# Rendered messages, shared by every subscriber and /latest with the same watchlist and quote snapshot.
+# The market block's sentiment line is part of the key too: it moves with the trends even while
+# the quotes don't (e.g. when markets are closed).
+rendered_messages = OrderedDict()  # {(url, include_alert_header, quote snapshot version, watchlist, trend state): text}
+render_cache_stats = {"hits": 0, "misses": 0}
+
+def market_block_key(quote_snapshot, watchlist):
+    """The part of a render cache key that identifies a message's market block."""
+    if not quote_snapshot:
+        return None, watchlist, None
+    return quote_snapshot["version"], watchlist, sentiment_trends.state("24h") if TREND_IN_QUOTE_BLOCK else None
+
+def render_news_message(article, include_alert_header=False, quote_snapshot=None, watchlist=DEFAULT_WATCHLIST):
+    """Return the formatted message for an article, rendering it at most once per market block (quotes, watchlist and trend)."""
+    key = (article["url"], include_alert_header, *market_block_key(quote_snapshot, watchlist))
+    news_text = rendered_messages.get(key)
+    if news_text is None:
+        render_cache_stats["misses"] += 1
+        with metrics.timer("render_seconds"):
+            news_text = format_news_message(article, include_alert_header, quote_snapshot, watchlist)
+        rendered_messages[key] = news_text
+        if len(rendered_messages) > RENDER_CACHE_SIZE:
+            rendered_messages.popitem(last=False)  # Evict least recently used
+    else:
+        render_cache_stats["hits"] += 1
+        rendered_messages.move_to_end(key)
     return news_text
+
+def render_news_batch(articles, include_alert_header=False, quote_snapshot=None, watchlist=DEFAULT_WATCHLIST):
+    """Render a batch of articles once, returning their messages in the same order."""
+    return [render_news_message(article, include_alert_header, quote_snapshot, watchlist) for article in articles]
+
+def format_digest_message(articles, quote_snapshot=None, watchlist=DEFAULT_WATCHLIST):
+    """Format several articles into one digest message."""
+    parts = [f"📰 *TRUMP NEWS DIGEST* ({len(articles)} {'article' if len(articles) == 1 else 'articles'})\n\n"]
+    for article in articles:
+        sentiment_emoji = get_sentiment_emoji(article.get("sentiment", {}).get("category", "neutral"))
+        parts.append(f"{sentiment_emoji} *{article['title']}*\n")
+        details = []
+        if article.get('source'):
+            details.append(article['source'])
+        if article.get('time_published'):
+            details.append(format_published_time(article['time_published']))
+        if details:
+            parts.append(" · ".join(details) + "\n")
+        parts.append(f"[Read full article]({article['url']})\n\n")
+    
+    if quote_snapshot:
+        parts.append(format_quote_block(quote_snapshot, watchlist).lstrip("\n"))
+    return "".join(parts).rstrip("\n")
+
+def render_digest(articles, quote_snapshot=None, watchlist=DEFAULT_WATCHLIST):
+    """Render a digest (newest DIGEST_MAX_ARTICLES articles) as one or more messages within Telegram's size limit.
+
+    Users with the same articles in their window share one cached rendering.
+    """
+    articles = sorted(articles, key=lambda article: article.get("time_published", ""), reverse=True)[:DIGEST_MAX_ARTICLES]
+    key = ("digest", tuple(article["url"] for article in articles), *market_block_key(quote_snapshot, watchlist))
+    messages = rendered_messages.get(key)
+    if messages is not None:
+        render_cache_stats["hits"] += 1
+        rendered_messages.move_to_end(key)
+        return messages
+    
+    render_cache_stats["misses"] += 1
+    with metrics.timer("render_seconds", kind="digest"):
+        messages = [format_digest_message(articles, quote_snapshot, watchlist)]
+    if len(messages[0]) > TELEGRAM_MESSAGE_LIMIT:
+        if len(articles) > 1:
+            # Too long for one message: split the articles in half until each part fits
+            half = len(articles) // 2
+            messages = render_digest(articles[:half]) + render_digest(articles[half:], quote_snapshot, watchlist)
+        else:
+            messages = [messages[0][:TELEGRAM_MESSAGE_LIMIT]]
+    rendered_messages[key] = messages
+    if len(rendered_messages) > RENDER_CACHE_SIZE:
+        rendered_messages.popitem(last=False)
+    return messages
+
+def format_search_results(words, articles, offset, total):
+    """Format one page of /search results."""
+    parts = [f"🔎 *Search: {words}* ({offset + 1}-{offset + len(articles)} of {total})\n\n"]
+    for article in articles:
+        sentiment_emoji = get_sentiment_emoji(article["sentiment"]["category"])
+        parts.append(f"{sentiment_emoji} *{article['title']}*\n")
+        details = [detail for detail in (article.get('source'), format_published_time(article['time_published'])) if detail]
+        if details:
+            parts.append(" · ".join(details) + "\n")
+        parts.append(f"[Read full article]({article['url']})\n\n")
+    return "".join(parts).rstrip("\n")
+
+def _hit_ratio(stats):
+    lookups = stats["hits"] + stats["misses"]
+    return stats["hits"] / lookups if lookups else 0.0
+
+def collect_cache_metrics():
+    """Cache sizes and hit ratios, exported as gauges on every metrics scrape."""
+    return {
+        "api_cache_hit_ratio": _hit_ratio(api_cache.stats),
+        "api_cache_coalesced_total": api_cache.stats["coalesced"],
+        "sentiment_cache_hit_ratio": _hit_ratio(sentiment_cache_stats),
+        "sentiment_cache_entries": len(sentiment_cache),
+        "render_cache_hit_ratio": _hit_ratio(render_cache_stats),
+        "render_cache_entries": len(rendered_messages),
+    }
+
+metrics.register_collector(collect_cache_metrics)
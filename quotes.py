@@ -0,0 +1,110 @@
+import asyncio
+import re
+import time
+from config import *
+from http_client import alpha_vantage_query, alpha_vantage_calls_remaining, usage_key
+from dispatcher import TokenBucket
+import metrics
+import storage
+
+SYMBOL_PATTERN = re.compile(r"[A-Z][A-Z0-9.\-]{0,9}")
+
+def normalize_symbol(text):
+    """Return a ticker symbol in canonical form (e.g. "$aapl" -> "AAPL"), or None if it isn't one."""
+    symbol = text.strip().lstrip("$").upper()
+    return symbol if SYMBOL_PATTERN.fullmatch(symbol) else None
+
+class QuoteService:
+    """Market quotes for every watched ticker, shared through versioned snapshots.
+
+    refresh() fetches the stale quotes among the requested symbols concurrently
+    (one GLOBAL_QUOTE call each, single-flight per symbol) and publishes a new
+    snapshot when any of them changed. A snapshot is never modified once
+    published, so everything rendered from one reads the same prices, and its
+    version is what the render cache keys on.
+
+    Calls are limited so quotes can't starve news fetching: at most
+    QUOTE_QUOTA_SHARE of the daily Alpha Vantage quota, never the part kept in
+    reserve for /latest, and no more than ALPHA_VANTAGE_CALLS_PER_MINUTE. When
+    the limit is reached the remaining symbols keep their last quote until a
+    later refresh; callers pass the most-watched symbols first.
+    """
+
+    def __init__(self, ttl=QUOTE_CACHE_TTL, calls_per_minute=ALPHA_VANTAGE_CALLS_PER_MINUTE,
+                 quota_share=QUOTE_QUOTA_SHARE):
+        self.ttl = ttl
+        self.bucket = TokenBucket(calls_per_minute / 60, calls_per_minute)
+        self.daily_budget = int(ALPHA_VANTAGE_DAILY_QUOTA * quota_share)
+        self.quotes = {}  # {symbol: quote}, the newest fetched for each symbol
+        self.expires_at = {}  # {symbol: monotonic time the quote goes stale}
+        self.in_flight = {}  # {symbol: asyncio.Task}
+        self.changed = False
+        self.snapshot = {"version": 0, "quotes": {}}
+
+    def _calls_left_today(self):
+        # Quote calls are counted in storage, like all Alpha Vantage calls, so restarts don't reset the budget
+        reserve = ALPHA_VANTAGE_DAILY_QUOTA * ALPHA_VANTAGE_QUOTA_RESERVE
+        quote_calls = storage.get_counter(usage_key("quote_calls"))
+        return min(self.daily_budget - quote_calls, alpha_vantage_calls_remaining() - reserve)
+
+    def _take_call(self):
+        """Spend one call from the daily budget and the per-minute bucket; False if either is exhausted."""
+        if self._calls_left_today() < 1:
+            metrics.inc("quote_fetches_skipped_total", reason="daily_budget")
+            return False
+        if not self.bucket.try_acquire():
+            metrics.inc("quote_fetches_skipped_total", reason="rate_limit")
+            return False
+        storage.increment_meta(usage_key("quote_calls"))
+        return True
+
+    async def _fetch(self, symbol):
+        """Fetch one symbol's GLOBAL_QUOTE into self.quotes."""
+        try:
+            data = await alpha_vantage_query({"function": "GLOBAL_QUOTE", "symbol": symbol})
+            if "Global Quote" not in data:
+                raise ValueError("No 'Global Quote' found in response")  # e.g. a rate limit notice
+            quote_data = data["Global Quote"]
+            if quote_data:
+                self.quotes[symbol] = {
+                    "price": quote_data.get("05. price", "N/A"),
+                    "change": quote_data.get("09. change", "N/A"),
+                    "change_percent": quote_data.get("10. change percent", "N/A"),
+                }
+                self.expires_at[symbol] = time.monotonic() + self.ttl
+            else:
+                # Unknown symbol: don't spend the quota asking again soon
+                self.quotes[symbol] = None
+                self.expires_at[symbol] = time.monotonic() + QUOTE_UNKNOWN_SYMBOL_TTL
+            self.changed = True
+            metrics.inc("quote_fetches_total", result="ok" if quote_data else "unknown_symbol")
+        except Exception as e:
+            print(f"Error fetching {symbol} quote: {e}")
+            metrics.inc("quote_fetches_total", result="error")
+            self.expires_at[symbol] = time.monotonic() + self.ttl  # keep the last quote until the next window
+        finally:
+            del self.in_flight[symbol]
+
+    def _publish(self):
+        self.changed = False
+        self.snapshot = {"version": self.snapshot["version"] + 1, "quotes": dict(self.quotes)}
+        metrics.set_gauge("quote_snapshot_version", self.snapshot["version"])
+        metrics.set_gauge("quote_symbols", len(self.quotes))
+
+    async def refresh(self, symbols):
+        """Bring the given symbols up to date where the limits allow, and return the current snapshot."""
+        now = time.monotonic()
+        pending = []
+        for symbol in symbols:
+            task = self.in_flight.get(symbol)
+            if task is None:
+                if now < self.expires_at.get(symbol, 0) or not self._take_call():
+                    continue
+                task = self.in_flight[symbol] = asyncio.create_task(self._fetch(symbol))
+            pending.append(task)
+        if pending:
+            # Shielded so a cancelled caller doesn't cancel a fetch another caller is waiting for
+            await asyncio.gather(*(asyncio.shield(task) for task in pending))
+        if self.changed:
+            self._publish()
+        return self.snapshot
@@ -0,0 +1,66 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from config import *
+from http_client import alpha_vantage_calls_remaining
+
+class AdaptiveScheduler:
+    """Chooses the delay before the next alert cycle.
+
+    The delay follows the observed rate of new articles (an EWMA of articles
+    per second) so that roughly NEWS_TARGET_ARTICLES_PER_CHECK new articles
+    arrive per cycle. It is clamped to [min_interval, max_interval], never
+    shorter than what the remaining daily Alpha Vantage budget allows, and
+    jittered so restarts don't synchronize requests.
+    """
+
+    def __init__(self, min_interval=NEWS_CHECK_MIN_INTERVAL, max_interval=NEWS_CHECK_MAX_INTERVAL,
+                 initial_interval=NEWS_CHECK_INTERVAL, target_articles=NEWS_TARGET_ARTICLES_PER_CHECK,
+                 jitter=NEWS_CHECK_JITTER, smoothing=0.3):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = initial_interval
+        self.target_articles = target_articles
+        self.jitter = jitter
+        self.smoothing = smoothing
+        self.article_rate = None  # EWMA of new articles per second
+        self.calls_per_cycle = None  # EWMA of Alpha Vantage calls per cycle
+        self.last_cycle_at = None
+
+    def record_cycle(self, new_articles, api_calls):
+        """Update the rate estimates after an alert cycle finishes."""
+        now = time.monotonic()
+        elapsed = now - self.last_cycle_at if self.last_cycle_at else self.interval
+        self.last_cycle_at = now
+
+        rate = new_articles / max(elapsed, 1.0)
+        if self.article_rate is None:
+            self.article_rate = rate
+            self.calls_per_cycle = api_calls
+        else:
+            self.article_rate += self.smoothing * (rate - self.article_rate)
+            self.calls_per_cycle += self.smoothing * (api_calls - self.calls_per_cycle)
+
+    def quota_floor(self):
+        """Shortest interval that keeps the remaining daily budget from running out before reset."""
+        if not self.calls_per_cycle:
+            return 0.0
+        now = datetime.now(timezone.utc)
+        reset = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        seconds_left = (reset - now).total_seconds()
+        usable_calls = alpha_vantage_calls_remaining() - ALPHA_VANTAGE_DAILY_QUOTA * ALPHA_VANTAGE_QUOTA_RESERVE
+        cycles_left = usable_calls / self.calls_per_cycle
+        if cycles_left < 1:
+            return seconds_left  # Budget spent: wait for the daily reset
+        return seconds_left / cycles_left
+
+    def next_interval(self):
+        """Return the delay in seconds before the next cycle should start."""
+        if self.article_rate is not None:
+            if self.article_rate > 0:
+                self.interval = self.target_articles / self.article_rate
+            else:
+                self.interval = self.max_interval
+        interval = min(max(self.interval, self.min_interval), self.max_interval)
+        interval = max(interval, self.quota_floor())
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
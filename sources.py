@@ -0,0 +1,448 @@
+import asyncio
+import html
+import json
+import re
+import time
+import xml.etree.ElementTree as ET
+from contextlib import aclosing
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit, urlunsplit
+from config import *
+from http_client import alpha_vantage_stream, get_text
+import metrics
+import storage
+
+# Per-source fetch statistics: {name: {"fetches", "errors", "articles", "last_duration", "last_error"}}
+source_stats = {}
+
+ATOM_NS = "{http://www.w3.org/2005/Atom}"
+TIME_FORMAT = "%Y%m%dT%H%M%S"  # Alpha Vantage's time_published format
+
+class Article:
+    """Compact article record in the common schema shared by every source.
+
+    Only the fields the bot uses are kept, in slots, and dict-style access
+    (article["title"], article.get("sentiment", {})) works as it does for the
+    plain dicts the rest of the code was written against.
+    """
+
+    __slots__ = ("title", "summary", "url", "source", "time_published", "sentiment", "matched_keywords")
+
+    def __init__(self, title, summary, url, source, time_published):
+        self.title = title
+        self.summary = summary
+        self.url = url
+        self.source = source
+        self.time_published = time_published
+        self.sentiment = None
+        self.matched_keywords = None
+
+    def __getitem__(self, key):
+        try:
+            value = getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None)
+        return default if value is None else value
+
+    def __contains__(self, key):
+        return getattr(self, key, None) is not None
+
+    def __repr__(self):
+        return f"Article({self.url!r})"
+
+def normalize_article(title, summary, url, source, time_published):
+    """Build an article in the common schema shared by every source."""
+    return Article(
+        (title or "").strip(),
+        (summary or "").strip(),
+        (url or "").strip(),
+        source or "",
+        time_published or "",
+    )
+
+def _format_time(dt):
+    """Convert a datetime to Alpha Vantage's time format (aware times become UTC)."""
+    if dt is None:
+        return ""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.strftime(TIME_FORMAT)
+
+def _parse_time(value):
+    """Parse RFC 822 (RSS) or ISO 8601 (Atom) timestamps."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+def _clean_text(text):
+    """Strip HTML tags and entities from feed text."""
+    if not text:
+        return ""
+    return html.unescape(re.sub(r"<[^>]+>", "", text)).strip()
+
+_json_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+class FeedStreamParser:
+    """Incremental parser for the "feed" array of a NEWS_SENTIMENT response.
+
+    The body is fed in chunks as it arrives and each completed feed item is
+    decoded on its own, so the response is never held as one string or one
+    dict and the caller can stop reading as soon as it has what it needs.
+    Other top-level fields (e.g. Alpha Vantage's "Information" error) are
+    kept in `fields`.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.state = "start"  # start, key, colon, value, feed, items, end
+        self.key = None
+        self.fields = {}
+        self.has_feed = False
+
+    def _decode(self, buffer, pos, final):
+        """Decode one JSON value at pos; None if it may not have fully arrived yet."""
+        try:
+            value, end = _json_decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if final:
+                raise ValueError("Truncated or invalid NEWS_SENTIMENT response") from None
+            return None
+        if end == len(buffer) and not final:
+            return None  # a number at the very end may continue in the next chunk
+        return value, end
+
+    def feed(self, text, final=False):
+        """Add a chunk of the body and return the feed items it completed."""
+        buffer = self.buffer + text if self.buffer else text
+        items = []
+        pos = 0
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer) or self.state == "end":
+                break
+            char = buffer[pos]
+            if self.state == "start":
+                if char != "{":
+                    raise ValueError("NEWS_SENTIMENT response is not a JSON object")
+                self.state = "key"
+                pos += 1
+            elif self.state in ("key", "items") and char == ",":
+                pos += 1
+            elif self.state == "key" and char == "}":
+                self.state = "end"
+                pos += 1
+            elif self.state == "items" and char == "]":
+                self.state = "key"
+                pos += 1
+            elif self.state == "colon":
+                if char != ":":
+                    raise ValueError("Invalid NEWS_SENTIMENT response")
+                self.state = "feed" if self.key == "feed" else "value"
+                pos += 1
+            elif self.state == "feed" and char == "[":
+                self.has_feed = True
+                self.state = "items"
+                pos += 1
+            else:
+                decoded = self._decode(buffer, pos, final)
+                if decoded is None:
+                    break
+                value, pos = decoded
+                if self.state == "key":
+                    self.key = value
+                    self.state = "colon"
+                elif self.state == "items":
+                    items.append(value)
+                else:
+                    self.fields[self.key] = value
+                    self.state = "key"
+        self.buffer = buffer[pos:]
+        if final and self.state != "end":
+            raise ValueError("Truncated NEWS_SENTIMENT response")
+        return items
+
+    def error(self):
+        """The problem Alpha Vantage reported instead of a feed."""
+        return self.fields.get("Information") or self.fields.get("Note") or "No 'feed' found in response"
+
+def _add_feed_items(articles, items, source_name, since):
+    """Append feed items as articles; False once an item older than `since` is reached."""
+    for item in items:
+        if since and item.get("time_published", "") < since:
+            return False
+        articles.append(normalize_article(item.get("title"), item.get("summary"), item.get("url"),
+                                          item.get("source") or source_name, item.get("time_published")))
+    return True
+
+async def parse_alpha_vantage_stream(chunks, source_name="Alpha Vantage", since=None):
+    """Normalize a NEWS_SENTIMENT response from an async iterator of body chunks.
+
+    The feed is sorted newest first, so parsing stops at the first item older
+    than `since` without decoding the rest of the response.
+    """
+    parser = FeedStreamParser()
+    articles = []
+    async with aclosing(chunks):
+        async for chunk in chunks:
+            if not _add_feed_items(articles, parser.feed(chunk), source_name, since):
+                metrics.inc("feed_parse_stopped_early_total")
+                return articles
+    _add_feed_items(articles, parser.feed("", final=True), source_name, since)
+    if not parser.has_feed:
+        raise ValueError(parser.error())
+    return articles
+
+def parse_alpha_vantage_text(text, source_name="Alpha Vantage", since=None):
+    """Normalize a NEWS_SENTIMENT response held in a string."""
+    parser = FeedStreamParser()
+    articles = []
+    _add_feed_items(articles, parser.feed(text, final=True), source_name, since)
+    if not parser.has_feed:
+        raise ValueError(parser.error())
+    return articles
+
+def filter_since(articles, since):
+    """Drop articles published before `since` (for feeds with no guaranteed order)."""
+    if not since:
+        return articles
+    return [article for article in articles if article["time_published"] >= since]
+
+def parse_xml_feed(text, source_name):
+    """Normalize an RSS 2.0 or Atom document."""
+    root = ET.fromstring(text)
+    articles = []
+
+    # RSS 2.0: <rss><channel><item>
+    channel = root.find("channel")
+    if channel is not None:
+        feed_title = channel.findtext("title") or source_name
+        for item in channel.iter("item"):
+            articles.append(normalize_article(
+                _clean_text(item.findtext("title")),
+                _clean_text(item.findtext("description")),
+                item.findtext("link"),
+                feed_title,
+                _format_time(_parse_time(item.findtext("pubDate")))
+            ))
+        return articles
+
+    # Atom: <feed><entry>
+    feed_title = root.findtext(f"{ATOM_NS}title") or source_name
+    for entry in root.iter(f"{ATOM_NS}entry"):
+        link = entry.find(f"{ATOM_NS}link[@rel='alternate']")
+        if link is None:
+            link = entry.find(f"{ATOM_NS}link")
+        published = entry.findtext(f"{ATOM_NS}published") or entry.findtext(f"{ATOM_NS}updated")
+        articles.append(normalize_article(
+            _clean_text(entry.findtext(f"{ATOM_NS}title")),
+            _clean_text(entry.findtext(f"{ATOM_NS}summary") or entry.findtext(f"{ATOM_NS}content")),
+            link.get("href") if link is not None else "",
+            feed_title,
+            _format_time(_parse_time(published))
+        ))
+    return articles
+
+class NewsSource:
+    """Base class for news source adapters.
+
+    Subclasses implement fetch() and return articles in the common schema
+    produced by normalize_article(). When `since` (a time_published value) is
+    given, only articles published at or after it need to be returned.
+    """
+
+    name = "source"
+
+    async def fetch(self, since=None):
+        raise NotImplementedError
+
+class AlphaVantageSource(NewsSource):
+    """Alpha Vantage NEWS_SENTIMENT feed."""
+
+    def __init__(self, topics="politics"):
+        self.name = f"alphavantage:{topics}"
+        self.topics = topics
+
+    async def fetch(self, since=None):
+        params = {
+            "function": "NEWS_SENTIMENT",
+            "topics": self.topics,
+            "sort": "LATEST"
+        }
+        if since:
+            params["time_from"] = since[:13]  # Alpha Vantage accepts YYYYMMDDTHHMM
+        return await parse_alpha_vantage_stream(alpha_vantage_stream(params), since=since)
+
+class RSSSource(NewsSource):
+    """Remote RSS or Atom feed."""
+
+    def __init__(self, url):
+        self.name = f"rss:{url}"
+        self.url = url
+
+    async def fetch(self, since=None):
+        return filter_since(parse_xml_feed(await get_text(self.url), urlsplit(self.url).netloc), since)
+
+class FileSource(NewsSource):
+    """Local file for offline testing: a saved NEWS_SENTIMENT JSON response or an RSS/Atom document."""
+
+    def __init__(self, path):
+        self.name = f"file:{path}"
+        self.path = path
+
+    def _read(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    async def fetch(self, since=None):
+        text = await asyncio.to_thread(self._read)
+        if self.path.endswith(".json"):
+            return parse_alpha_vantage_text(text, source_name=self.path, since=since)
+        return filter_since(parse_xml_feed(text, self.path), since)
+
+def build_sources():
+    """Create the configured news sources, Alpha Vantage first."""
+    sources = []
+    if ALPHA_VANTAGE_NEWS_ENABLED:
+        sources.append(AlphaVantageSource())
+    sources.extend(RSSSource(url) for url in RSS_FEED_URLS)
+    sources.extend(FileSource(path) for path in NEWS_FILE_SOURCES)
+    return sources
+
+def _url_key(url):
+    """Normalize a URL for cross-source duplicate detection."""
+    parts = urlsplit(url.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower().removeprefix("www."), parts.path.rstrip("/"), "", ""))
+
+def _title_key(title):
+    """Normalize a title for cross-source duplicate detection."""
+    return " ".join(re.findall(r"\w+", title.lower()))
+
+def merge_articles(article_lists):
+    """Merge per-source article lists, drop duplicates and sort newest first.
+
+    Articles are deduplicated by normalized URL and by normalized title; the
+    copy from the earliest source in the list wins.
+    """
+    seen_urls = set()
+    seen_titles = set()
+    merged = []
+    for articles in article_lists:
+        for article in articles:
+            if not article["url"]:
+                continue
+            url_key = _url_key(article["url"])
+            title_key = _title_key(article["title"])
+            if url_key in seen_urls or (title_key and title_key in seen_titles):
+                continue
+            seen_urls.add(url_key)
+            if title_key:
+                seen_titles.add(title_key)
+            merged.append(article)
+    merged.sort(key=lambda article: article["time_published"], reverse=True)
+    return merged
+
+def get_watermark(source):
+    """Return a source's stored watermark: {"time_published", "fetched_at"} or None."""
+    value = storage.get_meta(f"watermark:{source.name}")
+    return json.loads(value) if value else None
+
+def next_watermark(articles, previous):
+    """Return a source's watermark advanced to the newest article it returned."""
+    newest = max((article["time_published"] for article in articles), default="")
+    if previous and previous["time_published"] > newest:
+        newest = previous["time_published"]
+    return {"time_published": newest, "fetched_at": time.time()}
+
+def save_watermarks(watermarks):
+    """Store the watermarks from fetch_new_articles, once their articles have been handled."""
+    for name, watermark in watermarks.items():
+        storage.set_meta(f"watermark:{name}", json.dumps(watermark))
+
+async def _fetch_source(source, incremental):
+    """Fetch one source and return (articles, its next watermark or None).
+
+    When incremental, only asks for new items if the source has a recent
+    watermark. Falls back to a full fetch when there's no watermark, when the
+    last fetch was too long ago to trust (a gap), or when the incremental
+    request fails.
+    """
+    if not incremental:
+        return await source.fetch(), None
+    
+    watermark = get_watermark(source)
+    since = None
+    if watermark and watermark["time_published"] and time.time() - watermark["fetched_at"] <= INCREMENTAL_MAX_GAP:
+        since = watermark["time_published"]
+    
+    try:
+        articles = await source.fetch(since=since)
+    except Exception as e:
+        if since is None:
+            raise
+        print(f"Incremental fetch from {source.name} failed ({e}), falling back to a full fetch")
+        articles = await source.fetch()
+    
+    return articles, next_watermark(articles, watermark)
+
+async def _timed_fetch(source, incremental):
+    """Fetch one source and record its timing and error stats."""
+    stats = source_stats.setdefault(source.name, {"fetches": 0, "errors": 0, "articles": 0,
+                                                  "last_duration": 0.0, "last_error": None})
+    stats["fetches"] += 1
+    started = time.monotonic()
+    try:
+        articles, watermark = await _fetch_source(source, incremental)
+        stats["articles"] = len(articles)
+        stats["last_error"] = None
+        return articles, watermark
+    except Exception as e:
+        stats["errors"] += 1
+        stats["last_error"] = str(e)
+        metrics.inc("news_fetch_errors_total", source=source.name)
+        print(f"Error fetching news from {source.name}: {e}")
+        raise
+    finally:
+        stats["last_duration"] = time.monotonic() - started
+        metrics.observe("news_fetch_seconds", stats["last_duration"], source=source.name)
+
+async def _fetch_sources(sources, incremental):
+    """Fetch every source concurrently; raises the first error only if every source failed."""
+    results = await asyncio.gather(*(_timed_fetch(source, incremental) for source in sources), return_exceptions=True)
+    fetched = [(source, result) for source, result in zip(sources, results) if not isinstance(result, BaseException)]
+    if sources and not fetched:
+        raise results[0]
+    return fetched
+
+async def fetch_all_sources(sources):
+    """Fetch every source concurrently and return the merged, deduplicated articles."""
+    return merge_articles([articles for _, (articles, _) in await _fetch_sources(sources, False)])
+
+async def fetch_new_articles(sources):
+    """Fetch only the items newer than each source's stored watermark.
+
+    Returns (merged articles, {source name: next watermark}). The watermarks
+    are not stored here: pass them to save_watermarks once the articles are
+    safely queued, so a cycle that fails later fetches them again.
+    """
+    fetched = await _fetch_sources(sources, True)
+    watermarks = {source.name: watermark for source, (_, watermark) in fetched}
+    return merge_articles([articles for _, (articles, _) in fetched]), watermarks
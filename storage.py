@@ -0,0 +1,422 @@
+import atexit
+import copy
+import json
+import sqlite3
+import os
+import threading
+import time
+from contextlib import contextmanager
+from config import *
+import metrics
+
+class JsonStorage:
+    """Legacy storage backend that keeps state in memory and rewrites whole JSON files.
+
+    Each file is replaced atomically (temp file + rename), so a crash mid-write
+    leaves the previous version in place. apply_batch() writes each changed
+    file once, however many changes the batch holds.
+    """
+
+    def __init__(self):
+        self.subscribers = set(self._read(SUBSCRIBERS_FILE, []))
+        self.user_preferences = {int(user_id): prefs for user_id, prefs in self._read(USER_PREFERENCES_FILE, {}).items()}
+        self.meta = self._read(NEWS_STATE_FILE, {})
+        self.pending_digests = {int(chat_id): digest for chat_id, digest in self._read(PENDING_DIGESTS_FILE, {}).items()}
+        self.alert_articles = None  # only kept once saved
+        self.dirty = set()
+        self.batching = False
+
+    def _read(self, path, default):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+
+    def _write(self, path, data):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _changed(self, path):
+        self.dirty.add(path)
+        if not self.batching:
+            self.write_dirty()
+
+    def write_dirty(self):
+        """Write every file changed since the last write."""
+        contents = {
+            SUBSCRIBERS_FILE: lambda: list(self.subscribers),
+            USER_PREFERENCES_FILE: lambda: self.user_preferences,
+            NEWS_STATE_FILE: lambda: self.meta,
+            ARTICLES_HISTORY_FILE: lambda: self.alert_articles,
+            PENDING_DIGESTS_FILE: lambda: self.pending_digests,
+        }
+        while self.dirty:
+            path = self.dirty.pop()
+            self._write(path, contents[path]())
+
+    def apply_batch(self, writes):
+        """Apply (method name, args) writes in order, then write each changed file once."""
+        self.batching = True
+        try:
+            for method_name, args in writes:
+                getattr(self, method_name)(*args)
+        finally:
+            self.batching = False
+        self.write_dirty()
+
+    def load_subscribers(self):
+        return set(self.subscribers)
+
+    def add_subscriber(self, chat_id):
+        self.subscribers.add(chat_id)
+        self._changed(SUBSCRIBERS_FILE)
+
+    def remove_subscriber(self, chat_id):
+        self.subscribers.discard(chat_id)
+        self._changed(SUBSCRIBERS_FILE)
+
+    def load_user_preferences(self):
+        return copy.deepcopy(self.user_preferences)
+
+    def save_user_preference(self, chat_id, prefs):
+        self.user_preferences[chat_id] = prefs
+        self._changed(USER_PREFERENCES_FILE)
+
+    def load_alert_articles(self):
+        if self.alert_articles is not None:
+            return copy.deepcopy(self.alert_articles)
+        return self._read(ARTICLES_HISTORY_FILE, [])
+
+    def get_meta(self, key, default=None):
+        return self.meta.get(key, default)
+
+    def set_meta(self, key, value):
+        self.meta[key] = value
+        self._changed(NEWS_STATE_FILE)
+
+    def increment_meta(self, key, amount):
+        self.meta[key] = str(int(self.meta.get(key) or 0) + amount)
+        self._changed(NEWS_STATE_FILE)
+
+    def save_alert_articles(self, records):
+        self.alert_articles = records
+        self._changed(ARTICLES_HISTORY_FILE)
+
+    def load_pending_digests(self):
+        return copy.deepcopy(self.pending_digests)
+
+    def save_pending_digest(self, chat_id, digest):
+        if digest is None:
+            self.pending_digests.pop(chat_id, None)
+        else:
+            self.pending_digests[chat_id] = digest
+        self._changed(PENDING_DIGESTS_FILE)
+
+    def close(self):
+        self.write_dirty()
+
+class SQLiteStorage:
+    """SQLite backend (WAL mode) with row-level upserts.
+
+    On first use it imports any legacy JSON files so existing deployments keep
+    their subscribers, preferences and alert history.
+    """
+
+    def __init__(self, path=DATABASE_FILE):
+        self.lock = threading.RLock()
+        self.depth = 0  # nesting level of transaction()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS subscribers (chat_id INTEGER PRIMARY KEY)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS user_preferences (chat_id INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS alert_articles ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT UNIQUE NOT NULL, "
+                "title TEXT, category TEXT, score REAL)"
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS pending_digests (chat_id INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+        if self.get_meta("json_imported") is None:
+            self.import_json()
+
+    @contextmanager
+    def transaction(self):
+        """Hold the lock for one transaction; nested calls join the outermost one."""
+        with self.lock:
+            self.depth += 1
+            try:
+                if self.depth == 1:
+                    with self.conn:
+                        yield
+                else:
+                    yield
+            finally:
+                self.depth -= 1
+
+    def apply_batch(self, writes):
+        """Apply (method name, args) writes in order, in a single transaction."""
+        with self.transaction():
+            for method_name, args in writes:
+                getattr(self, method_name)(*args)
+
+    def get_meta(self, key, default=None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self.transaction():
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def increment_meta(self, key, amount):
+        """Add to an integer meta value in place, so increments from other processes aren't lost."""
+        with self.transaction():
+            self.conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + excluded.value",
+                (key, amount)
+            )
+
+    def import_json(self):
+        """Import the legacy JSON files, if present."""
+        legacy = JsonStorage()
+        with self.transaction():
+            self.conn.executemany("INSERT OR IGNORE INTO subscribers (chat_id) VALUES (?)",
+                                  [(chat_id,) for chat_id in legacy.subscribers])
+            self.conn.executemany("INSERT OR IGNORE INTO user_preferences (chat_id, data) VALUES (?, ?)",
+                                  [(chat_id, json.dumps(prefs)) for chat_id, prefs in legacy.user_preferences.items()])
+        self.save_alert_articles(legacy.load_alert_articles())
+        self.set_meta("json_imported", "1")
+        if legacy.subscribers or legacy.user_preferences:
+            print(f"Imported {len(legacy.subscribers)} subscribers and {len(legacy.user_preferences)} preferences from JSON")
+
+    def load_subscribers(self):
+        with self.lock:
+            return {row[0] for row in self.conn.execute("SELECT chat_id FROM subscribers")}
+
+    def add_subscriber(self, chat_id):
+        with self.transaction():
+            self.conn.execute("INSERT OR IGNORE INTO subscribers (chat_id) VALUES (?)", (chat_id,))
+
+    def remove_subscriber(self, chat_id):
+        with self.transaction():
+            self.conn.execute("DELETE FROM subscribers WHERE chat_id = ?", (chat_id,))
+
+    def load_user_preferences(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT chat_id, data FROM user_preferences").fetchall()
+        return {chat_id: json.loads(data) for chat_id, data in rows}
+
+    def save_user_preference(self, chat_id, prefs):
+        with self.transaction():
+            self.conn.execute(
+                "INSERT INTO user_preferences (chat_id, data) VALUES (?, ?) "
+                "ON CONFLICT(chat_id) DO UPDATE SET data = excluded.data",
+                (chat_id, json.dumps(prefs))
+            )
+
+    def load_alert_articles(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT url, title, category, score FROM alert_articles ORDER BY seq").fetchall()
+        return [{"url": url, "title": title, "sentiment": {"category": category, "score": score}}
+                for url, title, category, score in rows]
+
+    def save_alert_articles(self, records):
+        """Insert newly tracked articles and drop the ones evicted from the history."""
+        urls = [record["url"] for record in records]
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO alert_articles (url, title, category, score) VALUES (?, ?, ?, ?)",
+                [(r["url"], r.get("title", ""), r.get("sentiment", {}).get("category", "neutral"),
+                  r.get("sentiment", {}).get("score", 0)) for r in records]
+            )
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep_urls (url TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM keep_urls")
+            self.conn.executemany("INSERT OR IGNORE INTO keep_urls (url) VALUES (?)", [(url,) for url in urls])
+            self.conn.execute("DELETE FROM alert_articles WHERE url NOT IN (SELECT url FROM keep_urls)")
+
+    def load_pending_digests(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT chat_id, data FROM pending_digests").fetchall()
+        return {chat_id: json.loads(data) for chat_id, data in rows}
+
+    def save_pending_digest(self, chat_id, digest):
+        """Store a chat's pending digest, or delete it when digest is None."""
+        with self.transaction():
+            if digest is None:
+                self.conn.execute("DELETE FROM pending_digests WHERE chat_id = ?", (chat_id,))
+            else:
+                self.conn.execute(
+                    "INSERT INTO pending_digests (chat_id, data) VALUES (?, ?) "
+                    "ON CONFLICT(chat_id) DO UPDATE SET data = excluded.data",
+                    (chat_id, json.dumps(digest))
+                )
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def create_backend():
+    """Create the storage backend selected by STORAGE_BACKEND."""
+    if STORAGE_BACKEND == "json":
+        return JsonStorage()
+    if STORAGE_BACKEND == "sqlite":
+        return SQLiteStorage()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+# Storage backend; all writes are applied by one flusher thread, in order
+_backend = None
+_backend_lock = threading.Lock()  # the startup load and the flusher thread may both open it first
+
+# Write-behind queue: writes are coalesced by key (the latest one wins) and
+# flushed as one batch once they've been quiet for STORAGE_FLUSH_DELAY, or at
+# most STORAGE_FLUSH_MAX_DELAY after the first of them
+_pending = {}
+_pending_changed = threading.Condition()
+_first_write_at = _last_write_at = 0.0
+_flush_lock = threading.Lock()  # one batch at a time, so batches land in order
+_flusher = None
+
+def get_backend():
+    """Return the active storage backend, opening it on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+def _queue_write(key, method_name, *args):
+    """Queue a write, replacing any pending write with the same key."""
+    global _first_write_at, _last_write_at, _flusher
+    with _pending_changed:
+        now = time.monotonic()
+        if not _pending:
+            _first_write_at = now
+        _last_write_at = now
+        if key in _pending:
+            metrics.inc("storage_writes_coalesced_total")
+        _pending[key] = (method_name, args)
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name="storage-writer", daemon=True)
+            _flusher.start()
+        _pending_changed.notify()
+
+def _flush_loop():
+    """Flusher thread: wait for a burst of writes to settle, then flush it."""
+    while True:
+        with _pending_changed:
+            while True:
+                if not _pending:
+                    _pending_changed.wait()
+                    continue
+                due = min(_last_write_at + STORAGE_FLUSH_DELAY, _first_write_at + STORAGE_FLUSH_MAX_DELAY)
+                remaining = due - time.monotonic()
+                if remaining <= 0:
+                    break
+                _pending_changed.wait(remaining)
+        _flush_pending()
+
+def _flush_pending():
+    """Apply every pending write as one batch."""
+    global _pending, _first_write_at, _last_write_at
+    with _flush_lock:
+        with _pending_changed:
+            batch, _pending = _pending, {}
+        if not batch:
+            return
+        try:
+            with metrics.timer("storage_flush_seconds"):
+                get_backend().apply_batch(list(batch.values()))
+            metrics.inc("storage_writes_total", len(batch))
+        except Exception as e:
+            print(f"Error writing to storage: {e}")
+            # Put the batch back (behind anything newer for the same keys) and retry later
+            with _pending_changed:
+                for key, write in batch.items():
+                    newer = _pending.setdefault(key, write)
+                    if newer is not write and write[0] == "increment_meta":
+                        _pending[key] = ("increment_meta", (key[1], newer[1][1] + write[1][1]))
+                _first_write_at = _last_write_at = time.monotonic()
+
+def _pending_write(key):
+    with _pending_changed:
+        return _pending.get(key)
+
+# Reads see every write made so far: bulk loads flush first, small reads check the queue
+def load_subscribers():
+    flush()
+    return get_backend().load_subscribers()
+
+def load_user_preferences():
+    flush()
+    return get_backend().load_user_preferences()
+
+def load_alert_articles():
+    flush()
+    return get_backend().load_alert_articles()
+
+def load_pending_digests():
+    flush()
+    return get_backend().load_pending_digests()
+
+def get_meta(key, default=None):
+    pending = _pending_write(("meta", key))
+    if pending is not None:
+        return pending[1][1]
+    return get_backend().get_meta(key, default)
+
+def get_counter(key):
+    """Return a meta value kept with increment_meta, including increments not written yet."""
+    pending = _pending_write(("meta_increment", key))
+    return int(get_backend().get_meta(key) or 0) + (pending[1][1] if pending else 0)
+
+# Writes are queued and applied off the event loop
+def add_subscriber(chat_id):
+    _queue_write(("subscriber", chat_id), "add_subscriber", chat_id)
+
+def remove_subscriber(chat_id):
+    _queue_write(("subscriber", chat_id), "remove_subscriber", chat_id)
+
+def save_user_preference(chat_id, prefs):
+    _queue_write(("user_preference", chat_id), "save_user_preference", chat_id, copy.deepcopy(prefs))
+
+def save_alert_articles(records):
+    _queue_write(("alert_articles",), "save_alert_articles", copy.deepcopy(records))
+
+def save_pending_digest(chat_id, digest):
+    _queue_write(("pending_digest", chat_id), "save_pending_digest", chat_id, copy.deepcopy(digest))
+
+def set_meta(key, value):
+    _queue_write(("meta", key), "set_meta", key, value)
+
+def increment_meta(key, amount=1):
+    # Pending increments of a key add up rather than replacing each other
+    with _pending_changed:
+        pending = _pending.get(("meta_increment", key))
+        if pending is not None:
+            amount += pending[1][1]
+        _queue_write(("meta_increment", key), "increment_meta", key, amount)
+
+def flush():
+    """Apply every pending write now, blocking until it's on disk."""
+    _flush_pending()
+
+def close():
+    """Flush pending writes and close the backend."""
+    global _backend
+    flush()
+    with _flush_lock:
+        if _backend is not None:
+            _backend.close()
+            _backend = None
+
+# Last resort for processes that exit without calling close()
+atexit.register(flush)
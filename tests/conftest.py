@@ -0,0 +1,18 @@
+import os
+import sys
+
+# Make the bot modules importable when running `python -m pytest` from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import storage
+
+@pytest.fixture
+def storage_backend(tmp_path, monkeypatch):
+    """A fresh SQLite storage backend in a temporary directory."""
+    monkeypatch.chdir(tmp_path)
+    storage.close()
+    storage._backend = storage.SQLiteStorage(str(tmp_path / "alertmee.db"))
+    yield storage._backend
+    storage.close()
@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+import bot
+from delivery_queue import DeliveryQueue
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch, storage_backend):
+    queue = DeliveryQueue(str(tmp_path / "delivery_queue.db"))
+    monkeypatch.setattr(bot, "delivery_queue", queue)
+    yield queue
+    queue.close()
+
+@pytest.fixture
+def subscribed(monkeypatch):
+    monkeypatch.setattr(bot, "subscribers", {1, 2})
+    monkeypatch.setattr(bot, "user_preferences", {})
+    bot.rebuild_sentiment_index()
+    yield
+    bot.subscribers.clear()
+    bot.rebuild_sentiment_index()
+
+def test_queue_mode_cycle_unsubscribes_dead_chats(outbox, subscribed, monkeypatch):
+    async def no_articles():
+        return [], {}
+
+    monkeypatch.setattr(bot, "DELIVERY_MODE", "queue")
+    monkeypatch.setattr(bot, "fetch_alert_articles", no_articles)
+    # A delivery worker found chat 2 blocked
+    outbox.mark_dead_chat(2, "Forbidden: bot was blocked by the user")
+
+    asyncio.run(bot.check_news_and_alert(None))
+    assert bot.subscribers == {1}
+    assert 2 not in bot.default_keyword_subscribers
+    assert outbox.take_dead_chats() == []
+
+class FakeApplication:
+    running = True
+    stopped = False
+
+    def stop_running(self):
+        self.stopped = True
+
+def test_failed_state_load_stops_the_bot_instead_of_hanging_handlers(monkeypatch):
+    def corrupt_database():
+        raise ValueError("database disk image is malformed")
+
+    monkeypatch.setattr(bot, "read_state", corrupt_database)
+    monkeypatch.setattr(bot, "state_ready", asyncio.Event())
+    monkeypatch.setattr(bot, "state_load_finished", asyncio.Event())
+    monkeypatch.setattr(bot, "state_load_error", None)
+    application = FakeApplication()
+    handled = []
+
+    async def handler(update, context):
+        handled.append(update)
+
+    async def run():
+        waiting = asyncio.create_task(bot.requires_state(handler)("update", None))
+        await bot.load_state(application)
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(waiting, 1)
+
+    asyncio.run(run())
+    assert application.stopped
+    assert handled == [] and not bot.state_ready.is_set()
+
+def test_pending_digests_survive_a_restart(outbox, subscribed, monkeypatch):
+    from sources import normalize_article
+
+    article = normalize_article("Trump story", "Summary", "https://example.com/1", "Wire", "20250101T000000")
+    article["sentiment"] = {"category": "neutral", "score": 0.0}
+    article["matched_keywords"] = {"trump"}
+
+    async def one_article():
+        return [article], {}
+
+    async def no_quotes(symbols):
+        return None
+
+    monkeypatch.setattr(bot, "user_preferences", {1: {"sentiments": ["positive", "neutral", "negative"], "digest": True}})
+    bot.rebuild_sentiment_index()
+    monkeypatch.setattr(bot, "pending_digests", {})
+    monkeypatch.setattr(bot, "DELIVERY_MODE", "queue")
+    monkeypatch.setattr(bot, "fetch_alert_articles", one_article)
+    monkeypatch.setattr(bot, "mark_alerted", lambda articles, watermarks: None)
+    monkeypatch.setattr(bot.quote_service, "refresh", no_quotes)
+
+    asyncio.run(bot.check_news_and_alert(None))
+    assert [entry["url"] for entry in bot.pending_digests[1]["articles"]] == ["https://example.com/1"]
+
+    # After a restart the digest is still waiting
+    _, _, loaded_digests = bot.read_state()
+    assert loaded_digests == bot.pending_digests
+
+    bot.unsubscribe(1)
+    assert bot.read_state()[2] == {}
+
+def test_alert_cycle_waits_for_outbox_jobs_instead_of_skipping(monkeypatch):
+    cycles = []
+
+    async def cycle(context):
+        cycles.append(context)
+        return 0
+
+    monkeypatch.setattr(bot, "check_news_and_alert", cycle)
+    monkeypatch.setattr(bot, "RELOAD_STATE_EACH_CYCLE", False)
+    monkeypatch.setattr(bot, "alpha_vantage_calls_today", lambda: 0)
+    monkeypatch.setattr(bot, "state_load_finished", asyncio.Event())
+    monkeypatch.setattr(bot, "state_load_error", None)
+    monkeypatch.setattr(bot, "alert_cycle_lock", asyncio.Lock())
+    bot.state_load_finished.set()
+
+    async def run():
+        async with bot.alert_cycle_lock:  # e.g. retry_deliveries draining the outbox
+            waiting = asyncio.create_task(bot.run_alert_cycle("context"))
+            await asyncio.sleep(0.01)
+            assert cycles == []
+        await asyncio.wait_for(waiting, 1)
+
+    asyncio.run(run())
+    assert cycles == ["context"]
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+import delivery_queue
+from delivery_queue import DeliveryQueue
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = DeliveryQueue(str(tmp_path / "delivery_queue.db"), shards=1)
+    yield queue
+    queue.close()
+
+def status(queue, delivery_id):
+    return queue.conn.execute("SELECT status FROM deliveries WHERE id = ?", (delivery_id,)).fetchone()[0]
+
+def expire_leases(queue):
+    queue.conn.execute("UPDATE deliveries SET lease_until = ?", (time.time() - 1,))
+
+def test_send_requires_the_lease(queue):
+    queue.enqueue({1: [("a", "alert")]})
+    [(delivery_id, _, _)] = queue.lease("w1", [0])
+    expire_leases(queue)
+    assert [row[0] for row in queue.lease("w2", [0])] == [delivery_id]
+
+    # w1's batch outlasted its lease: it must not send a row w2 now holds
+    assert not queue.mark_sending(delivery_id, "w1")
+    assert queue.mark_sending(delivery_id, "w2")
+    assert status(queue, delivery_id) == "sending"
+
+def test_mark_sending_renews_the_lease(queue, monkeypatch):
+    queue.enqueue({1: [("a", "alert")]})
+    [(delivery_id, _, _)] = queue.lease("w1", [0])
+    leased_until = queue.conn.execute("SELECT lease_until FROM deliveries").fetchone()[0]
+    monkeypatch.setattr(delivery_queue.time, "time", lambda: leased_until + 10)
+    assert queue.mark_sending(delivery_id, "w1")
+    assert queue.conn.execute("SELECT lease_until FROM deliveries").fetchone()[0] > leased_until + 10
+
+def test_requeued_alerts_are_delivered_once(queue):
+    assert queue.enqueue({1: [("a", "alert a")], 2: [("a", "alert a")]}) == 2
+    # e.g. the same cycle queued again after a restart, plus one new alert
+    assert queue.enqueue({1: [("a", "alert a"), ("b", "alert b")]}) == 1
+    assert [(chat_id, text) for _, chat_id, text in queue.lease("w1", [0])] == [
+        (1, "alert a"), (2, "alert a"), (1, "alert b")]
+    assert queue.depth() == 3
+
+def test_failed_sends_back_off_exponentially(queue, monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(delivery_queue.time, "time", lambda: now)
+    queue.enqueue({1: [("a", "alert")]})
+    delays = []
+    for attempt in range(1, delivery_queue.DELIVERY_MAX_ATTEMPTS):
+        [(delivery_id, _, _)] = queue.lease("w1", [0])
+        assert queue.fail(delivery_id, "network error")
+        next_attempt_at = queue.conn.execute("SELECT next_attempt_at FROM deliveries").fetchone()[0]
+        delays.append(next_attempt_at - now)
+        assert queue.lease("w1", [0]) == []  # not due yet
+        now = next_attempt_at
+    base = delivery_queue.DELIVERY_RETRY_BASE_DELAY
+    assert delays == [min(base * 2 ** n, delivery_queue.DELIVERY_RETRY_MAX_DELAY) for n in range(len(delays))]
+
+    # The last attempt gives up
+    [(delivery_id, _, _)] = queue.lease("w1", [0])
+    assert not queue.fail(delivery_id, "network error")
+    assert status(queue, delivery_id) == "failed"
+
+def test_interrupted_sends_are_failed_not_retried(queue):
+    queue.enqueue({1: [("a", "alert"), ("b", "other alert")]})
+    [(sending_id, _, _), (leased_id, _, _)] = queue.lease("w1", [0])
+    assert queue.mark_sending(sending_id, "w1")
+    # w1 died mid-send: the message it was sending may have arrived, the one still waiting didn't
+    expire_leases(queue)
+    assert [row[0] for row in queue.lease("w2", [0])] == [leased_id]
+    assert status(queue, sending_id) == "failed"
+
+def test_dead_chat_drops_its_undelivered_messages(queue):
+    queue.enqueue({1: [("a", "alert"), ("b", "other alert")], 2: [("a", "alert")]})
+    queue.mark_dead_chat(1, "Forbidden: bot was blocked by the user")
+    assert [chat_id for _, chat_id, _ in queue.lease("w1", [0])] == [2]
+    assert queue.take_dead_chats() == [1]
+    assert queue.take_dead_chats() == []
@@ -0,0 +1,43 @@
+import asyncio
+
+import httpx
+from telegram.error import NetworkError, TimedOut
+
+from dispatcher import AlertDispatcher, send_error_kind
+
+class FlakyBot:
+    """Fails the first send with `error` (raised from `cause`), then succeeds."""
+
+    def __init__(self, error, cause):
+        self.error = error
+        self.cause = cause
+        self.calls = 0
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.calls += 1
+        if self.calls == 1:
+            raise self.error from self.cause
+
+def send(bot):
+    dispatcher = AlertDispatcher(workers=1, global_rate=1000, per_chat_interval=0, max_retries=2)
+    results = []
+
+    async def on_result(chat_id, index, error):
+        results.append(error)
+
+    stats = asyncio.run(dispatcher.send_all(bot, {1: ["hi"]}, on_result=on_result))
+    return stats, results
+
+def test_read_timeout_is_not_resent():
+    bot = FlakyBot(TimedOut(), httpx.ReadTimeout("read timed out"))
+    stats, results = send(bot)
+    assert bot.calls == 1
+    assert stats["sent"] == 0 and stats["failed"] == 1
+    assert send_error_kind(results[0]) == "uncertain"
+
+def test_connect_error_is_retried():
+    bot = FlakyBot(NetworkError("httpx.ConnectError"), httpx.ConnectError("connection refused"))
+    stats, results = send(bot)
+    assert bot.calls == 2
+    assert stats["sent"] == 1 and stats["retries"] == 1
+    assert results == [None]
@@ -0,0 +1,23 @@
+from matcher import KeywordMatcher
+
+def test_overlapping_keywords_are_all_reported():
+    matcher = KeywordMatcher(["trump", "donald trump", "elon", "elon musk", "tar*", "tariff*"])
+    assert matcher.match("Donald Trump meets Elon Musk over tariffs") == {
+        "trump", "donald trump", "elon", "elon musk", "tar*", "tariff*"
+    }
+
+def test_default_keyword_still_matches_when_a_longer_one_is_tracked():
+    assert "trump" in KeywordMatcher(["trump", "donald trump"]).match("DONALD   TRUMP speaks")
+
+def test_prefix_keywords():
+    matcher = KeywordMatcher(["tar*", "tariff*", "trade"])
+    assert matcher.match("Tariffs and a trader") == {"tar*", "tariff*"}
+    assert matcher.match("tar pits") == {"tar*"}
+
+def test_keywords_match_whole_words_only():
+    matcher = KeywordMatcher(["trump", "elon"])
+    assert matcher.match("A trumpet player from elonia") == set()
+
+def test_no_keywords():
+    assert KeywordMatcher([]).match("Donald Trump") == set()
+    assert KeywordMatcher(["*"]).match("anything") == set()
@@ -0,0 +1,27 @@
+import storage
+from http_client import _count_alpha_vantage_call, alpha_vantage_calls_today, usage_key
+
+def test_pending_increments_add_up(storage_backend):
+    storage.increment_meta("calls")
+    storage.increment_meta("calls", 2)
+    assert storage.get_counter("calls") == 3
+    storage.flush()
+    assert storage_backend.get_meta("calls") == "3"
+    assert storage.get_counter("calls") == 3
+
+def test_increments_from_another_process_are_not_lost(storage_backend, tmp_path):
+    other = storage.SQLiteStorage(str(tmp_path / "alertmee.db"))
+    storage.increment_meta("calls")
+    other.increment_meta("calls", 5)
+    storage.flush()
+    assert storage.get_counter("calls") == 6
+    other.close()
+
+def test_alpha_vantage_calls_survive_a_restart(storage_backend, tmp_path):
+    _count_alpha_vantage_call()
+    _count_alpha_vantage_call()
+    assert alpha_vantage_calls_today() == 2
+    storage.close()
+    storage._backend = storage.SQLiteStorage(str(tmp_path / "alertmee.db"))
+    assert alpha_vantage_calls_today() == 2
+    assert storage.get_counter(usage_key("alpha_vantage_calls")) == 2
@@ -0,0 +1,42 @@
+import time
+
+import pytest
+
+import news_service
+import trends as trends_module
+from trends import SentimentTrends
+
+ARTICLE = {"url": "https://example.com/a", "title": "Headline", "sentiment": {"category": "neutral", "score": 0.0}}
+SNAPSHOT = {"version": 1, "quotes": {"VOO": {"price": "500.00", "change": "1.00", "change_percent": "0.2%"}}}
+
+@pytest.fixture
+def trends(monkeypatch):
+    trends = SentimentTrends()
+    monkeypatch.setattr(news_service, "sentiment_trends", trends)
+    monkeypatch.setattr(news_service, "TREND_IN_QUOTE_BLOCK", True)
+    news_service.rendered_messages.clear()
+    yield trends
+    news_service.rendered_messages.clear()
+
+def published(seconds_ago):
+    return time.strftime("%Y%m%dT%H%M%S", time.gmtime(time.time() - seconds_ago))
+
+def test_sentiment_line_follows_trends_with_the_same_quote_snapshot(trends):
+    trends.add("https://example.com/1", published(60), "positive", 0.5)
+    first = news_service.render_news_message(ARTICLE, quote_snapshot=SNAPSHOT)
+    assert "News sentiment (24h): +0.50" in first
+
+    # Quotes unchanged (markets closed), but new coverage moves the trend
+    trends.add("https://example.com/2", published(30), "negative", -0.5)
+    second = news_service.render_news_message(ARTICLE, quote_snapshot=SNAPSHOT)
+    assert "News sentiment (24h): +0.00" in second
+    assert "News sentiment (24h): +0.00" in news_service.render_digest([ARTICLE], SNAPSHOT)[0]
+    assert news_service.render_news_message(ARTICLE, quote_snapshot=SNAPSHOT) is second  # cached for this state
+
+def test_sentiment_line_drops_articles_that_age_out(trends, monkeypatch):
+    trends.add("https://example.com/1", published(24 * 3600 - 1800), "positive", 0.5)
+    assert "News sentiment (24h)" in news_service.render_news_message(ARTICLE, quote_snapshot=SNAPSHOT)
+
+    later = time.time() + 3600
+    monkeypatch.setattr(trends_module.time, "time", lambda: later)
+    assert "News sentiment (24h)" not in news_service.render_news_message(ARTICLE, quote_snapshot=SNAPSHOT)
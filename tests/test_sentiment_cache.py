@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+import news_service
+
+@pytest.fixture
+def cache_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "sentiment_cache.json")
+    monkeypatch.setattr(news_service, "SENTIMENT_CACHE_FILE", path)
+    monkeypatch.setattr(news_service, "sentiment_cache", news_service.OrderedDict())
+    return path
+
+def test_truncated_cache_file_is_ignored(cache_file):
+    with open(cache_file, "w") as f:
+        f.write('[["abc", 0.5], ["de')  # cut off mid-write
+    assert news_service.read_sentiment_cache_file() is None
+
+def test_cache_is_replaced_atomically(cache_file):
+    news_service.sentiment_cache["abc"] = 0.5
+    news_service.save_sentiment_cache()
+    assert news_service.read_sentiment_cache_file() == [["abc", 0.5]]
+    assert not os.path.exists(f"{cache_file}.tmp")
@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+import httpx
+
+import http_client
+from sources import (FeedStreamParser, fetch_new_articles, get_watermark, normalize_article,
+                     parse_alpha_vantage_stream, save_watermarks)
+
+class FakeSource:
+    name = "fake"
+
+    def __init__(self, articles):
+        self.articles = articles
+        self.since_values = []
+
+    async def fetch(self, since=None):
+        self.since_values.append(since)
+        return [article for article in self.articles if not since or article["time_published"] > since]
+
+def make_article(index, time_published):
+    return normalize_article(f"Story {index}", "Summary", f"https://example.com/{index}", "Fake", time_published)
+
+def test_watermark_is_only_stored_when_saved(storage_backend):
+    source = FakeSource([make_article(2, "20250102T000000"), make_article(1, "20250101T000000")])
+
+    articles, watermarks = asyncio.run(fetch_new_articles([source]))
+    assert len(articles) == 2
+    assert watermarks["fake"]["time_published"] == "20250102T000000"
+    assert get_watermark(source) is None
+
+    # The cycle failed before saving: the next fetch asks for everything again
+    articles, watermarks = asyncio.run(fetch_new_articles([source]))
+    assert len(articles) == 2 and source.since_values == [None, None]
+
+    save_watermarks(watermarks)
+    source.articles.insert(0, make_article(3, "20250103T000000"))
+    articles, _ = asyncio.run(fetch_new_articles([source]))
+    assert source.since_values[-1] == "20250102T000000"
+    assert [article["url"] for article in articles] == ["https://example.com/3"]
+
+def test_watermark_never_moves_backwards(storage_backend):
+    source = FakeSource([make_article(1, "20250101T000000")])
+    save_watermarks({"fake": {"time_published": "20250105T000000", "fetched_at": 0}})
+    # The stored watermark is too old to trust (fetched_at 0), so this is a full fetch
+    _, watermarks = asyncio.run(fetch_new_articles([source]))
+    assert source.since_values == [None]
+    assert watermarks["fake"]["time_published"] == "20250105T000000"
+
+def feed_body(times):
+    items = [{"title": f"Story {i}", "url": f"https://example.com/{i}", "time_published": t}
+             for i, t in enumerate(times)]
+    return json.dumps({"items": str(len(items)), "feed": items})
+
+def test_feed_parser_decodes_items_split_across_chunks():
+    body = feed_body(["20250103T000000", "20250102T000000"])
+    parser = FeedStreamParser()
+    items = []
+    for start in range(0, len(body), 7):
+        items += parser.feed(body[start:start + 7])
+    items += parser.feed("", final=True)
+    assert [item["url"] for item in items] == ["https://example.com/0", "https://example.com/1"]
+    assert parser.fields["items"] == "2"
+
+def test_stream_parsing_stops_at_the_watermark():
+    body = feed_body(["20250103T000000", "20250102T000000", "20250101T000000", "20241231T000000"])
+    cut = body.index("Story 2") + 40  # the rest of the body would never be needed
+    chunks_read = []
+
+    async def chunks():
+        for chunk in (body[:cut], body[cut:cut + 50], "not json"):
+            chunks_read.append(chunk)
+            yield chunk
+
+    articles = asyncio.run(parse_alpha_vantage_stream(chunks(), since="20250102T000000"))
+    assert [article["url"] for article in articles] == ["https://example.com/0", "https://example.com/1"]
+    assert "not json" not in chunks_read
+
+def test_stopping_early_releases_the_connection(storage_backend, monkeypatch):
+    body = feed_body(["20250103T000000", "20250102T000000", "20250101T000000"]).encode()
+
+    async def slow_body():
+        for start in range(0, len(body), 64):
+            yield body[start:start + 64]
+
+    def respond(request):
+        return httpx.Response(200, content=slow_body())
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+        monkeypatch.setattr(http_client, "get_http_client", lambda: client)
+        monkeypatch.setattr(http_client, "_request_semaphore", asyncio.Semaphore(1))
+        articles = await parse_alpha_vantage_stream(http_client.alpha_vantage_stream({"function": "NEWS_SENTIMENT"}),
+                                                    since="20250103T000000")
+        assert len(articles) == 1
+        # Released as soon as the parse returns, not when the generator is garbage collected
+        assert not http_client._request_semaphore.locked()
+        await client.aclose()
+
+    asyncio.run(run())
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+import storage
+
+@pytest.fixture
+def manual_flush(monkeypatch):
+    """Keep the flusher thread from flushing on its own while a test inspects the queue."""
+    monkeypatch.setattr(storage, "STORAGE_FLUSH_DELAY", 60)
+    monkeypatch.setattr(storage, "STORAGE_FLUSH_MAX_DELAY", 60)
+
+def test_writes_to_the_same_key_coalesce(storage_backend, manual_flush):
+    storage.add_subscriber(1)
+    storage.remove_subscriber(1)
+    storage.add_subscriber(2)
+    assert len(storage._pending) == 2
+    storage.flush()
+    assert storage_backend.load_subscribers() == {2}
+
+def test_reads_see_queued_writes(storage_backend, manual_flush):
+    storage.add_subscriber(1)
+    storage.save_user_preference(1, {"digest": True})
+    storage.set_meta("watermark", "20250101T000000")
+    assert storage.get_meta("watermark") == "20250101T000000"  # answered from the queue
+    assert storage.load_subscribers() == {1}
+    assert storage.load_user_preferences() == {1: {"digest": True}}
+    assert not storage._pending
+
+def test_failed_batch_is_retried_behind_newer_writes(storage_backend, manual_flush, monkeypatch):
+    apply_batch = storage_backend.apply_batch
+
+    def fail_once(writes):
+        monkeypatch.setattr(storage_backend, "apply_batch", apply_batch)
+        # Writes made while the failing batch was in flight
+        storage.set_meta("watermark", "new")
+        storage.increment_meta("calls", 2)
+        raise OSError("disk full")
+
+    monkeypatch.setattr(storage_backend, "apply_batch", fail_once)
+    storage.set_meta("watermark", "old")
+    storage.increment_meta("calls")
+    storage.add_subscriber(1)
+    storage.flush()
+    assert storage_backend.load_subscribers() == set()
+
+    storage.flush()
+    assert storage_backend.get_meta("watermark") == "new"  # the newer write wins over the retried one
+    assert storage_backend.get_meta("calls") == "3"  # increments from both add up
+    assert storage_backend.load_subscribers() == {1}
+
+def test_json_backend_writes_each_changed_file_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    backend = storage.JsonStorage()
+    written = []
+    write = backend._write
+    monkeypatch.setattr(backend, "_write", lambda path, data: (written.append(path), write(path, data)))
+
+    backend.apply_batch([("add_subscriber", (1,)), ("add_subscriber", (2,)), ("remove_subscriber", (1,)),
+                         ("save_user_preference", (2, {"digest": True})), ("set_meta", ("k", "v"))])
+    assert sorted(written) == sorted([storage.SUBSCRIBERS_FILE, storage.USER_PREFERENCES_FILE, storage.NEWS_STATE_FILE])
+    with open(storage.SUBSCRIBERS_FILE) as f:
+        assert json.load(f) == [2]
+
+def test_json_backend_keeps_the_previous_file_if_a_write_fails(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    backend = storage.JsonStorage()
+    backend.save_user_preference(1, {"digest": True})
+    with pytest.raises(TypeError):
+        backend.save_user_preference(2, {"unserializable": object()})
+    with open(storage.USER_PREFERENCES_FILE) as f:
+        assert json.load(f) == {"1": {"digest": True}}
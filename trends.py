@@ -0,0 +1,167 @@
+import time
+from collections import deque
+from datetime import datetime, timezone
+from config import *
+
+CATEGORIES = ("positive", "neutral", "negative")
+TIME_FORMAT = "%Y%m%dT%H%M%S"  # Alpha Vantage's time_published format (UTC)
+
+def published_timestamp(time_published, now):
+    """Epoch seconds of a time_published value, or `now` if it's missing or in the future."""
+    try:
+        timestamp = datetime.strptime(time_published, TIME_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return now
+    return min(timestamp, now)
+
+class RollingWindow:
+    """Sentiment aggregates over a sliding time window.
+
+    Articles are counted in fixed-size time buckets and the window keeps
+    running totals, so adding an article and expiring old buckets are O(1)
+    (amortized) however many articles the window holds. Alongside the plain
+    mean it keeps a time-decayed EWMA of the scores whose half-life is a
+    quarter of the window, so it leans towards the most recent coverage.
+    """
+
+    def __init__(self, length, buckets):
+        self.length = length
+        self.bucket_size = length / buckets
+        self.half_life = length / 4
+        self.buckets = {}  # {bucket index: [count, score sum, positive, neutral, negative]}
+        self.first_index = None  # no bucket below this index is still held
+        self.count = 0
+        self.score_sum = 0.0
+        self.category_counts = [0, 0, 0]
+        self.ewma_sum = 0.0
+        self.ewma_weight = 0.0
+        self.ewma_at = None
+
+    def _expire(self, now):
+        """Drop the buckets that slid out of the window."""
+        cutoff = int((now - self.length) // self.bucket_size)  # this bucket and older ones are out
+        if self.first_index is None:
+            self.first_index = cutoff + 1
+            return
+        if cutoff < self.first_index:
+            return
+        if cutoff - self.first_index >= len(self.buckets):
+            expired = [index for index in self.buckets if index <= cutoff]  # after a long gap
+        else:
+            expired = range(self.first_index, cutoff + 1)
+        for index in expired:
+            bucket = self.buckets.pop(index, None)
+            if bucket:
+                self.count -= bucket[0]
+                self.score_sum -= bucket[1]
+                for slot in range(3):
+                    self.category_counts[slot] -= bucket[2 + slot]
+        self.first_index = cutoff + 1
+
+    def _decay(self, now):
+        if self.ewma_at is not None and now > self.ewma_at:
+            factor = 0.5 ** ((now - self.ewma_at) / self.half_life)
+            self.ewma_sum *= factor
+            self.ewma_weight *= factor
+        self.ewma_at = now if self.ewma_at is None else max(self.ewma_at, now)
+
+    def add(self, timestamp, category, score, now):
+        """Count one article published at `timestamp`; ignored if it's already outside the window."""
+        self._expire(now)
+        index = int(timestamp // self.bucket_size)
+        if index < self.first_index:
+            return
+        bucket = self.buckets.get(index)
+        if bucket is None:
+            bucket = self.buckets[index] = [0, 0.0, 0, 0, 0]
+        slot = CATEGORIES.index(category) if category in CATEGORIES else 1
+        bucket[0] += 1
+        bucket[1] += score
+        bucket[2 + slot] += 1
+        self.count += 1
+        self.score_sum += score
+        self.category_counts[slot] += 1
+
+        self._decay(now)
+        weight = 0.5 ** ((self.ewma_at - timestamp) / self.half_life)
+        self.ewma_sum += score * weight
+        self.ewma_weight += weight
+
+    def summary(self, now):
+        """Return {"count", "mean", "ewma", "shares": {category: fraction}} for the window ending now."""
+        self._expire(now)
+        self._decay(now)
+        count = self.count
+        return {
+            "count": count,
+            "mean": self.score_sum / count if count else 0.0,
+            "ewma": self.ewma_sum / self.ewma_weight if count and self.ewma_weight > 1e-12 else 0.0,
+            "shares": {category: (self.category_counts[slot] / count if count else 0.0)
+                       for slot, category in enumerate(CATEGORIES)},
+        }
+
+class SentimentTrends:
+    """Rolling sentiment aggregates (TREND_WINDOWS) over every ingested article, each counted once."""
+
+    def __init__(self, windows=TREND_WINDOWS):
+        self.windows = [(label, RollingWindow(length, buckets)) for label, length, buckets in windows]
+        self.horizon = max(length for _, length, _ in windows)
+        self.seen = {}  # {url: timestamp} for articles still inside the longest window
+        self.seen_order = deque()  # (timestamp, url) in the order they were added
+        self.version = 0  # bumped whenever an article is counted
+
+    def _forget_old(self, now):
+        while self.seen_order and self.seen_order[0][0] < now - self.horizon:
+            timestamp, url = self.seen_order.popleft()
+            if self.seen.get(url) == timestamp:
+                del self.seen[url]
+
+    def add(self, url, time_published, category, score, now=None):
+        """Count an article in every window, unless it was counted before."""
+        now = time.time() if now is None else now
+        self._forget_old(now)
+        if url in self.seen:
+            return False
+        timestamp = published_timestamp(time_published, now)
+        if timestamp < now - self.horizon:
+            return False
+        self.seen[url] = timestamp
+        self.seen_order.append((timestamp, url))
+        for _, window in self.windows:
+            window.add(timestamp, category, score, now)
+        self.version += 1
+        return True
+
+    def add_articles(self, articles, now=None):
+        """Count a batch of enriched articles; returns how many were new."""
+        added = 0
+        for article in articles:
+            sentiment = article.get("sentiment", {})
+            added += self.add(article["url"], article.get("time_published", ""),
+                              sentiment.get("category", "neutral"), sentiment.get("score", 0.0), now)
+        return added
+
+    def summaries(self, now=None):
+        """Return [(window label, summary)] for every window, shortest first."""
+        now = time.time() if now is None else now
+        return [(label, window.summary(now)) for label, window in self.windows]
+
+    def _window(self, label):
+        for window_label, window in self.windows:
+            if window_label == label:
+                return window
+        raise KeyError(label)
+
+    def summary(self, label, now=None):
+        """Return one window's summary."""
+        now = time.time() if now is None else now
+        return self._window(label).summary(now)
+
+    def state(self, label, now=None):
+        """A cheap key that changes whenever a window's count, mean or shares may have changed.
+
+        Those only move when an article is added or a bucket slides out, so the
+        version and the current bucket index identify them (the EWMA isn't covered).
+        """
+        now = time.time() if now is None else now
+        return self.version, int(now // self._window(label).bucket_size)